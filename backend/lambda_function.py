@@ -6,118 +6,690 @@ Rotas ajustadas para o API Gateway configurado.
 
 import json
 import boto3
+import base64
+import calendar
+import contextvars
+import csv
+import gzip
+import hashlib
+import hmac
+import io
+import itertools
+import math
 import uuid
 import os
 import re
 import string
 import random
-from datetime import datetime, timezone
+import threading
+import time
+import traceback
+import urllib.request
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
-
-# Inicialização fora do handler
-dynamodb = boto3.resource('dynamodb')
+from boto3.dynamodb.conditions import Attr, Key
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.config import Config
+from botocore.exceptions import ClientError
 
 ACCOUNTS_TABLE = os.environ.get('ACCOUNTS_TABLE', 'mini-banco-contas')
 TRANSACTIONS_TABLE = os.environ.get('TRANSACTIONS_TABLE', 'mini-banco-transacoes')
 PIX_KEYS_TABLE = os.environ.get('PIX_KEYS_TABLE', 'mini-banco-pix-keys')
-
-accounts_table = dynamodb.Table(ACCOUNTS_TABLE)
-transactions_table = dynamodb.Table(TRANSACTIONS_TABLE)
-pix_keys_table = dynamodb.Table(PIX_KEYS_TABLE)
+IDEMPOTENCY_TABLE = os.environ.get('IDEMPOTENCY_TABLE', 'mini-banco-idempotencia')
+LIMITS_TABLE = os.environ.get('LIMITS_TABLE', 'mini-banco-limites')
+SCHEDULES_TABLE = os.environ.get('SCHEDULES_TABLE', 'mini-banco-agendamentos')
+
+# Client único do DynamoDB: pool para as escritas paralelas, keepalive entre
+# invocações do container e retry adaptativo com timeouts curtos.
+CONFIG_DYNAMODB = Config(
+    max_pool_connections=int(os.environ.get('DYNAMODB_POOL', '50')),
+    tcp_keepalive=True,
+    connect_timeout=float(os.environ.get('DYNAMODB_CONNECT_TIMEOUT', '1')),
+    read_timeout=float(os.environ.get('DYNAMODB_READ_TIMEOUT', '3')),
+    retries={'max_attempts': int(os.environ.get('DYNAMODB_MAX_TENTATIVAS', '4')), 'mode': 'adaptive'}
+)
+
+# DynamoDB local (DynamoDB Local, moto_server) no modo servidor e em testes de carga
+DYNAMODB_ENDPOINT = os.environ.get('DYNAMODB_ENDPOINT') or None
+
+
+class _Preguicoso:
+    """Cria o objeto na primeira vez que um atributo é usado e o reaproveita depois."""
+
+    __slots__ = ('_fabrica', '_objeto', '_trava')
+
+    def __init__(self, fabrica):
+        self._fabrica = fabrica
+        self._objeto = None
+        self._trava = threading.Lock()
+
+    def __getattr__(self, nome):
+        objeto = self._objeto
+        if objeto is None:
+            with self._trava:
+                if self._objeto is None:
+                    self._objeto = self._fabrica()
+                objeto = self._objeto
+        return getattr(objeto, nome)
+
+
+# Criados no primeiro uso, não no import: o cold start não paga o carregamento
+# dos modelos do boto3 em rotas que não tocam o banco.
+dynamodb = _Preguicoso(lambda: instrumentar_dynamodb(boto3.resource(
+    'dynamodb', config=CONFIG_DYNAMODB, endpoint_url=DYNAMODB_ENDPOINT
+)))
+
+# GSIs esperados: contas → user_id-index (user_id) e fragmentada-index (fragmentada,
+# esparso); chaves PIX → conta_id-index (conta_id)
+accounts_table = _Preguicoso(lambda: dynamodb.Table(ACCOUNTS_TABLE))
+transactions_table = _Preguicoso(lambda: dynamodb.Table(TRANSACTIONS_TABLE))
+pix_keys_table = _Preguicoso(lambda: dynamodb.Table(PIX_KEYS_TABLE))
+# Chave `chave`, TTL no atributo `expira_em`
+idempotency_table = _Preguicoso(lambda: dynamodb.Table(IDEMPOTENCY_TABLE))
+# Chave `chave`, TTL no atributo `expira_em`
+limits_table = _Preguicoso(lambda: dynamodb.Table(LIMITS_TABLE))
+# Chave `balde` (minuto#fatia) + `agendamento_id`, GSI conta_id-index (conta_id),
+# TTL no atributo `expira_em`
+schedules_table = _Preguicoso(lambda: dynamodb.Table(SCHEDULES_TABLE))
+# Só para o filtro de chaves PIX guardado em s3://
+s3 = _Preguicoso(lambda: boto3.client('s3'))
+
+# Caches em escopo de módulo: sobrevivem entre invocações no mesmo container
+CACHE_CONTAS_MAX = int(os.environ.get('CACHE_CONTAS_MAX', '10000'))
+CACHE_CONTAS_TTL = int(os.environ.get('CACHE_CONTAS_TTL', '3600'))
+
+# Chaves PIX: cache das encontradas e das ausentes. Curtos porque a chave pode
+# ser removida ou registrada em outro container (e shards_saldo vem junto)
+CACHE_CHAVES_MAX = int(os.environ.get('CACHE_CHAVES_MAX', '10000'))
+CACHE_CHAVES_TTL = int(os.environ.get('CACHE_CHAVES_TTL', '30'))
+CACHE_CHAVES_AUSENTES_TTL = int(os.environ.get('CACHE_CHAVES_AUSENTES_TTL', '10'))
+
+# Filtro de Bloom das chaves existentes (caminho local ou s3://bucket/chave;
+# vazio desliga), intervalo de recarga, idade máxima aceita, taxa de falso
+# positivo ao gerar, validade da lista de chaves registradas depois dele e em
+# quantos itens por hora essa lista se divide (cada item tem no máximo 400 KB)
+FILTRO_CHAVES_PIX = os.environ.get('FILTRO_CHAVES_PIX', '')
+FILTRO_RECARGA = int(os.environ.get('FILTRO_RECARGA', '300'))
+FILTRO_IDADE_MAX_HORAS = int(os.environ.get('FILTRO_IDADE_MAX_HORAS', '24'))
+FILTRO_FALSO_POSITIVO = float(os.environ.get('FILTRO_FALSO_POSITIVO', '0.01'))
+FILTRO_RECENTES_TTL = int(os.environ.get('FILTRO_RECENTES_TTL', '2'))
+FILTRO_RECENTES_FATIAS = int(os.environ.get('FILTRO_RECENTES_FATIAS', '16'))
+
+# Autenticação: emissor e client id do Cognito (aud/client_id), JWKS (padrão:
+# <emissor>/.well-known/jwks.json), intervalo mínimo entre buscas do JWKS por
+# kid desconhecido, tolerância de relógio no exp e tokens verificados em cache.
+# AUTH_MODO_TESTE=1 aceita o header X-User-Id (testes e benchmarks locais);
+# desligado por padrão.
+COGNITO_REGIAO = os.environ.get('COGNITO_REGIAO', os.environ.get('AWS_REGION', 'us-east-2'))
+COGNITO_USER_POOL_ID = os.environ.get('COGNITO_USER_POOL_ID', '')
+COGNITO_CLIENT_ID = os.environ.get('COGNITO_CLIENT_ID', '')
+JWT_EMISSOR = os.environ.get('JWT_EMISSOR') or (
+    f'https://cognito-idp.{COGNITO_REGIAO}.amazonaws.com/{COGNITO_USER_POOL_ID}' if COGNITO_USER_POOL_ID else ''
+)
+JWKS_URL = os.environ.get('JWKS_URL') or f'{JWT_EMISSOR}/.well-known/jwks.json'
+JWKS_RECARGA_MIN = int(os.environ.get('JWKS_RECARGA_MIN', '60'))
+JWT_TOLERANCIA = int(os.environ.get('JWT_TOLERANCIA', '30'))
+CACHE_TOKENS_MAX = int(os.environ.get('CACHE_TOKENS_MAX', '10000'))
+AUTH_MODO_TESTE = os.environ.get('AUTH_MODO_TESTE', '0') == '1'
+
+# Limite de taxa: orçamentos por rota (requisições/s, rajada, se pode ser
+# descartada sob sobrecarga), sobrescritos por LIMITES_TAXA em JSON; fração do
+# orçamento do minuto reservada por ida ao contador compartilhado; estados
+# guardados no container e pausa das rotas descartáveis após throttling
+LIMITES_TAXA = {
+    'padrao': (5, 20, False),
+    'consulta': (2, 10, True),
+    'extrato': (2, 10, True),
+    'publica': (1, 5, False),
+    'lote': (0.2, 3, False),
+    **{nome: tuple(valor) for nome, valor in json.loads(os.environ.get('LIMITES_TAXA', '{}')).items()}
+}
+LIMITE_COMPARTILHADO = os.environ.get('LIMITE_COMPARTILHADO', '1') == '1'
+LIMITE_FRACAO_RESERVA = float(os.environ.get('LIMITE_FRACAO_RESERVA', '0.1'))
+LIMITE_ESTADOS_MAX = int(os.environ.get('LIMITE_ESTADOS_MAX', '20000'))
+SOBRECARGA_PAUSA = int(os.environ.get('SOBRECARGA_PAUSA', '5'))
+
+# Idempotência: validade da resposta guardada, trava de quem está executando
+# e cache local das respostas já concluídas
+IDEMPOTENCIA_TTL = int(os.environ.get('IDEMPOTENCIA_TTL', '86400'))
+IDEMPOTENCIA_BLOQUEIO = int(os.environ.get('IDEMPOTENCIA_BLOQUEIO', '30'))
+CACHE_IDEMPOTENCIA_MAX = int(os.environ.get('CACHE_IDEMPOTENCIA_MAX', '1000'))
+
+# PIX em lote: máximo de itens por requisição, itens simultâneos e tentativas
+# por item (os itens disputam o item da conta de origem)
+LOTE_MAX_ITENS = int(os.environ.get('LOTE_MAX_ITENS', '500'))
+LOTE_PARALELISMO = int(os.environ.get('LOTE_PARALELISMO', '8'))
+LOTE_TENTATIVAS = int(os.environ.get('LOTE_TENTATIVAS', '6'))
+
+# Limites de débito (saque e PIX enviado), em reais e sobrescritos por conta
+# em `limite_diario`/`limite_noturno`: janela móvel de 24 h e período noturno
+# (horário local, fuso em horas), somados em baldes de LIMITE_BALDE_S segundos
+LIMITE_DIARIO = Decimal(os.environ.get('LIMITE_DIARIO', '20000'))
+LIMITE_NOTURNO = Decimal(os.environ.get('LIMITE_NOTURNO', '1000'))
+LIMITE_NOITE_INICIO = int(os.environ.get('LIMITE_NOITE_INICIO', '20'))
+LIMITE_NOITE_FIM = int(os.environ.get('LIMITE_NOITE_FIM', '6'))
+LIMITE_FUSO_HORAS = int(os.environ.get('LIMITE_FUSO_HORAS', '-3'))
+LIMITE_BALDE_S = int(os.environ.get('LIMITE_BALDE_S', '3600'))
+
+# PIX agendado: fatias (partições) por minuto, janela em que agendamentos para
+# o mesmo instante são espalhados, antecedência mínima e horizonte, fuso das
+# datas sem horário, PIX simultâneos e tentativas por pagamento no executor,
+# posse de um balde, quanto o executor volta no tempo sem cursor, tempo por
+# invocação e dias de histórico dos concluídos
+AGENDAMENTO_FATIAS = int(os.environ.get('AGENDAMENTO_FATIAS', '16'))
+AGENDAMENTO_JANELA_S = int(os.environ.get('AGENDAMENTO_JANELA_S', '600'))
+AGENDAMENTO_ANTECEDENCIA_S = int(os.environ.get('AGENDAMENTO_ANTECEDENCIA_S', '60'))
+AGENDAMENTO_HORIZONTE_DIAS = int(os.environ.get('AGENDAMENTO_HORIZONTE_DIAS', '365'))
+AGENDAMENTO_FUSO_HORAS = int(os.environ.get('AGENDAMENTO_FUSO_HORAS', '-3'))
+AGENDAMENTO_PARALELISMO = int(os.environ.get('AGENDAMENTO_PARALELISMO', '16'))
+AGENDAMENTO_TENTATIVAS = int(os.environ.get('AGENDAMENTO_TENTATIVAS', '3'))
+AGENDAMENTO_POSSE_S = int(os.environ.get('AGENDAMENTO_POSSE_S', '120'))
+AGENDAMENTO_RECUPERACAO_S = int(os.environ.get('AGENDAMENTO_RECUPERACAO_S', '3600'))
+AGENDAMENTO_ORCAMENTO = float(os.environ.get('AGENDAMENTO_ORCAMENTO', '50'))
+AGENDAMENTO_HISTORICO_DIAS = int(os.environ.get('AGENDAMENTO_HISTORICO_DIAS', '90'))
+
+# Leituras independentes dentro de um handler: threads do pool compartilhado
+LEITURAS_PARALELAS = int(os.environ.get('LEITURAS_PARALELAS', '8'))
+
+# Saldo fragmentado: máximo de sub-contadores por conta
+SALDO_SHARDS_MAX = int(os.environ.get('SALDO_SHARDS_MAX', '32'))
+
+# Métricas (CloudWatch EMF): fração das requisições emitidas; erros 5xx sempre saem
+METRICAS_NAMESPACE = os.environ.get('METRICAS_NAMESPACE', 'MiniBanco')
+METRICAS_AMOSTRAGEM = float(os.environ.get('METRICAS_AMOSTRAGEM', '1.0'))
+
+# Tentativas da consulta ao GSI user_id-index antes de desistir
+GSI_MAX_TENTATIVAS = 3
+
+# Respostas a partir deste tamanho saem em gzip quando o cliente aceita. Só
+# com COMPRESSAO_ATIVA=1: o API Gateway precisa de binaryMediaTypes '*/*' para
+# decodificar o base64 (o estágio API Gateway do Jenkinsfile configura os dois)
+COMPRESSAO_ATIVA = os.environ.get('COMPRESSAO_ATIVA', '0') == '1'
+COMPRESSAO_MIN_BYTES = int(os.environ.get('COMPRESSAO_MIN_BYTES', '1024'))
+
+# Livro razão: tentativas do BatchWriteItem para itens não processados
+LIVRO_MAX_TENTATIVAS = int(os.environ.get('LIVRO_MAX_TENTATIVAS', '5'))
+
+# Reconciliação saldo × livro: estado para retomar entre invocações e prefixo do
+# relatório (local ou s3://; no Lambda, só s3://), segmentos do scan paralelo, partições de contas
+# por passada, tempo por invocação e intervalo mínimo entre execuções completas
+RECONCILIACAO_ESTADO = os.environ.get('RECONCILIACAO_ESTADO', '/tmp/reconciliacao.json.gz')
+RECONCILIACAO_RELATORIO = os.environ.get('RECONCILIACAO_RELATORIO', '/tmp/reconciliacao')
+RECONCILIACAO_SEGMENTOS = int(os.environ.get('RECONCILIACAO_SEGMENTOS', '8'))
+RECONCILIACAO_PARTICOES = int(os.environ.get('RECONCILIACAO_PARTICOES', '1'))
+RECONCILIACAO_ORCAMENTO = float(os.environ.get('RECONCILIACAO_ORCAMENTO', '600'))
+RECONCILIACAO_INTERVALO = int(os.environ.get('RECONCILIACAO_INTERVALO', '86400'))
+
+# Arquivo do livro: prefixo dos segmentos mensais (local ou s3://, no Lambda
+# só s3://; vazio desliga), idade a partir da qual um mês fechado sai da tabela quente,
+# carência do TTL dos lançamentos já arquivados e segmentos em cache
+ARQUIVO_LIVRO = os.environ.get('ARQUIVO_LIVRO', '')
+ARQUIVO_IDADE_DIAS = int(os.environ.get('ARQUIVO_IDADE_DIAS', '90'))
+ARQUIVO_CARENCIA = int(os.environ.get('ARQUIVO_CARENCIA', '86400'))
+CACHE_SEGMENTOS_MAX = int(os.environ.get('CACHE_SEGMENTOS_MAX', '64'))
+
+# Importação de contas em lote: registros por bloco, escritas simultâneas,
+# estado para retomar (local ou s3://; no Lambda, só s3://) e tempo por invocação
+IMPORTACAO_BLOCO = int(os.environ.get('IMPORTACAO_BLOCO', '1000'))
+IMPORTACAO_PARALELISMO = int(os.environ.get('IMPORTACAO_PARALELISMO', '16'))
+IMPORTACAO_ESTADO = os.environ.get('IMPORTACAO_ESTADO', '/tmp/importacao.json')
+IMPORTACAO_ORCAMENTO = float(os.environ.get('IMPORTACAO_ORCAMENTO', '600'))
+
+# No Lambda o /tmp é do container: some quando ele é reciclado e não é visto
+# pelos outros. Estado e resultados das tarefas precisam ir para o S3
+NO_LAMBDA = bool(os.environ.get('AWS_LAMBDA_FUNCTION_NAME'))
 
 
 def lambda_handler(event, context):
-    print(f"📨 Evento: {json.dumps(event, default=str)}")
+    # Invocações agendadas (EventBridge) trazem {"tarefa": ...} em vez de HTTP
+    if 'tarefa' in event:
+        return executar_tarefa(event)
+
+    metricas = MetricasRequisicao()
+    _metricas_atuais.set(metricas)
+    try:
+        retorno = _despachar(event, metricas)
+    finally:
+        _metricas_atuais.set(None)
+    metricas.emitir(retorno['statusCode'])
+    return comprimir(event, retorno)
 
+
+def _despachar(event, metricas):
     http_method = event.get('httpMethod', '')
     path = event.get('path', '')
 
     try:
-        # ══════════════════════════════════════
-        # Rotas públicas (sem autenticação)
-        # ══════════════════════════════════════
-        if path == '/health' and http_method == 'GET':
-            return resposta(200, {
-                'status': 'ok',
-                'servico': 'Mini Banco Lambda v2 🏦',
-                'versao': '2.0 — Cognito + PIX'
-            })
+        rota, parametros = encontrar_rota(http_method, path, event.get('resource'))
+        if not rota:
+            return resposta(404, {'erro': f'Rota não encontrada: {http_method} {path}'})
+        metricas.rota = f'{rota.metodo} {rota.caminho}'
+
+        ctx = {'parametros': {**(event.get('pathParameters') or {}), **parametros}}
+        for middleware in rota.middlewares:
+            interrompida = middleware(event, ctx)
+            if interrompida:
+                return interrompida
+        return rota.despachar(event, ctx)
 
-        # Cadastro de conta (público — POST /auth)
-        if path == '/auth' and http_method == 'POST':
-            return criar_conta(event)
+    except Exception as e:
+        print(f"❌ Erro em {http_method} {path}: {str(e)}")
+        traceback.print_exc()
+        return resposta(500, {'erro': 'Erro interno do servidor', 'detalhes': str(e)})
 
-        # Legado v1: criar conta via /contas
-        if path == '/contas' and http_method == 'POST':
-            return criar_conta(event)
 
-        # Legado v1: consultar saldo via /contas/{id}
-        if path.startswith('/contas/') and http_method == 'GET':
-            conta_id = event.get('pathParameters', {}).get('id', '')
-            return consultar_saldo(conta_id)
+def exigir_duravel(caminho, variavel):
+    """Recusa caminho local no Lambda, onde ele não sobrevive ao container."""
+    if NO_LAMBDA and not caminho.startswith('s3://'):
+        raise ValueError(f'{variavel}={caminho} é local e se perde entre invocações do Lambda: use s3://')
 
-        # Legado v1: extrato via /extrato/{id}
-        if path.startswith('/extrato/') and http_method == 'GET':
-            conta_id = event.get('pathParameters', {}).get('id', '')
-            return ver_extrato_por_id(conta_id)
 
-        # ══════════════════════════════════════
-        # Rotas autenticadas
-        # ══════════════════════════════════════
-        user_id = extrair_user_id(event)
-        if not user_id:
-            return resposta(401, {'erro': 'Não autorizado. Faça login primeiro.'})
+def executar_tarefa(event):
+    tarefa = TAREFAS.get(event['tarefa'])
+    if not tarefa:
+        raise ValueError(f"Tarefa desconhecida: {event['tarefa']}")
+    resultado = tarefa(event)
+    print(json.dumps({'tarefa': event['tarefa'], 'resultado': resultado}, default=str))
+    return resultado
 
-        # Minha conta
-        if path == '/minha-conta' and http_method == 'GET':
-            return minha_conta(user_id)
 
-        # Cadastro de conta (para ver detalhes no GET /cadastro)
-        if path == '/cadastro' and http_method == 'GET':
-            return minha_conta(user_id)
+def health():
+    return resposta(200, {
+        'status': 'ok',
+        'servico': 'Mini Banco Lambda v2 🏦',
+        'versao': '2.0 — Cognito + PIX',
+        'cache_contas': _cache_contas.estatisticas(),
+        'cache_chaves_pix': _cache_chaves_pix.estatisticas()
+    })
 
-        # Depositar
-        if path == '/depositar' and http_method == 'POST':
-            return depositar(event, user_id)
 
-        # Sacar
-        if path == '/sacar' and http_method == 'POST':
-            return sacar(event, user_id)
+# ══════════════════════════════════════
+# 🔁 IDEMPOTÊNCIA
+# ══════════════════════════════════════
 
-        # Transferir (legado v1)
-        if path == '/transferir' and http_method == 'POST':
-            return transferir_legado(event)
+# Respostas que pedem ao cliente nova tentativa (conflito, limite de taxa,
+# sobrecarga): não ficam guardadas sob a Idempotency-Key
+_STATUS_REPETIVEIS = {409, 429, 503}
+
+
+class IdempotenciaIndisponivel(Exception):
+    """A chave já tem uma resposta que não pode ser reaproveitada."""
+
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+        self.mensagem = mensagem
+
+
+def idempotente(despachar, obrigatoria=False):
+    """Envolve o despacho de uma rota com o header Idempotency-Key.
+
+    A primeira requisição com a chave trava o registro (EM_ANDAMENTO), executa
+    e guarda a resposta definitiva. Repetições devolvem a resposta guardada sem
+    tocar em saldos; uma repetição que chega com a original ainda em execução
+    recebe 409. Respostas 5xx, 409, 429 e 503 liberam a chave: a repetição
+    executa de novo.
+    Sem o header, a rota funciona como antes — ou responde 400, se obrigatoria.
+    """
+    def despachar_idempotente(event, ctx):
+        chave_cliente = ler_header(event, 'idempotency-key')
+        if not chave_cliente:
+            if obrigatoria:
+                return resposta(400, {'erro': 'Header Idempotency-Key é obrigatório nesta rota'})
+            return despachar(event, ctx)
+        if len(chave_cliente) > 255:
+            return resposta(400, {'erro': 'Idempotency-Key deve ter até 255 caracteres'})
+
+        chave = f"{ctx['user_id']}#{event.get('httpMethod')} {event.get('path')}#{chave_cliente}"
+        impressao = hashlib.sha256((event.get('body') or '').encode()).hexdigest()
+
+        guardada = _cache_idempotencia.obter(chave)
+        if guardada:
+            return _repetir_resposta(guardada, impressao)
+
+        try:
+            anterior = _travar_chave(chave, impressao)
+        except IdempotenciaIndisponivel as e:
+            return resposta(e.status, {'erro': e.mensagem})
+        if anterior:
+            _cache_idempotencia.guardar(chave, anterior)
+            return _repetir_resposta(anterior, impressao)
+
+        try:
+            retorno = despachar(event, ctx)
+        except Exception:
+            _liberar_chave(chave)
+            raise
+        if retorno['statusCode'] >= 500 or retorno['statusCode'] in _STATUS_REPETIVEIS:
+            # Falha do servidor, conflito ou limite não são respostas definitivas:
+            # libera a chave para a nova tentativa que a própria resposta pede
+            _liberar_chave(chave)
+            return retorno
+
+        concluida = {'impressao': impressao, 'status': retorno['statusCode'], 'corpo': retorno['body']}
+        idempotency_table.update_item(
+            Key={'chave': chave},
+            UpdateExpression='SET estado = :concluido, status_http = :status, corpo = :corpo REMOVE bloqueado_ate',
+            ExpressionAttributeValues={
+                ':concluido': 'CONCLUIDO', ':status': retorno['statusCode'], ':corpo': retorno['body']
+            }
+        )
+        _cache_idempotencia.guardar(chave, concluida)
+        return retorno
 
-        # Extrato (autenticado, sem ID)
-        if path == '/extrato' and http_method == 'GET':
-            return ver_extrato(user_id)
+    return despachar_idempotente
 
-        # ── PIX ──
-        # Chaves PIX
-        if path == '/pix/chaves' and http_method == 'POST':
-            return registrar_chave_pix(event, user_id)
 
-        if path == '/pix/chaves' and http_method == 'GET':
-            return listar_chaves_pix(user_id)
+def _travar_chave(chave, impressao):
+    """Registra a chave como EM_ANDAMENTO. Devolve a resposta guardada se já concluída."""
+    agora = int(time.time())
+    try:
+        idempotency_table.put_item(
+            Item={
+                'chave': chave,
+                'estado': 'EM_ANDAMENTO',
+                'impressao': impressao,
+                'bloqueado_ate': agora + IDEMPOTENCIA_BLOQUEIO,
+                'expira_em': agora + IDEMPOTENCIA_TTL
+            },
+            # Trava vencida = execução anterior morreu no meio; pode assumir
+            ConditionExpression='attribute_not_exists(chave) OR (estado = :andamento AND bloqueado_ate < :agora)',
+            ExpressionAttributeValues={':andamento': 'EM_ANDAMENTO', ':agora': agora},
+            ReturnValuesOnConditionCheckFailure='ALL_OLD'
+        )
+        return None
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        item = e.response.get('Item')
+        if item:
+            item = {k: _desserializador.deserialize(v) for k, v in item.items()}
+        else:
+            item = idempotency_table.get_item(Key={'chave': chave}, ConsistentRead=True).get('Item') or {}
 
-        if path == '/pix/chaves' and http_method == 'DELETE':
-            return remover_chave_pix(event, user_id)
+    if item.get('estado') != 'CONCLUIDO':
+        raise IdempotenciaIndisponivel(409, 'Requisição com esta Idempotency-Key ainda em processamento')
+    return {'impressao': item['impressao'], 'status': int(item['status_http']), 'corpo': item['corpo']}
 
-        # Buscar destinatário por chave
-        if path == '/pix/buscar' and http_method == 'POST':
-            return buscar_por_chave_pix(event)
 
-        # Enviar PIX
-        if path == '/pix/enviar' and http_method == 'POST':
-            return transferir_pix(event, user_id)
+def _liberar_chave(chave):
+    try:
+        idempotency_table.delete_item(
+            Key={'chave': chave},
+            ConditionExpression='estado = :andamento',
+            ExpressionAttributeValues={':andamento': 'EM_ANDAMENTO'}
+        )
+    except ClientError as e:
+        print(f"⚠️ Não foi possível liberar a chave de idempotência: {e}")
 
-        return resposta(404, {'erro': f'Rota não encontrada: {http_method} {path}'})
 
-    except Exception as e:
-        print(f"❌ Erro: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return resposta(500, {'erro': 'Erro interno do servidor', 'detalhes': str(e)})
+def _repetir_resposta(guardada, impressao):
+    if guardada['impressao'] != impressao:
+        return resposta(422, {'erro': 'Idempotency-Key já usada com outro corpo de requisição'})
+    return resposta_texto(
+        guardada['status'], guardada['corpo'], 'application/json', {'Idempotent-Replayed': 'true'}
+    )
+
+
+# ══════════════════════════════════════
+# 🚦 LIMITE DE TAXA
+# ══════════════════════════════════════
+# Por usuário (ou IP nas rotas públicas) e por orçamento de rota, em dois
+# níveis, ambos antes de qualquer tabela de negócio:
+#   1. balde de tokens no container (taxa/s e rajada) — custo zero de rede;
+#   2. contador por minuto na tabela de limites, para o limite valer entre
+#      containers. Cada container reserva uma fração do orçamento do minuto
+#      por UpdateItem e gasta localmente; esgotado o minuto, nega sem ir à
+#      tabela até o minuto seguinte.
+# Sob throttling do DynamoDB as rotas descartáveis (leituras) recebem 503 por
+# alguns segundos, preservando capacidade para dinheiro em movimento.
+
+_ERROS_THROTTLING = {'ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded'}
+_sobrecarga = {'ate': 0.0}
+
+
+class EstadoLimite:
+    __slots__ = ('tokens', 'visto_em', 'janela', 'reservados', 'negado_ate', 'trava')
+
+    def __init__(self, rajada):
+        self.tokens = rajada
+        self.visto_em = time.monotonic()
+        self.janela = None
+        self.reservados = 0
+        self.negado_ate = 0.0
+        # Requisições simultâneas da mesma identidade (threads do servidor HTTP)
+        self.trava = threading.Lock()
+
+
+def limite(orcamento):
+    """Middleware de limite de taxa com o orçamento nomeado da rota."""
+    def _limitar(event, ctx):
+        return verificar_limite(orcamento, ctx.get('user_id') or f'ip:{ip_origem(event)}')
+    return (_limitar,)
+
+
+def verificar_limite(orcamento, identidade):
+    """None se a requisição pode seguir; senão a resposta 429/503."""
+    por_segundo, rajada, descartavel = LIMITES_TAXA.get(orcamento, LIMITES_TAXA['padrao'])
+    agora = time.time()
+    if descartavel and agora < _sobrecarga['ate']:
+        return _recusar(503, 'Serviço sobrecarregado, tente novamente em instantes', _sobrecarga['ate'] - agora)
+
+    chave = f'{orcamento}#{identidade}'
+    estado = _estados_limite.obter_ou_criar(chave, lambda: EstadoLimite(rajada))
+    with estado.trava:
+        return _debitar_limite(estado, chave, por_segundo, rajada, agora)
+
+
+def _debitar_limite(estado, chave, por_segundo, rajada, agora):
+    if agora < estado.negado_ate:
+        return _recusar(429, 'Muitas requisições, aguarde', estado.negado_ate - agora)
+
+    # 1. Balde local
+    instante = time.monotonic()
+    estado.tokens = min(rajada, estado.tokens + (instante - estado.visto_em) * por_segundo)
+    estado.visto_em = instante
+    if estado.tokens < 1:
+        return _recusar(429, 'Muitas requisições, aguarde', (1 - estado.tokens) / por_segundo)
+
+    # 2. Orçamento compartilhado do minuto
+    if LIMITE_COMPARTILHADO:
+        janela = int(agora // 60)
+        if estado.janela != janela:
+            estado.janela, estado.reservados = janela, 0
+        if estado.reservados < 1:
+            if not _reservar_orcamento(chave, janela, por_segundo * 60 + rajada, estado):
+                estado.negado_ate = (janela + 1) * 60
+                return _recusar(429, 'Muitas requisições, aguarde', estado.negado_ate - agora)
+        estado.reservados -= 1
+
+    estado.tokens -= 1
+    return None
+
+
+def _reservar_orcamento(chave, janela, orcamento_minuto, estado):
+    """Reserva uma fração do orçamento do minuto no contador compartilhado.
+
+    Falha da tabela de limites não derruba a requisição: libera só esta.
+    """
+    reserva = max(1, int(orcamento_minuto * LIMITE_FRACAO_RESERVA))
+    try:
+        limits_table.update_item(
+            Key={'chave': f'{chave}#{janela}'},
+            UpdateExpression='ADD usados :n SET expira_em = :expira',
+            ConditionExpression='attribute_not_exists(usados) OR usados <= :teto',
+            ExpressionAttributeValues={
+                ':n': reserva, ':teto': int(orcamento_minuto) - reserva, ':expira': (janela + 2) * 60
+            }
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        print(f"⚠️ Contador de limite indisponível: {e}")
+        reserva = 1
+    estado.reservados = reserva
+    return True
+
+
+def registrar_sobrecarga():
+    _sobrecarga['ate'] = time.time() + SOBRECARGA_PAUSA
+
+
+def ip_origem(event):
+    ip = (event.get('requestContext') or {}).get('identity', {}).get('sourceIp')
+    if ip:
+        return ip
+    encaminhado = ler_header(event, 'x-forwarded-for')
+    return encaminhado.split(',')[0].strip() if encaminhado else 'desconhecido'
+
+
+def _recusar(status, mensagem, espera):
+    retorno = resposta(status, {'erro': mensagem})
+    retorno['headers']['Retry-After'] = str(max(1, math.ceil(espera)))
+    return retorno
+
+
+# ══════════════════════════════════════
+# 🧭 ROTEAMENTO
+# ══════════════════════════════════════
+
+class Rota:
+    __slots__ = ('metodo', 'caminho', 'middlewares', 'despachar')
+
+    def __init__(self, metodo, caminho, middlewares, despachar):
+        self.metodo = metodo
+        self.caminho = caminho
+        self.middlewares = middlewares
+        self.despachar = despachar
+
+
+# Middlewares: recebem (event, ctx) e devolvem uma resposta para interromper
+def _autenticar(event, ctx):
+    ctx['user_id'] = extrair_user_id(event)
+    if not ctx['user_id']:
+        return resposta(401, {'erro': 'Não autorizado. Faça login primeiro.'})
+
+
+def _corpo_json(event, ctx):
+    try:
+        ctx['corpo'] = ler_corpo(event)
+    except ValueError:
+        return resposta(400, {'erro': 'Corpo da requisição deve ser JSON válido'})
+
+
+PUBLICA = ()
+AUTENTICADA = (_autenticar,)
+COM_CORPO = (_corpo_json,)
+
+
+def ler_corpo(event):
+    """Corpo JSON da requisição, decodificado uma única vez por evento."""
+    if '_corpo' not in event:
+        corpo = event.get('body') or '{}'
+        if event.get('isBase64Encoded'):
+            corpo = base64.b64decode(corpo)
+        corpo = json.loads(corpo)
+        if not isinstance(corpo, dict):
+            raise ValueError('corpo deve ser um objeto JSON')
+        event['_corpo'] = corpo
+    return event['_corpo']
+
+
+def _query(event):
+    return event.get('queryStringParameters') or {}
+
+
+# Orçamentos de limite de taxa (ver LIMITES_TAXA); nas rotas públicas a identidade é o IP
+PUBLICA_LIMITADA = limite('publica')
+AUTENTICADA_PADRAO = AUTENTICADA + limite('padrao')
+
+ROTAS = [
+    # Públicas
+    Rota('GET', '/health', PUBLICA, lambda event, ctx: health()),
+    Rota('POST', '/auth', PUBLICA_LIMITADA + COM_CORPO, lambda event, ctx: criar_conta(event)),
+    # Legado v1
+    Rota('POST', '/contas', PUBLICA_LIMITADA + COM_CORPO, lambda event, ctx: criar_conta(event)),
+    Rota('GET', '/contas/{id}', limite('consulta'),
+         lambda event, ctx: consultar_saldo(ctx['parametros'].get('id', ''))),
+    Rota('GET', '/extrato/{id}', AUTENTICADA_PADRAO,
+         lambda event, ctx: ver_extrato_da_conta(ctx['user_id'], ctx['parametros'].get('id', ''), _query(event),
+                                                 ler_header(event, 'if-none-match'))),
+    # Autenticadas
+    Rota('GET', '/minha-conta', AUTENTICADA_PADRAO,
+         lambda event, ctx: minha_conta(ctx['user_id'], ler_header(event, 'if-none-match'))),
+    Rota('GET', '/cadastro', AUTENTICADA_PADRAO,
+         lambda event, ctx: minha_conta(ctx['user_id'], ler_header(event, 'if-none-match'))),
+    Rota('GET', '/painel', AUTENTICADA_PADRAO,
+         lambda event, ctx: painel(ctx['user_id'], _query(event), ler_header(event, 'if-none-match'))),
+    Rota('POST', '/depositar', AUTENTICADA_PADRAO + COM_CORPO,
+         idempotente(lambda event, ctx: depositar(event, ctx['user_id']))),
+    Rota('POST', '/sacar', AUTENTICADA_PADRAO + COM_CORPO,
+         idempotente(lambda event, ctx: sacar(event, ctx['user_id']))),
+    Rota('POST', '/transferir', AUTENTICADA_PADRAO + COM_CORPO, lambda event, ctx: transferir_legado(event, ctx['user_id'])),
+    Rota('GET', '/extrato', AUTENTICADA + limite('extrato'),
+         lambda event, ctx: ver_extrato(ctx['user_id'], _query(event), ler_header(event, 'if-none-match'))),
+    # PIX
+    Rota('POST', '/pix/chaves', AUTENTICADA_PADRAO + COM_CORPO,
+         lambda event, ctx: registrar_chave_pix(event, ctx['user_id'])),
+    Rota('GET', '/pix/chaves', AUTENTICADA_PADRAO, lambda event, ctx: listar_chaves_pix(ctx['user_id'])),
+    Rota('DELETE', '/pix/chaves', AUTENTICADA_PADRAO + COM_CORPO,
+         lambda event, ctx: remover_chave_pix(event, ctx['user_id'])),
+    Rota('POST', '/pix/buscar', AUTENTICADA + limite('consulta') + COM_CORPO,
+         lambda event, ctx: buscar_por_chave_pix(event)),
+    Rota('POST', '/pix/enviar', AUTENTICADA_PADRAO + COM_CORPO,
+         idempotente(lambda event, ctx: transferir_pix(event, ctx['user_id']))),
+    Rota('POST', '/pix/lote', AUTENTICADA + limite('lote') + COM_CORPO,
+         idempotente(lambda event, ctx: transferir_pix_lote(event, ctx['user_id']), obrigatoria=True)),
+    Rota('POST', '/pix/agendamentos', AUTENTICADA_PADRAO + COM_CORPO,
+         idempotente(lambda event, ctx: agendar_pix(event, ctx['user_id']))),
+    Rota('GET', '/pix/agendamentos', AUTENTICADA_PADRAO, lambda event, ctx: listar_agendamentos(ctx['user_id'])),
+    Rota('DELETE', '/pix/agendamentos', AUTENTICADA_PADRAO + COM_CORPO,
+         lambda event, ctx: cancelar_agendamento(event, ctx['user_id'])),
+]
+
+
+def _compilar_rotas(rotas):
+    """Tabela de despacho: rotas fixas por (método, caminho) e templates por
+    (método, nº de segmentos), além do índice pelo `resource` do API Gateway."""
+    fixas, por_template, templates = {}, {}, {}
+    for rota in rotas:
+        por_template[(rota.metodo, rota.caminho)] = rota
+        segmentos = tuple(rota.caminho.strip('/').split('/'))
+        if '{' not in rota.caminho:
+            fixas[(rota.metodo, rota.caminho)] = rota
+        else:
+            templates.setdefault((rota.metodo, len(segmentos)), []).append((segmentos, rota))
+    return fixas, por_template, templates
+
+
+_ROTAS_FIXAS, _ROTAS_POR_TEMPLATE, _ROTAS_TEMPLATES = _compilar_rotas(ROTAS)
+
+
+def encontrar_rota(metodo, caminho, resource=None):
+    """Devolve (rota, parâmetros do caminho) ou (None, {})."""
+    rota = _ROTAS_FIXAS.get((metodo, caminho))
+    if rota:
+        return rota, {}
+
+    # API Gateway já informa o template casado (ex.: /contas/{id})
+    rota = _ROTAS_POR_TEMPLATE.get((metodo, resource))
+    if rota:
+        return rota, {}
+
+    segmentos = caminho.strip('/').split('/')
+    for template, rota in _ROTAS_TEMPLATES.get((metodo, len(segmentos)), ()):
+        parametros = {}
+        for esperado, recebido in zip(template, segmentos):
+            if esperado[0] == '{':
+                parametros[esperado[1:-1]] = recebido
+            elif esperado != recebido:
+                break
+        else:
+            return rota, parametros
+    return None, {}
 
 
 # ══════════════════════════════════════
@@ -125,49 +697,121 @@ def lambda_handler(event, context):
 # ══════════════════════════════════════
 
 def extrair_user_id(event):
-    """Extrai user_id do Cognito (JWT) ou do header X-User-Id (modo teste)."""
-    try:
-        # Via Cognito Authorizer (quando authorizer está aplicado nas rotas)
-        claims = event.get('requestContext', {}).get('authorizer', {}).get('claims', {})
-        user_id = claims.get('sub')
-        if user_id:
-            return user_id
-
-        # Via header Authorization (decodifica JWT diretamente)
-        headers = event.get('headers', {}) or {}
-        auth_header = None
-        for key in headers:
-            if key.lower() == 'authorization':
-                auth_header = headers[key]
-                break
+    """user_id do Cognito: claims do authorizer do API Gateway, JWT verificado no
+    header Authorization ou, só sem Authorization e com AUTH_MODO_TESTE, o
+    header X-User-Id."""
+    claims = ((event.get('requestContext') or {}).get('authorizer') or {}).get('claims') or {}
+    if claims.get('sub'):
+        return claims['sub']
+
+    autorizacao = ler_header(event, 'authorization')
+    if autorizacao:
+        # Token presente e inválido é 401: nunca cai para o X-User-Id
+        token = autorizacao[7:] if autorizacao[:7].lower() == 'bearer ' else autorizacao
+        try:
+            return verificar_jwt(token.strip()).get('sub') or None
+        except TokenInvalido:
+            return None
+
+    if AUTH_MODO_TESTE:
+        return ler_header(event, 'x-user-id')
+    return None
+
 
-        if auth_header:
-            # Remove "Bearer " se presente
-            token = auth_header.replace('Bearer ', '').replace('bearer ', '')
+class TokenInvalido(Exception):
+    """JWT com assinatura, emissor, público ou validade inválidos."""
+
+
+# DigestInfo DER do SHA-256 no preenchimento PKCS#1 v1.5
+_SHA256_DIGEST_INFO = bytes.fromhex('3031300d060960864801650304020105000420')
+
+_jwks = {'chaves': {}, 'buscado_em': float('-inf')}
+_trava_jwks = threading.Lock()
+
+
+def verificar_jwt(token):
+    """Claims de um token RS256 do Cognito, verificado; TokenInvalido se não passar.
+
+    Tokens já verificados ficam em cache (pela impressão SHA-256) até expirarem,
+    então requisições seguintes da mesma sessão não refazem a criptografia.
+    """
+    impressao = hashlib.sha256(token.encode()).digest()
+    claims = _cache_tokens.obter(impressao)
+    if claims:
+        return claims
+    if not JWT_EMISSOR or not COGNITO_CLIENT_ID:
+        raise TokenInvalido('Emissor ou client id do Cognito não configurados')
+
+    try:
+        cabecalho_b64, payload_b64, assinatura_b64 = token.split('.')
+        cabecalho = json.loads(_b64url(cabecalho_b64))
+        claims = json.loads(_b64url(payload_b64))
+        assinatura = _b64url(assinatura_b64)
+    except ValueError:
+        raise TokenInvalido('Token malformado')
+    if cabecalho.get('alg') != 'RS256':
+        raise TokenInvalido('Algoritmo não aceito')
+    if not _rs256_valido(chave_publica(cabecalho.get('kid')), f'{cabecalho_b64}.{payload_b64}'.encode(), assinatura):
+        raise TokenInvalido('Assinatura inválida')
+
+    agora = time.time()
+    if not isinstance(claims.get('exp'), (int, float)) or claims['exp'] + JWT_TOLERANCIA <= agora:
+        raise TokenInvalido('Token expirado')
+    if claims.get('iss') != JWT_EMISSOR:
+        raise TokenInvalido('Emissor inválido')
+    # Cognito: id token traz o client id em aud; access token, em client_id
+    publico = claims.get('client_id') if claims.get('token_use') == 'access' else claims.get('aud')
+    if publico != COGNITO_CLIENT_ID:
+        raise TokenInvalido('Público inválido')
+
+    _cache_tokens.guardar(impressao, claims, ttl=claims['exp'] + JWT_TOLERANCIA - agora)
+    return claims
+
+
+def chave_publica(kid):
+    """(n, e) da chave do JWKS. O JWKS é buscado uma vez por container e de novo
+    quando aparece um kid desconhecido (rotação), no máximo a cada JWKS_RECARGA_MIN s."""
+    chave = _jwks['chaves'].get(kid)
+    if chave:
+        return chave
+    with _trava_jwks:
+        chave = _jwks['chaves'].get(kid)
+        if chave is None and time.monotonic() - _jwks['buscado_em'] >= JWKS_RECARGA_MIN:
+            _jwks['buscado_em'] = time.monotonic()
             try:
-                import base64
-                # JWT tem 3 partes: header.payload.signature
-                payload = token.split('.')[1]
-                # Adiciona padding se necessário
-                padding = 4 - len(payload) % 4
-                if padding != 4:
-                    payload += '=' * padding
-                decoded = json.loads(base64.b64decode(payload))
-                sub = decoded.get('sub')
-                if sub:
-                    print(f"✅ User ID extraído do JWT: {sub}")
-                    return sub
+                _jwks['chaves'] = carregar_jwks(JWKS_URL)
             except Exception as e:
-                print(f"⚠️ Erro ao decodificar JWT: {e}")
+                print(f"⚠️ Erro ao buscar JWKS: {e}")
+            chave = _jwks['chaves'].get(kid)
+    if chave is None:
+        raise TokenInvalido('Chave de assinatura desconhecida')
+    return chave
 
-        # Fallback: header X-User-Id (modo teste)
-        for key in headers:
-            if key.lower() == 'x-user-id':
-                return headers[key]
 
-        return None
-    except Exception:
-        return None
+def carregar_jwks(url):
+    with urllib.request.urlopen(url, timeout=3) as retorno:
+        jwks = json.loads(retorno.read())
+    return {
+        chave['kid']: (int.from_bytes(_b64url(chave['n']), 'big'), int.from_bytes(_b64url(chave['e']), 'big'))
+        for chave in jwks.get('keys', []) if chave.get('kty') == 'RSA'
+    }
+
+
+def _rs256_valido(chave, mensagem, assinatura):
+    """RSASSA-PKCS1-v1_5 com SHA-256: compara o bloco recuperado com o esperado."""
+    n, e = chave
+    tamanho = (n.bit_length() + 7) // 8
+    s = int.from_bytes(assinatura, 'big')
+    if len(assinatura) != tamanho or s >= n:
+        return False
+    recuperado = pow(s, e, n).to_bytes(tamanho, 'big')
+    resumo = _SHA256_DIGEST_INFO + hashlib.sha256(mensagem).digest()
+    esperado = b'\x00\x01' + b'\xff' * (tamanho - len(resumo) - 3) + b'\x00' + resumo
+    return hmac.compare_digest(recuperado, esperado)
+
+
+def _b64url(texto):
+    return base64.urlsafe_b64decode(texto + '=' * (-len(texto) % 4))
 
 
 # ══════════════════════════════════════
@@ -176,7 +820,7 @@ def extrair_user_id(event):
 
 def criar_conta(event):
     """Cria conta bancária. CPF vira chave PIX automaticamente."""
-    body = json.loads(event.get('body', '{}'))
+    body = ler_corpo(event)
     nome = body.get('nome')
     cpf = body.get('cpf')
 
@@ -209,8 +853,19 @@ def criar_conta(event):
         'ativo': True
     }
 
-    accounts_table.put_item(Item=item)
-    registrar_transacao(conta_id, 'ABERTURA', Decimal('0'), 'Conta criada')
+    # Conta e lançamento de abertura entram juntos: nunca há conta sem extrato
+    dynamodb.meta.client.transact_write_items(TransactItems=[
+        {'Put': {
+            'TableName': ACCOUNTS_TABLE,
+            'Item': item,
+            'ConditionExpression': 'attribute_not_exists(conta_id)'
+        }},
+        {'Put': {
+            'TableName': TRANSACTIONS_TABLE,
+            'Item': montar_transacao(conta_id, 'ABERTURA', Decimal('0'), 'Conta criada')
+        }}
+    ])
+    _cache_contas.guardar(user_id, conta_id)
 
     # Registra CPF como chave PIX automaticamente
     try:
@@ -227,6 +882,8 @@ def criar_conta(event):
         )
     except Exception:
         pass
+    else:
+        anotar_chave_registrada(cpf)
 
     return resposta(201, {
         'mensagem': 'Conta criada com sucesso! 🎉',
@@ -236,23 +893,122 @@ def criar_conta(event):
     })
 
 
-def minha_conta(user_id):
-    """Retorna conta do usuário logado com suas chaves PIX."""
-    conta = buscar_conta_por_user(user_id)
+def minha_conta(user_id, etag_cliente=None):
+    """Retorna conta do usuário logado com suas chaves PIX (304 se nada mudou)."""
+    conta_id = resolver_conta_id(user_id)
+    conta, chaves = em_paralelo(
+        lambda: buscar_conta(conta_id) if conta_id else None,
+        lambda: buscar_chaves_por_conta(conta_id) if conta_id else []
+    )
     if not conta:
         return resposta(404, {'erro': 'Você ainda não tem uma conta. Crie uma primeiro!'})
 
-    chaves = buscar_chaves_por_conta(conta['conta_id'])
+    saldo, versao = versao_conta(conta)
+    etag = gerar_etag(versao, *(c['chave'] for c in chaves)) if versao else None
+    if etag and etag == etag_cliente:
+        return nao_modificado(etag)
 
     return resposta(200, {
         'conta_id': conta['conta_id'],
         'nome': conta['nome'],
         'cpf': conta.get('cpf', ''),
-        'saldo': float(conta['saldo']),
+        'saldo': Dinheiro.do_dynamo(saldo),
         'chaves_pix': chaves,
         'criado_em': conta['criado_em'],
         'atualizado_em': conta['atualizado_em']
-    })
+    }, cabecalhos_cache(etag))
+
+
+# Seções do /painel: ?campos=conta,chaves,extrato (padrão: todas)
+PAINEL_CAMPOS = ('conta', 'chaves', 'extrato')
+
+
+def painel(user_id, params=None, etag_cliente=None):
+    """Conta, chaves PIX e lançamentos recentes numa resposta só, para a
+    abertura do app (antes: /minha-conta, /pix/chaves e /extrato).
+
+    Query string: campos (lista separada por vírgula) e limite (lançamentos).
+    A conta é resolvida uma vez; conta, chaves e a primeira página do extrato
+    são lidas ao mesmo tempo — com If-None-Match, o extrato só depois de
+    conferida a versão. proximo_cursor continua em /extrato?cursor=.
+    """
+    params = params or {}
+    campos = [c.strip() for c in (params.get('campos') or ','.join(PAINEL_CAMPOS)).split(',') if c.strip()]
+    if not campos or any(c not in PAINEL_CAMPOS for c in campos):
+        return resposta(400, {'erro': f"Campos devem ser: {', '.join(PAINEL_CAMPOS)}"})
+    try:
+        limite = min(int(params.get('limite') or EXTRATO_LIMITE_PADRAO), EXTRATO_LIMITE_MAX)
+    except ValueError:
+        return resposta(400, {'erro': 'Limite inválido'})
+    if limite <= 0:
+        return resposta(400, {'erro': 'Limite deve ser positivo'})
+
+    conta_id = resolver_conta_id(user_id)
+    if not conta_id:
+        return resposta(404, {'erro': 'Você ainda não tem uma conta. Crie uma primeiro!'})
+    def ler_recentes():
+        if 'extrato' not in campos:
+            return []
+        return list(itertools.islice(
+            iterar_transacoes(_condicao_faixa(conta_id), tamanho_pagina=limite + 1), limite + 1
+        ))
+
+    leituras = [lambda: buscar_conta(conta_id),
+                lambda: buscar_chaves_por_conta(conta_id) if 'chaves' in campos else []]
+    if etag_cliente:
+        # Requisição condicional: um 304 não paga a Query do extrato, que só
+        # é lida depois de a versão da conta mostrar que mudou
+        conta, chaves = em_paralelo(*leituras)
+        recentes = None
+    else:
+        # O extrato sai da tabela quente sem esperar a conta (e a fronteira do
+        # arquivo); _transacoes_recentes confere depois se a leitura serve
+        conta, chaves, recentes = em_paralelo(*leituras, ler_recentes)
+    if not conta:
+        return resposta(404, {'erro': 'Você ainda não tem uma conta. Crie uma primeiro!'})
+
+    saldo, versao = versao_conta(conta)
+    etag = gerar_etag(
+        versao, *campos, f'limite={limite}', *(c['chave'] for c in chaves)
+    ) if versao else None
+    if etag and etag == etag_cliente:
+        return nao_modificado(etag)
+    if recentes is None:
+        recentes = ler_recentes()
+
+    corpo = {'conta_id': conta['conta_id']}
+    if 'conta' in campos:
+        corpo['conta'] = {
+            'conta_id': conta['conta_id'],
+            'nome': conta['nome'],
+            'cpf': conta.get('cpf', ''),
+            'saldo': Dinheiro.do_dynamo(saldo),
+            'criado_em': conta['criado_em'],
+            'atualizado_em': conta['atualizado_em']
+        }
+    if 'chaves' in campos:
+        corpo['chaves_pix'] = chaves
+    if 'extrato' in campos:
+        pagina, proximo_cursor = _recortar_pagina(_transacoes_recentes(conta, recentes, limite), limite)
+        corpo['extrato'] = {
+            'transacoes': [_formatar_transacao(t) for t in pagina],
+            'proximo_cursor': proximo_cursor
+        }
+    return resposta(200, corpo, cabecalhos_cache(etag))
+
+
+def _transacoes_recentes(conta, recentes, limite):
+    """Os lançamentos lidos antes de conhecer a conta servem se ela nunca foi
+    arquivada ou se a página inteira está acima da fronteira; senão o extrato
+    é relido com iterar_extrato."""
+    fronteira = fronteira_arquivo(conta)
+    if fronteira < 0:
+        return recentes
+    primeiro_quente = limite_ulid(fronteira + 1)
+    acima = list(itertools.takewhile(lambda t: t['transacao_id'] >= primeiro_quente, recentes))
+    if len(acima) > limite:
+        return acima
+    return iterar_extrato(conta)
 
 
 def consultar_saldo(conta_id):
@@ -263,7 +1019,7 @@ def consultar_saldo(conta_id):
     return resposta(200, {
         'conta_id': conta['conta_id'],
         'nome': conta['nome'],
-        'saldo': float(conta['saldo']),
+        'saldo': Dinheiro.do_dynamo(saldo_total(conta)),
         'atualizado_em': conta['atualizado_em']
     })
 
@@ -277,30 +1033,34 @@ def depositar(event, user_id):
     if not conta:
         return resposta(404, {'erro': 'Conta não encontrada'})
 
-    body = json.loads(event.get('body', '{}'))
-    valor = body.get('valor')
-
-    if not valor or float(valor) <= 0:
-        return resposta(400, {'erro': 'Valor deve ser positivo'})
+    body = ler_corpo(event)
+    try:
+        valor = Dinheiro.positivo(body.get('valor'))
+    except ValueError as e:
+        return resposta(400, {'erro': str(e)})
 
-    valor = Decimal(str(valor))
     conta_id = conta['conta_id']
+    lancamento = montar_transacao(conta_id, 'DEPOSITO', valor.decimal(), body.get('descricao', 'Depósito'))
 
-    novo_saldo = accounts_table.update_item(
-        Key={'conta_id': conta_id},
-        UpdateExpression='SET saldo = saldo + :val, atualizado_em = :now',
-        ExpressionAttributeValues={
-            ':val': valor,
-            ':now': datetime.now(timezone.utc).isoformat()
-        },
-        ReturnValues='ALL_NEW'
-    )
-
-    registrar_transacao(conta_id, 'DEPOSITO', valor, body.get('descricao', 'Depósito'))
+    try:
+        falhou = gravar_com_lancamento({
+            'TableName': ACCOUNTS_TABLE,
+            'Key': {'conta_id': conta_id},
+            'UpdateExpression': 'SET saldo = saldo + :val, atualizado_em = :now',
+            'ConditionExpression': 'attribute_exists(conta_id)',
+            'ExpressionAttributeValues': {
+                ':val': lancamento['valor'],
+                ':now': datetime.now(timezone.utc).isoformat()
+            }
+        }, lancamento)
+    except TransferenciaRecusada as e:
+        return resposta(e.status, {'erro': e.mensagem})
+    if falhou is not None:
+        return resposta(404, {'erro': 'Conta não encontrada'})
 
     return resposta(200, {
-        'mensagem': f'Depósito de R$ {float(valor):.2f} realizado! 💰',
-        'saldo_atual': float(novo_saldo['Attributes']['saldo'])
+        'mensagem': f'Depósito de R$ {valor} realizado! 💰',
+        'saldo_atual': Dinheiro.do_dynamo(com_shards(conta, conta['saldo'] + lancamento['valor']))
     })
 
 
@@ -309,91 +1069,129 @@ def sacar(event, user_id):
     if not conta:
         return resposta(404, {'erro': 'Conta não encontrada'})
 
-    body = json.loads(event.get('body', '{}'))
-    valor = body.get('valor')
-
-    if not valor or float(valor) <= 0:
-        return resposta(400, {'erro': 'Valor deve ser positivo'})
+    body = ler_corpo(event)
+    try:
+        valor = Dinheiro.positivo(body.get('valor'))
+    except ValueError as e:
+        return resposta(400, {'erro': str(e)})
 
-    valor = Decimal(str(valor))
     conta_id = conta['conta_id']
-
-    if conta['saldo'] < valor:
+    conta = garantir_saldo(conta, valor)
+    if Dinheiro.do_dynamo(conta['saldo']) < valor:
         return resposta(400, {
             'erro': 'Saldo insuficiente 😢',
-            'saldo_atual': float(conta['saldo'])
+            'saldo_atual': Dinheiro.do_dynamo(saldo_total(conta))
         })
 
+    lancamento = montar_transacao(conta_id, 'SAQUE', valor.decimal(), body.get('descricao', 'Saque'))
     try:
-        novo_saldo = accounts_table.update_item(
-            Key={'conta_id': conta_id},
-            UpdateExpression='SET saldo = saldo - :val, atualizado_em = :now',
-            ConditionExpression='saldo >= :val',
-            ExpressionAttributeValues={
-                ':val': valor,
+        debito = escrita_debito(conta, lancamento['valor'], {
+            'TableName': ACCOUNTS_TABLE,
+            'Key': {'conta_id': conta_id},
+            'UpdateExpression': 'SET saldo = saldo - :val, atualizado_em = :now',
+            'ConditionExpression': 'saldo >= :val',
+            'ExpressionAttributeValues': {
+                ':val': lancamento['valor'],
                 ':now': datetime.now(timezone.utc).isoformat()
             },
-            ReturnValues='ALL_NEW'
-        )
-    except Exception:
+            'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'
+        })
+        falhou = gravar_com_lancamento(debito, lancamento)
+    except LimiteExcedido as e:
+        return resposta(400, {'erro': str(e)})
+    except TransferenciaRecusada as e:
+        return resposta(e.status, {'erro': e.mensagem})
+    if falhou is not None:
+        # Outro débito passou na frente: a conta devolvida diz se faltou saldo ou limite
+        try:
+            conferir_limites(falhou or conta, lancamento['valor'])
+        except LimiteExcedido as limite:
+            return resposta(400, {'erro': str(limite)})
         return resposta(400, {'erro': 'Saldo insuficiente (verificação concorrente)'})
 
-    registrar_transacao(conta_id, 'SAQUE', valor, body.get('descricao', 'Saque'))
-
     return resposta(200, {
-        'mensagem': f'Saque de R$ {float(valor):.2f} realizado! 🏧',
-        'saldo_atual': float(novo_saldo['Attributes']['saldo'])
+        'mensagem': f'Saque de R$ {valor} realizado! 🏧',
+        'saldo_atual': Dinheiro.do_dynamo(com_shards(conta, conta['saldo'] - lancamento['valor']))
     })
 
 
-def transferir_legado(event):
-    """Legado v1: transferência por conta_id."""
-    body = json.loads(event.get('body', '{}'))
+def gravar_com_lancamento(escrita, lancamento):
+    """Escrita do saldo e lançamento do extrato numa única TransactWriteItems.
+
+    Depósito e saque têm um lançamento só: ele vai junto com o saldo e a
+    operação custa uma ida ao banco. A condição da
+    escrita não depende do saldo lido, então o saldo_atual das respostas é o
+    lido mais o movimento. Conflitos com outras transações na conta são
+    repetidos com espera aleatória. Retorna None se gravou ou, se a condição
+    da escrita falhou, a conta devolvida pela falha ({} sem ALL_OLD).
+    """
+    for tentativa in range(TRANSFERENCIA_MAX_TENTATIVAS):
+        try:
+            dynamodb.meta.client.transact_write_items(TransactItems=[
+                {'Update': escrita},
+                {'Put': {
+                    'TableName': TRANSACTIONS_TABLE,
+                    'Item': lancamento,
+                    'ConditionExpression': 'attribute_not_exists(transacao_id)'
+                }}
+            ])
+            return None
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise
+            motivo = (e.response.get('CancellationReasons') or [{}])[0]
+        if motivo.get('Code') == 'ConditionalCheckFailed':
+            return _item_dynamo(motivo.get('Item'))
+        time.sleep(random.uniform(0, 0.02 * 2 ** tentativa))
+    raise TransferenciaRecusada(409, 'Conta em uso por outra operação, tente novamente')
+
+
+def transferir_legado(event, user_id):
+    """Legado v1: transferência por conta_id, só a partir de conta do usuário e
+    com os limites de débito, como no PIX."""
+    body = ler_corpo(event)
     origem_id = body.get('conta_origem')
     destino_id = body.get('conta_destino')
-    valor = body.get('valor')
 
-    if not origem_id or not destino_id or not valor:
+    if not origem_id or not destino_id or not body.get('valor'):
         return resposta(400, {'erro': 'conta_origem, conta_destino e valor são obrigatórios'})
 
-    valor = Decimal(str(valor))
-    if valor <= 0:
-        return resposta(400, {'erro': 'Valor deve ser positivo'})
+    try:
+        valor = Dinheiro.positivo(body['valor'])
+    except ValueError as e:
+        return resposta(400, {'erro': str(e)})
     if origem_id == destino_id:
         return resposta(400, {'erro': 'Contas devem ser diferentes'})
 
-    conta_origem = buscar_conta(origem_id)
-    conta_destino = buscar_conta(destino_id)
+    contas = buscar_contas([origem_id, destino_id])
+    conta_origem = contas.get(origem_id)
+    conta_destino = contas.get(destino_id)
     if not conta_origem:
         return resposta(404, {'erro': 'Conta de origem não encontrada'})
+    if conta_origem.get('user_id') != user_id:
+        return resposta(403, {'erro': 'A conta de origem não pertence a você'})
     if not conta_destino:
         return resposta(404, {'erro': 'Conta de destino não encontrada'})
-    if conta_origem['saldo'] < valor:
+    conta_origem = garantir_saldo(conta_origem, valor)
+    if Dinheiro.do_dynamo(conta_origem['saldo']) < valor:
         return resposta(400, {'erro': 'Saldo insuficiente'})
 
-    agora = datetime.now(timezone.utc).isoformat()
-
-    accounts_table.update_item(
-        Key={'conta_id': origem_id},
-        UpdateExpression='SET saldo = saldo - :val, atualizado_em = :now',
-        ConditionExpression='saldo >= :val',
-        ExpressionAttributeValues={':val': valor, ':now': agora}
-    )
-    accounts_table.update_item(
-        Key={'conta_id': destino_id},
-        UpdateExpression='SET saldo = saldo + :val, atualizado_em = :now',
-        ExpressionAttributeValues={':val': valor, ':now': agora}
-    )
-
     descricao = body.get('descricao', 'Transferência')
-    registrar_transacao(origem_id, 'TRANSFERENCIA_ENVIADA', valor, f'{descricao} para {conta_destino["nome"]}')
-    registrar_transacao(destino_id, 'TRANSFERENCIA_RECEBIDA', valor, f'{descricao} de {conta_origem["nome"]}')
+    try:
+        executar_transferencia(
+            conta_origem, destino_id, valor.decimal(),
+            ('TRANSFERENCIA_ENVIADA', f'{descricao} para {conta_destino["nome"]}'),
+            ('TRANSFERENCIA_RECEBIDA', f'{descricao} de {conta_origem["nome"]}'),
+            shards_destino=shards_da_conta(conta_destino), limitar=True
+        )
+    except TransferenciaRecusada as e:
+        return resposta(e.status, {'erro': e.mensagem})
 
     return resposta(200, {
-        'mensagem': f'Transferência de R$ {float(valor):.2f} realizada! 🔄',
+        'mensagem': f'Transferência de R$ {valor} realizada! 🔄',
         'de': conta_origem['nome'],
         'para': conta_destino['nome'],
-        'valor': float(valor)
+        'valor': valor
     })
 
 
@@ -411,7 +1209,7 @@ def registrar_chave_pix(event, user_id):
     if not conta:
         return resposta(404, {'erro': 'Crie uma conta primeiro'})
 
-    body = json.loads(event.get('body', '{}'))
+    body = ler_corpo(event)
     tipo = body.get('tipo', '').upper()
     valor = body.get('valor', '')
 
@@ -423,6 +1221,8 @@ def registrar_chave_pix(event, user_id):
 
     if not valor:
         return resposta(400, {'erro': 'Valor da chave é obrigatório'})
+    if valor.startswith(PREFIXO_INTERNO):
+        return resposta(400, {'erro': f'Chave não pode começar com {PREFIXO_INTERNO}'})
 
     # Verifica limite de 5 chaves
     chaves = buscar_chaves_por_conta(conta['conta_id'])
@@ -439,12 +1239,14 @@ def registrar_chave_pix(event, user_id):
                 'conta_id': conta['conta_id'],
                 'user_id': user_id,
                 'nome_titular': conta['nome'],
-                'criado_em': agora
+                'criado_em': agora,
+                **({'shards_saldo': conta['shards_saldo']} if shards_da_conta(conta) else {})
             },
             ConditionExpression='attribute_not_exists(chave_valor)'
         )
     except Exception:
         return resposta(409, {'erro': 'Esta chave PIX já está cadastrada por outra conta'})
+    anotar_chave_registrada(valor)
 
     return resposta(201, {
         'mensagem': f'Chave PIX registrada! 🔑',
@@ -471,7 +1273,7 @@ def remover_chave_pix(event, user_id):
     if not conta:
         return resposta(404, {'erro': 'Conta não encontrada'})
 
-    body = json.loads(event.get('body', '{}'))
+    body = ler_corpo(event)
     chave_valor = body.get('chave', '')
 
     if not chave_valor:
@@ -483,21 +1285,20 @@ def remover_chave_pix(event, user_id):
         return resposta(404, {'erro': 'Chave não encontrada ou não pertence a você'})
 
     pix_keys_table.delete_item(Key={'chave_valor': chave_valor})
+    _cache_chaves_pix.remover(chave_valor)
 
     return resposta(200, {'mensagem': 'Chave PIX removida! 🗑️'})
 
 
 def buscar_por_chave_pix(event):
     """Busca titular de uma chave PIX (para mostrar nome antes de confirmar)."""
-    body = json.loads(event.get('body', '{}'))
+    body = ler_corpo(event)
     chave = body.get('chave', '').strip()
 
     if not chave:
         return resposta(400, {'erro': 'Informe a chave PIX'})
 
-    resultado = pix_keys_table.get_item(Key={'chave_valor': chave})
-    item = resultado.get('Item')
-
+    item = resolver_chave_pix(chave)
     if not item:
         return resposta(404, {'erro': 'Chave PIX não encontrada'})
 
@@ -511,26 +1312,25 @@ def buscar_por_chave_pix(event):
 
 def transferir_pix(event, user_id):
     """Transferência via chave PIX."""
-    conta_origem = buscar_conta_por_user(user_id)
-    if not conta_origem:
-        return resposta(404, {'erro': 'Conta de origem não encontrada'})
-
-    body = json.loads(event.get('body', '{}'))
+    body = ler_corpo(event)
     chave = body.get('chave', '').strip()
-    valor = body.get('valor')
     descricao = body.get('descricao', 'PIX')
 
-    if not chave or not valor:
+    if not chave or not body.get('valor'):
         return resposta(400, {'erro': 'Chave PIX e valor são obrigatórios'})
 
-    valor = Decimal(str(valor))
-    if valor <= 0:
-        return resposta(400, {'erro': 'Valor deve ser positivo'})
-
-    # Busca destinatário pela chave
-    resultado_pix = pix_keys_table.get_item(Key={'chave_valor': chave})
-    item_pix = resultado_pix.get('Item')
-
+    try:
+        valor = Dinheiro.positivo(body['valor'])
+    except ValueError as e:
+        return resposta(400, {'erro': str(e)})
+
+    # Conta de origem e destinatário da chave não dependem um do outro
+    conta_origem, item_pix = em_paralelo(
+        lambda: buscar_conta_por_user(user_id),
+        lambda: resolver_chave_pix(chave)
+    )
+    if not conta_origem:
+        return resposta(404, {'erro': 'Conta de origem não encontrada'})
     if not item_pix:
         return resposta(404, {'erro': 'Chave PIX não encontrada'})
 
@@ -539,163 +1339,2948 @@ def transferir_pix(event, user_id):
     if conta_destino_id == conta_origem['conta_id']:
         return resposta(400, {'erro': 'Não é possível fazer PIX para você mesmo'})
 
-    if conta_origem['saldo'] < valor:
+    conta_origem = garantir_saldo(conta_origem, valor)
+    if Dinheiro.do_dynamo(conta_origem['saldo']) < valor:
         return resposta(400, {
             'erro': 'Saldo insuficiente 😢',
-            'saldo_atual': float(conta_origem['saldo'])
+            'saldo_atual': Dinheiro.do_dynamo(saldo_total(conta_origem))
         })
 
-    conta_destino = buscar_conta(conta_destino_id)
-    if not conta_destino:
-        return resposta(404, {'erro': 'Conta de destino não encontrada'})
+    # Débito, crédito e lançamentos numa única escrita transacional
+    try:
+        saldo_atual = executar_transferencia(
+            conta_origem, conta_destino_id, valor.decimal(),
+            ('PIX_ENVIADO', f'{descricao} para {item_pix["nome_titular"]} (chave: {chave})'),
+            ('PIX_RECEBIDO', f'{descricao} de {conta_origem["nome"]}'),
+            shards_destino=shards_da_conta(item_pix), limitar=True
+        )
+    except TransferenciaRecusada as e:
+        return resposta(e.status, {'erro': e.mensagem})
 
-    agora = datetime.now(timezone.utc).isoformat()
+    return resposta(200, {
+        'mensagem': f'PIX de R$ {valor} enviado! ⚡',
+        'para': item_pix['nome_titular'],
+        'chave': chave,
+        'valor': valor,
+        'saldo_atual': Dinheiro.do_dynamo(com_shards(conta_origem, saldo_atual))
+    })
+
+
+def transferir_pix_lote(event, user_id):
+    """PIX em lote: resolve as chaves de uma vez, confere o total e paga os itens em paralelo.
+
+    Corpo: {"itens": [{"chave": ..., "valor": ..., "descricao": ...}, ...]}.
+    Cada item é uma TransactWriteItems própria (débito, crédito e os dois
+    lançamentos): um item que falha não debita nada e uma interrupção no
+    meio do lote não deixa saldo sem lançamento. Devolve o resultado de cada
+    item na ordem recebida.
+    """
+    body = ler_corpo(event)
+    itens = body.get('itens') or []
+    if not isinstance(itens, list) or not itens:
+        return resposta(400, {'erro': 'Informe os itens do lote'})
+    if len(itens) > LOTE_MAX_ITENS:
+        return resposta(400, {'erro': f'Máximo de {LOTE_MAX_ITENS} itens por lote'})
+
+    resultados = [None] * len(itens)
+    validos = []
+    for indice, item in enumerate(itens):
+        if not isinstance(item, dict):
+            resultados[indice] = _resultado_lote(indice, '', None, 'Item deve ser um objeto com chave e valor')
+            continue
+        chave = str(item.get('chave', '')).strip()
+        try:
+            valor = Dinheiro.positivo(item.get('valor'))
+        except ValueError:
+            valor = None
+        if not chave or valor is None:
+            resultados[indice] = _resultado_lote(indice, chave, item.get('valor'), 'Chave e valor positivo são obrigatórios')
+            continue
+        validos.append((indice, chave, valor, item.get('descricao') or body.get('descricao') or 'PIX'))
+
+    # Uma BatchGetItem (em blocos de 100) resolve todas as chaves, junto com a conta de origem
+    conta_origem, chaves_pix = em_paralelo(
+        lambda: buscar_conta_por_user(user_id),
+        lambda: buscar_chaves_pix_em_lote({chave for _, chave, _, _ in validos})
+    )
+    if not conta_origem:
+        return resposta(404, {'erro': 'Conta de origem não encontrada'})
 
-    # Debita origem
+    a_pagar = []
+    for indice, chave, valor, descricao in validos:
+        item_pix = chaves_pix.get(chave)
+        if not item_pix:
+            resultados[indice] = _resultado_lote(indice, chave, valor, 'Chave PIX não encontrada')
+        elif item_pix['conta_id'] == conta_origem['conta_id']:
+            resultados[indice] = _resultado_lote(indice, chave, valor, 'Não é possível fazer PIX para você mesmo')
+        else:
+            a_pagar.append((indice, chave, valor, descricao, item_pix))
+
+    total = sum((valor for _, _, valor, _, _ in a_pagar), Dinheiro(0))
+    conta_origem = garantir_saldo(conta_origem, total)
+    enviado = Dinheiro(0)
+
+    if a_pagar:
+        # Confere o total antes de qualquer escrita: um lote que não cabe é recusado inteiro
+        if conta_origem['saldo'] < total.decimal():
+            return resposta(400, {
+                'erro': 'Saldo insuficiente para o lote 😢',
+                'total': total,
+                'saldo_atual': Dinheiro.do_dynamo(saldo_total(conta_origem))
+            })
+        try:
+            conferir_limites(conta_origem, total.decimal())
+        except LimiteExcedido as e:
+            return resposta(400, {'erro': str(e), 'total': total})
+
+        def pagar(pagamento):
+            indice, chave, valor, descricao, item_pix = pagamento
+            try:
+                _pagar_item_lote(conta_origem, item_pix, chave, valor.decimal(), descricao)
+                return _resultado_lote(indice, chave, valor, para=item_pix['nome_titular'])
+            except TransferenciaRecusada as e:
+                return _resultado_lote(indice, chave, valor, e.mensagem)
+            except Exception as e:
+                print(f"⚠️ Falha no item {indice} do lote: {e}")
+                return _resultado_lote(indice, chave, valor, 'Falha ao enviar o PIX')
+
+        for pagamento, resultado in zip(a_pagar, executar_em_paralelo(pagar, a_pagar, LOTE_PARALELISMO)):
+            resultados[resultado['indice']] = resultado
+            if resultado['status'] == 'ok':
+                enviado += pagamento[2]
+
+    enviados = sum(1 for r in resultados if r['status'] == 'ok')
+    return resposta(200, {
+        'mensagem': f'Lote processado: {enviados} de {len(itens)} PIX enviados ⚡',
+        'total_enviado': enviado,
+        'saldo_atual': Dinheiro.do_dynamo(com_shards(conta_origem, conta_origem['saldo'] - enviado.decimal())),
+        'resultados': resultados
+    })
+
+
+def _pagar_item_lote(conta_origem, item_pix, chave, valor, descricao):
+    """Débito, crédito e os dois lançamentos de um item numa TransactWriteItems.
+
+    O débito é condicionado a `saldo >= valor` e aos tetos dos limites,
+    condições que valem em qualquer ordem: os itens do lote correm em paralelo
+    e só repetem em conflito de transação. Nada fica debitado sem lançamento.
+    """
+    origem_id = conta_origem['conta_id']
+    for tentativa in range(LOTE_TENTATIVAS):
+        agora = datetime.now(timezone.utc).isoformat()
+        try:
+            debito = escrita_debito(conta_origem, valor, {
+                'TableName': ACCOUNTS_TABLE,
+                'Key': {'conta_id': origem_id},
+                'UpdateExpression': 'SET saldo = saldo - :val, atualizado_em = :now',
+                'ConditionExpression': 'saldo >= :val',
+                'ExpressionAttributeValues': {':val': valor, ':now': agora},
+                'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'
+            })
+        except LimiteExcedido as e:
+            raise TransferenciaRecusada(400, str(e))
+        try:
+            dynamodb.meta.client.transact_write_items(TransactItems=[
+                {'Update': debito},
+                operacao_credito(item_pix['conta_id'], valor, agora, shards_da_conta(item_pix)),
+                {'Put': {
+                    'TableName': TRANSACTIONS_TABLE,
+                    'Item': montar_transacao(
+                        origem_id, 'PIX_ENVIADO', valor,
+                        f'{descricao} para {item_pix["nome_titular"]} (chave: {chave})'
+                    ),
+                    'ConditionExpression': 'attribute_not_exists(transacao_id)'
+                }},
+                {'Put': {
+                    'TableName': TRANSACTIONS_TABLE,
+                    'Item': montar_transacao(item_pix['conta_id'], 'PIX_RECEBIDO', valor,
+                                             f'{descricao} de {conta_origem["nome"]}'),
+                    'ConditionExpression': 'attribute_not_exists(transacao_id)'
+                }}
+            ])
+            return
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise
+            motivos = e.response.get('CancellationReasons') or [{}, {}]
+
+        debito_falhou, credito_falhou = (m.get('Code') == 'ConditionalCheckFailed' for m in motivos[:2])
+        if credito_falhou:
+            raise TransferenciaRecusada(404, 'Conta de destino não encontrada')
+        if debito_falhou:
+            # Saldo ou limite consumidos por outros itens: a conta devolvida diz qual
+            atual = _item_dynamo(motivos[0].get('Item')) or conta_origem
+            if atual.get('saldo', Decimal('0')) < valor:
+                raise TransferenciaRecusada(400, 'Saldo insuficiente 😢')
+            try:
+                conferir_limites(atual, valor)
+            except LimiteExcedido as limite:
+                raise TransferenciaRecusada(400, str(limite))
+        # Conflito transacional com outro item do lote: tenta de novo, com espera aleatória
+        time.sleep(random.uniform(0, 0.02 * 2 ** tentativa))
+    raise TransferenciaRecusada(409, 'Conta em uso por outra operação, tente novamente')
+
+
+def _resultado_lote(indice, chave, valor, erro=None, para=None):
+    resultado = {
+        'indice': indice,
+        'chave': chave,
+        'valor': valor,
+        'status': 'erro' if erro else 'ok'
+    }
+    if erro:
+        resultado['erro'] = erro
+    if para:
+        resultado['para'] = para
+    return resultado
+
+
+# ══════════════════════════════════════
+# 🔎 RESOLUÇÃO DE CHAVES PIX
+# ══════════════════════════════════════
+# /pix/buscar seguido de /pix/enviar lê a mesma chave duas vezes, e robôs que
+# enumeram chaves pagam uma leitura por tentativa. Antes do GetItem:
+#   1. cache das chaves encontradas (invalidado por remover_chave_pix);
+#   2. cache das ausentes confirmadas por leitura;
+#   3. filtro de Bloom das chaves existentes, gerado de um scan ou export da
+#      tabela. "Não está no filtro" só vale como ausência se a chave também
+#      não foi registrada depois da geração: os registros anotam a chave numa
+#      das fatias da hora (`#recentes#AAAAMMDDHH#FF`, pelo hash da chave),
+#      lida com cache curto — a consulta de uma chave só lê a fatia dela. A
+#      importação em lote, e um registro cuja anotação falhou, marcam no item
+#      da hora (`#recentes#AAAAMMDDHH`) o instante da escrita sem anotação
+#      (`sem_anotacao_ms`), o que desliga o filtro até a próxima geração.
+
+# Itens internos na tabela de chaves (não são chaves PIX)
+PREFIXO_INTERNO = '#'
+CAMPOS_CHAVE_PIX = 'chave_valor, chave_tipo, conta_id, nome_titular, shards_saldo'
+
+_filtro_chaves = {'filtro': None, 'verificado_em': float('-inf')}
+_trava_filtro = threading.Lock()
+
+
+def resolver_chave_pix(chave):
+    """Item da chave PIX (só os campos usados nos PIX) ou None."""
+    item = _cache_chaves_pix.obter(chave)
+    if item:
+        return item
+    if chave_ausente_sem_leitura(chave):
+        return None
+
+    item = pix_keys_table.get_item(
+        Key={'chave_valor': chave}, ProjectionExpression=CAMPOS_CHAVE_PIX
+    ).get('Item')
+    if item:
+        _cache_chaves_pix.guardar(chave, item)
+    else:
+        _cache_chaves_ausentes.guardar(chave, True)
+    return item
+
+
+def chave_ausente_sem_leitura(chave):
+    """True quando dá para afirmar que a chave não existe sem ler a tabela."""
+    if not chave or chave.startswith(PREFIXO_INTERNO) or _cache_chaves_ausentes.obter(chave):
+        return True
+    filtro = filtro_chaves_pix()
+    if filtro is None or chave in filtro:
+        return False
+    fatia = fatia_recentes(chave)
+    registradas = chaves_registradas_desde(filtro.gerado_em, fatia)
+    return registradas is not None and chave not in registradas
+
+
+def anotar_chave_registrada(chave):
+    """Chave nova: sai do cache de ausentes e entra na fatia da hora, para os filtros já gerados.
+
+    Chamada depois de a chave já estar gravada, então não falha: sem a
+    anotação, marca a hora como sem anotação e desliga o filtro local, e as
+    consultas voltam a ler a tabela.
+    """
+    _cache_chaves_ausentes.remover(chave)
+    if not FILTRO_CHAVES_PIX:
+        return
+    fatia = fatia_recentes(chave)
+    _cache_recentes.remover(fatia)
+    agora = datetime.now(timezone.utc)
     try:
-        accounts_table.update_item(
-            Key={'conta_id': conta_origem['conta_id']},
-            UpdateExpression='SET saldo = saldo - :val, atualizado_em = :now',
-            ConditionExpression='saldo >= :val',
-            ExpressionAttributeValues={':val': valor, ':now': agora}
+        pix_keys_table.update_item(
+            Key={'chave_valor': _chave_recentes(agora, fatia)},
+            UpdateExpression='ADD chaves :chave',
+            ExpressionAttributeValues={':chave': {chave}}
         )
-    except Exception:
-        return resposta(400, {'erro': 'Saldo insuficiente (verificação concorrente)'})
+    except Exception as e:
+        print(f"⚠️ Chave {chave} sem anotação em recentes, filtro desligado: {e}")
+        _filtro_chaves['filtro'] = None
+        _filtro_chaves['verificado_em'] = time.monotonic()
+        marcar_sem_anotacao(agora)
 
-    # Credita destino
-    accounts_table.update_item(
-        Key={'conta_id': conta_destino_id},
-        UpdateExpression='SET saldo = saldo + :val, atualizado_em = :now',
-        ExpressionAttributeValues={':val': valor, ':now': agora}
-    )
 
-    registrar_transacao(
-        conta_origem['conta_id'], 'PIX_ENVIADO', valor,
-        f'{descricao} para {conta_destino["nome"]} (chave: {chave})'
-    )
-    registrar_transacao(
-        conta_destino_id, 'PIX_RECEBIDO', valor,
-        f'{descricao} de {conta_origem["nome"]}'
+def marcar_sem_anotacao(instante):
+    """Chaves gravadas sem anotação na hora de `instante`: os filtros gerados antes não servem."""
+    try:
+        pix_keys_table.update_item(
+            Key={'chave_valor': _chave_recentes(instante)},
+            UpdateExpression='SET sem_anotacao_ms = :ms',
+            ExpressionAttributeValues={':ms': int(instante.timestamp() * 1000)}
+        )
+    except Exception as e:
+        print(f"⚠️ Não foi possível desligar o filtro de chaves nos outros containers: {e}")
+
+
+def chaves_registradas_desde(gerado_em_ms, fatia):
+    """Chaves da fatia registradas a partir da hora em que o filtro foi gerado (cache de poucos segundos).
+
+    None se chaves foram gravadas sem anotação depois do filtro (importação em
+    lote, anotação que falhou): o filtro não serve até ser gerado de novo.
+    """
+    recentes = _cache_recentes.obter(fatia)
+    if recentes is not None and recentes[0] == gerado_em_ms:
+        return recentes[1]
+
+    hora = datetime.fromtimestamp(gerado_em_ms / 1000, timezone.utc).replace(minute=0, second=0, microsecond=0)
+    agora = datetime.now(timezone.utc)
+    itens = []
+    while hora <= agora:
+        itens += [_chave_recentes(hora), _chave_recentes(hora, fatia)]
+        hora += timedelta(hours=1)
+    chaves = set()
+    for item in buscar_itens_pix(itens):
+        # importacao_ms: marca gravada antes de existir sem_anotacao_ms
+        if max(item.get('sem_anotacao_ms', -1), item.get('importacao_ms', -1)) >= gerado_em_ms:
+            chaves = None
+            break
+        chaves |= item.get('chaves', set())
+    _cache_recentes.guardar(fatia, (gerado_em_ms, chaves))
+    return chaves
+
+
+def buscar_itens_pix(chaves):
+    """BatchGetItem simples na tabela de chaves, com leitura consistente."""
+    itens = []
+    for i in range(0, len(chaves), 100):
+        pedido = {PIX_KEYS_TABLE: {'Keys': [{'chave_valor': c} for c in chaves[i:i + 100]], 'ConsistentRead': True}}
+        while pedido:
+            resultado = dynamodb.batch_get_item(RequestItems=pedido)
+            itens.extend(resultado.get('Responses', {}).get(PIX_KEYS_TABLE, []))
+            pedido = resultado.get('UnprocessedKeys')
+    return itens
+
+
+def fatia_recentes(chave):
+    return zlib.crc32(chave.encode()) % FILTRO_RECENTES_FATIAS
+
+
+def _chave_recentes(instante, fatia=None):
+    """Item da hora (marcas) ou, com `fatia`, a fatia da hora com as chaves anotadas."""
+    hora = f'{PREFIXO_INTERNO}recentes#{instante:%Y%m%d%H}'
+    return hora if fatia is None else f'{hora}#{fatia:02d}'
+
+
+def filtro_chaves_pix():
+    """Filtro em uso, recarregado a cada FILTRO_RECARGA s. Sem filtro, velho demais ou
+    com erro de leitura devolve None e tudo segue para a tabela."""
+    if not FILTRO_CHAVES_PIX:
+        return None
+    if time.monotonic() - _filtro_chaves['verificado_em'] > FILTRO_RECARGA:
+        with _trava_filtro:
+            if time.monotonic() - _filtro_chaves['verificado_em'] > FILTRO_RECARGA:
+                try:
+                    _filtro_chaves['filtro'] = FiltroBloom.carregar(ler_arquivo(FILTRO_CHAVES_PIX))
+                except Exception as e:
+                    print(f"⚠️ Filtro de chaves PIX indisponível: {e}")
+                    _filtro_chaves['filtro'] = None
+                _filtro_chaves['verificado_em'] = time.monotonic()
+    filtro = _filtro_chaves['filtro']
+    if filtro is None or time.time() * 1000 - filtro.gerado_em > FILTRO_IDADE_MAX_HORAS * 3_600_000:
+        return None
+    return filtro
+
+
+def ler_arquivo(caminho):
+    if caminho.startswith('s3://'):
+        bucket, chave = caminho[5:].split('/', 1)
+        return s3.get_object(Bucket=bucket, Key=chave)['Body'].read()
+    with open(caminho, 'rb') as arquivo:
+        return arquivo.read()
+
+
+def gravar_arquivo(caminho, dados):
+    if caminho.startswith('s3://'):
+        bucket, chave = caminho[5:].split('/', 1)
+        s3.put_object(Bucket=bucket, Key=chave, Body=dados)
+        return
+    os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+    with open(caminho, 'wb') as arquivo:
+        arquivo.write(dados)
+
+
+def tarefa_reconstruir_filtro_chaves(event):
+    """Gera o filtro de Bloom com um scan da tabela de chaves e grava em FILTRO_CHAVES_PIX.
+
+    O instante de geração é o início do scan: chaves registradas durante ele
+    ficam cobertas pelos itens de recentes. Apaga os itens de recentes que
+    nenhum filtro em uso ainda precisa.
+    """
+    destino = event.get('destino') or FILTRO_CHAVES_PIX
+    if not destino:
+        raise ValueError('Defina FILTRO_CHAVES_PIX ou informe destino')
+    gerado_em = int(time.time() * 1000)
+
+    chaves, internos = [], []
+    params = {'ProjectionExpression': 'chave_valor'}
+    while True:
+        resultado = pix_keys_table.scan(**params)
+        for item in resultado.get('Items', []):
+            (internos if item['chave_valor'].startswith(PREFIXO_INTERNO) else chaves).append(item['chave_valor'])
+        if 'LastEvaluatedKey' not in resultado:
+            break
+        params['ExclusiveStartKey'] = resultado['LastEvaluatedKey']
+
+    filtro = FiltroBloom.dimensionar(len(chaves), FILTRO_FALSO_POSITIVO, gerado_em)
+    for chave in chaves:
+        filtro.adicionar(chave)
+    gravar_arquivo(destino, filtro.serializar())
+
+    # Containers podem usar o filtro anterior até FILTRO_RECARGA depois desta troca
+    limite = _chave_recentes(datetime.now(timezone.utc) - timedelta(hours=2))
+    antigos = [c for c in internos if c.startswith(f'{PREFIXO_INTERNO}recentes#') and c < limite]
+    with pix_keys_table.batch_writer() as lote:
+        for chave in antigos:
+            lote.delete_item(Key={'chave_valor': chave})
+    return {'chaves': len(chaves), 'bits': filtro.bits, 'hashes': filtro.hashes, 'recentes_apagados': len(antigos)}
+
+
+# ══════════════════════════════════════
+# 🔄 MOTOR DE TRANSFERÊNCIA
+# ══════════════════════════════════════
+
+# O client do resource já converte tipos Python; só os motivos de
+# cancelamento voltam no formato bruto do DynamoDB.
+_desserializador = TypeDeserializer()
+
+# Tentativas de uma transferência em conflito transacional com outra escrita na conta
+TRANSFERENCIA_MAX_TENTATIVAS = 5
+
+
+class TransferenciaRecusada(Exception):
+    """Transferência não efetivada; carrega o status HTTP e a mensagem ao cliente."""
+
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+        self.mensagem = mensagem
+
+
+def executar_transferencia(conta_origem, conta_destino_id, valor, lancamento_origem, lancamento_destino,
+                           shards_destino=0, limitar=False, extras=()):
+    """Débito, crédito e os dois lançamentos do extrato numa única TransactWriteItems.
+
+    O débito é condicionado a `saldo >= valor`, não ao saldo lido: créditos e
+    outros débitos simultâneos na origem não invalidam a transferência, só
+    conflitos de transação a repetem (com espera aleatória). Se a condição
+    falhar, a conta devolvida pela falha diz se faltou saldo ou limite.
+    lancamento_origem/lancamento_destino são tuplas (tipo, descricao); com
+    shards_destino o crédito cai num sub-contador do destino; com limitar o
+    débito também confere e soma os limites da origem (escrita_debito).
+    extras são itens a mais da transação (ex.: o agendamento que a
+    originou); se a condição de um deles falhar, levanta 412 sem repetir.
+    Retorna o saldo (principal) da origem após o débito, estimado pela
+    última leitura da conta: com escritas simultâneas na origem o saldo real
+    difere delas.
+    """
+    origem_id = conta_origem['conta_id']
+    conta = conta_origem
+
+    for tentativa in range(TRANSFERENCIA_MAX_TENTATIVAS):
+        agora = datetime.now(timezone.utc).isoformat()
+        debito_origem = {
+            'TableName': ACCOUNTS_TABLE,
+            'Key': {'conta_id': origem_id},
+            'UpdateExpression': 'SET saldo = saldo - :val, atualizado_em = :now',
+            'ConditionExpression': 'saldo >= :val',
+            'ExpressionAttributeValues': {':val': valor, ':now': agora},
+            'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'
+        }
+        if limitar:
+            try:
+                debito_origem = escrita_debito(conta, valor, debito_origem)
+            except LimiteExcedido as e:
+                raise TransferenciaRecusada(400, str(e))
+        itens = [
+            {'Update': debito_origem},
+            operacao_credito(conta_destino_id, valor, agora, shards_destino),
+            {'Put': {
+                'TableName': TRANSACTIONS_TABLE,
+                'Item': montar_transacao(origem_id, lancamento_origem[0], valor, lancamento_origem[1]),
+                'ConditionExpression': 'attribute_not_exists(transacao_id)'
+            }},
+            {'Put': {
+                'TableName': TRANSACTIONS_TABLE,
+                'Item': montar_transacao(conta_destino_id, lancamento_destino[0], valor, lancamento_destino[1]),
+                'ConditionExpression': 'attribute_not_exists(transacao_id)'
+            }},
+            *extras
+        ]
+
+        try:
+            dynamodb.meta.client.transact_write_items(TransactItems=itens)
+            return max(conta['saldo'] - valor, Decimal('0'))
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise
+            motivos = e.response.get('CancellationReasons') or [{}] * len(itens)
+
+        debito, credito = motivos[0], motivos[1]
+        if any(m.get('Code') == 'ConditionalCheckFailed' for m in motivos[4:]):
+            raise TransferenciaRecusada(412, 'Operação já concluída ou cancelada')
+        if credito.get('Code') == 'ConditionalCheckFailed':
+            raise TransferenciaRecusada(404, 'Conta de destino não encontrada')
+        if debito.get('Code') == 'ConditionalCheckFailed':
+            # Faltou saldo ou limite: a conta devolvida pela falha diz qual
+            conta = _item_dynamo(debito.get('Item'))
+            if not conta:
+                raise TransferenciaRecusada(404, 'Conta de origem não encontrada')
+            if conta['saldo'] < valor:
+                raise TransferenciaRecusada(400, 'Saldo insuficiente 😢')
+            if limitar:
+                try:
+                    conferir_limites(conta, valor)
+                except LimiteExcedido as limite:
+                    raise TransferenciaRecusada(400, str(limite))
+        # Conflito transacional ou colisão de transacao_id: tenta de novo, com espera aleatória
+        time.sleep(random.uniform(0, 0.02 * 2 ** tentativa))
+
+    raise TransferenciaRecusada(409, 'Conta em uso por outra operação, tente novamente')
+
+
+# ══════════════════════════════════════
+# 🛂 LIMITES DE DÉBITO
+# ══════════════════════════════════════
+# Saques e PIX enviados somam em contadores na própria conta, um atributo por
+# balde de tempo (balde = segundos desde a época // LIMITE_BALDE_S):
+# `lim_d<balde>` para todo débito e `lim_n<balde>` só para os noturnos. O
+# limite diário soma os baldes das últimas 24 h; o noturno, os baldes noturnos
+# dentro da duração de uma noite — como só há baldes noturnos à noite, é a
+# noite corrente.
+#
+# Os baldes passados não mudam mais: o que foi usado neles vem da conta que o
+# handler já leu, e a escrita do débito só confere o balde corrente
+# (lim_d<b> <= limite - passados - valor) enquanto soma o valor nele. Tudo no
+# mesmo UpdateItem/TransactWriteItems do débito, sem ida extra ao banco; os
+# baldes que saíram da janela são apagados (REMOVE) na mesma escrita.
+
+_PREFIXOS_LIMITE = ('lim_d', 'lim_n')
+
+
+class LimiteExcedido(Exception):
+    """Débito acima do limite diário ou noturno; a mensagem vai para o cliente."""
+
+
+def periodo_noturno(instante):
+    hora = int(instante // 3600 + LIMITE_FUSO_HORAS) % 24
+    if LIMITE_NOITE_INICIO > LIMITE_NOITE_FIM:
+        return hora >= LIMITE_NOITE_INICIO or hora < LIMITE_NOITE_FIM
+    return LIMITE_NOITE_INICIO <= hora < LIMITE_NOITE_FIM
+
+
+def _janelas_limite(conta, instante):
+    """(prefixo, limite, nº de baldes, nome) das janelas que valem para um débito agora."""
+    janelas = [('lim_d', Decimal(conta.get('limite_diario', LIMITE_DIARIO)),
+                math.ceil(86400 / LIMITE_BALDE_S), 'diário')]
+    if periodo_noturno(instante):
+        # Um balde de folga: o que contém o início da noite pode começar antes dela
+        horas = (LIMITE_NOITE_FIM - LIMITE_NOITE_INICIO) % 24
+        janelas.append(('lim_n', Decimal(conta.get('limite_noturno', LIMITE_NOTURNO)),
+                        math.ceil(horas * 3600 / LIMITE_BALDE_S) + 1, 'noturno'))
+    return janelas
+
+
+def conferir_limites(conta, valor, instante=None):
+    """Confere o débito `valor` (Decimal) contra os limites com o uso lido da conta.
+
+    Devolve [(balde corrente, teto do balde corrente)] por janela e o conjunto
+    de baldes ainda na janela; levanta LimiteExcedido se o valor não cabe.
+    """
+    instante = time.time() if instante is None else instante
+    balde = int(instante // LIMITE_BALDE_S)
+    correntes, vivos = [], set()
+    for prefixo, limite, baldes, nome in _janelas_limite(conta, instante):
+        janela = {f'{prefixo}{b}' for b in range(balde - baldes + 1, balde + 1)}
+        corrente = f'{prefixo}{balde}'
+        passados = sum((conta[a] for a in janela if a != corrente and a in conta), Decimal('0'))
+        usado = passados + conta.get(corrente, Decimal('0'))
+        if usado + valor > limite:
+            raise LimiteExcedido(
+                f'Limite {nome} de R$ {Dinheiro.do_dynamo(limite)} excedido 🚫 '
+                f'(disponível: R$ {Dinheiro.do_dynamo(max(limite - usado, Decimal("0")))})'
+            )
+        correntes.append((corrente, limite - passados - valor))
+        vivos |= janela
+    return correntes, vivos
+
+
+def escrita_debito(conta, valor, debito, instante=None):
+    """Acrescenta os limites aos parâmetros de um débito (UpdateItem ou Update
+    de transação) cuja UpdateExpression só tem a cláusula SET.
+
+    Soma `valor` (Decimal) aos baldes correntes, condiciona a escrita ao teto
+    de cada um e apaga os baldes vencidos. Levanta LimiteExcedido sem escrever.
+    """
+    correntes, vivos = conferir_limites(conta, valor, instante)
+    nomes = {}
+    valores = {**debito['ExpressionAttributeValues'], ':lim_val': valor, ':lim_zero': Decimal('0')}
+    atualizacoes, condicoes = [debito['UpdateExpression']], [debito['ConditionExpression']]
+    for i, (atributo, teto) in enumerate(correntes):
+        nomes[f'#lim{i}'] = atributo
+        valores[f':lim_teto{i}'] = teto
+        atualizacoes.append(f'#lim{i} = if_not_exists(#lim{i}, :lim_zero) + :lim_val')
+        condicoes.append(f'(attribute_not_exists(#lim{i}) OR #lim{i} <= :lim_teto{i})')
+    vencidos = [a for a in conta if a.startswith(_PREFIXOS_LIMITE) and a not in vivos]
+    expressao = ', '.join(atualizacoes)
+    if vencidos:
+        nomes.update({f'#venc{i}': a for i, a in enumerate(vencidos)})
+        expressao += ' REMOVE ' + ', '.join(f'#venc{i}' for i in range(len(vencidos)))
+    return {
+        **debito,
+        'UpdateExpression': expressao,
+        'ConditionExpression': ' AND '.join(condicoes),
+        'ExpressionAttributeNames': {**debito.get('ExpressionAttributeNames', {}), **nomes},
+        'ExpressionAttributeValues': valores
+    }
+
+
+def _item_dynamo(item):
+    """Item no formato bruto (motivos de cancelamento, ALL_OLD de erros) → tipos Python."""
+    return {nome: _desserializador.deserialize(valor) for nome, valor in (item or {}).items()}
+
+
+# ══════════════════════════════════════
+# 📅 PIX AGENDADO
+# ══════════════════════════════════════
+# Os agendamentos ficam particionados pelo minuto de execução e por uma fatia
+# (`balde` = "AAAA-MM-DDTHH:MM#ff"), com agendamento_id = ULID do instante de
+# execução. Cada série ganha um atraso fixo em [0, AGENDAMENTO_JANELA_S): o
+# pico da meia-noite vira uma rampa, e as fatias dividem cada minuto entre
+# partições.
+#
+# A tarefa executar_agendamentos (EventBridge, a cada minuto) anda com um
+# cursor até o último minuto fechado. Por minuto: lê as fatias em paralelo,
+# toma posse das que têm pendentes (item `~posse` com validade, para dois
+# executores não disputarem o mesmo balde), resolve chaves e contas de origem
+# em lote e paga com paralelismo limitado, um grupo por conta de origem (os
+# débitos de uma conta em sequência não disputam o saldo). Concluir o
+# agendamento e criar a próxima ocorrência da série vão na mesma
+# TransactWriteItems da transferência: repetir um balde nunca paga duas vezes.
+# O cursor só passa de um minuto quando todas as fatias dele terminaram.
+
+RECORRENCIAS = ('UNICA', 'DIARIA', 'SEMANAL', 'MENSAL')
+CAMPOS_SERIE = ('serie_id', 'conta_id', 'chave', 'valor', 'descricao', 'recorrencia', 'dia_mes')
+_CURSOR_AGENDAMENTOS = {'balde': '#cursor', 'agendamento_id': '#cursor'}
+_POSSE = '~posse'  # sort key da posse do balde: depois de qualquer ULID
+
+
+def agendar_pix(event, user_id):
+    """Agenda um PIX único ou recorrente.
+
+    Corpo: chave, valor, data (ISO 8601; sem fuso, ou só a data para a
+    meia-noite, vale AGENDAMENTO_FUSO_HORAS), descricao, recorrencia
+    (UNICA, DIARIA, SEMANAL ou MENSAL) e repeticoes (total de ocorrências;
+    sem ele a série segue até ser cancelada).
+    """
+    body = ler_corpo(event)
+    chave = str(body.get('chave', '')).strip()
+    if not chave or not body.get('valor') or not body.get('data'):
+        return resposta(400, {'erro': 'Chave PIX, valor e data são obrigatórios'})
+    try:
+        valor = Dinheiro.positivo(body['valor'])
+    except ValueError as e:
+        return resposta(400, {'erro': str(e)})
+    recorrencia = str(body.get('recorrencia') or 'UNICA').upper()
+    if recorrencia not in RECORRENCIAS:
+        return resposta(400, {'erro': f"Recorrência deve ser: {', '.join(RECORRENCIAS)}"})
+    try:
+        data = _data_agendamento(str(body['data']))
+        repeticoes = int(body['repeticoes']) if body.get('repeticoes') is not None else None
+    except (TypeError, ValueError):
+        return resposta(400, {'erro': 'Data (ISO 8601) ou repetições inválidas'})
+    if repeticoes is not None and repeticoes < 1:
+        return resposta(400, {'erro': 'Repetições deve ser positivo'})
+
+    agora = datetime.now(timezone.utc)
+    if data < agora + timedelta(seconds=AGENDAMENTO_ANTECEDENCIA_S):
+        return resposta(400, {'erro': f'Agende com pelo menos {AGENDAMENTO_ANTECEDENCIA_S} s de antecedência'})
+    if data > agora + timedelta(days=AGENDAMENTO_HORIZONTE_DIAS):
+        return resposta(400, {'erro': f'Agende para no máximo {AGENDAMENTO_HORIZONTE_DIAS} dias à frente'})
+
+    conta, item_pix = em_paralelo(
+        lambda: buscar_conta_por_user(user_id),
+        lambda: resolver_chave_pix(chave)
     )
+    if not conta:
+        return resposta(404, {'erro': 'Conta de origem não encontrada'})
+    if not item_pix:
+        return resposta(404, {'erro': 'Chave PIX não encontrada'})
+    if item_pix['conta_id'] == conta['conta_id']:
+        return resposta(400, {'erro': 'Não é possível fazer PIX para você mesmo'})
+
+    serie = {
+        'serie_id': _gerador_ids.gerar(), 'conta_id': conta['conta_id'], 'chave': chave,
+        'valor': valor.decimal(), 'descricao': str(body.get('descricao') or 'PIX agendado'),
+        'recorrencia': recorrencia, 'ocorrencia': 1
+    }
+    if recorrencia == 'MENSAL':
+        serie['dia_mes'] = data.astimezone(timezone(timedelta(hours=AGENDAMENTO_FUSO_HORAS))).day
+    if recorrencia != 'UNICA' and repeticoes is not None:
+        serie['restantes'] = repeticoes - 1
+    item = montar_agendamento(serie, data)
+    schedules_table.put_item(Item=item, ConditionExpression='attribute_not_exists(agendamento_id)')
+
+    return resposta(201, {
+        'mensagem': f'PIX de R$ {valor} agendado! 📅',
+        'agendamento': _formatar_agendamento(item)
+    })
 
-    # Busca saldo atualizado
-    conta_atualizada = buscar_conta(conta_origem['conta_id'])
 
+def listar_agendamentos(user_id):
+    conta_id = resolver_conta_id(user_id)
+    if not conta_id:
+        return resposta(404, {'erro': 'Conta não encontrada'})
+    itens = _agendamentos_da_conta(conta_id)
+    itens.sort(key=lambda item: item['agendamento_id'])
     return resposta(200, {
-        'mensagem': f'PIX de R$ {float(valor):.2f} enviado! ⚡',
-        'para': item_pix['nome_titular'],
-        'chave': chave,
-        'valor': float(valor),
-        'saldo_atual': float(conta_atualizada['saldo'])
+        'conta_id': conta_id,
+        'agendamentos': [_formatar_agendamento(item) for item in itens]
+    })
+
+
+def cancelar_agendamento(event, user_id):
+    """Cancela a ocorrência pendente (agendamento_id ou serie_id); numa série,
+    isso encerra as próximas."""
+    body = ler_corpo(event)
+    alvo = str(body.get('agendamento_id', '')).strip()
+    if not alvo:
+        return resposta(400, {'erro': 'agendamento_id é obrigatório'})
+    conta_id = resolver_conta_id(user_id)
+    if not conta_id:
+        return resposta(404, {'erro': 'Conta não encontrada'})
+
+    filtro = (Attr('agendamento_id').eq(alvo) | Attr('serie_id').eq(alvo)) & Attr('estado').eq('PENDENTE')
+    pendentes = _agendamentos_da_conta(conta_id, filtro)
+    if not pendentes:
+        return resposta(404, {'erro': 'Agendamento pendente não encontrado'})
+    item = pendentes[0]
+    try:
+        dynamodb.meta.client.transact_write_items(TransactItems=_fechar_agendamento(item, 'CANCELADO'))
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'TransactionCanceledException':
+            raise
+        return resposta(409, {'erro': 'O agendamento acabou de ser executado, tente de novo'})
+    return resposta(200, {
+        'mensagem': 'Agendamento cancelado 🗑️',
+        'agendamento': _formatar_agendamento({**item, 'estado': 'CANCELADO'})
     })
 
 
+def _agendamentos_da_conta(conta_id, filtro=None):
+    """Agendamentos da conta via GSI conta_id-index (pendentes e histórico ainda no TTL)."""
+    params = {'IndexName': 'conta_id-index', 'KeyConditionExpression': Key('conta_id').eq(conta_id)}
+    if filtro is not None:
+        params['FilterExpression'] = filtro
+    itens = []
+    while True:
+        resultado = schedules_table.query(**params)
+        itens.extend(resultado.get('Items', []))
+        if 'LastEvaluatedKey' not in resultado:
+            return itens
+        params['ExclusiveStartKey'] = resultado['LastEvaluatedKey']
+
+
+def _formatar_agendamento(item):
+    return {
+        'agendamento_id': item['agendamento_id'],
+        'serie_id': item['serie_id'],
+        'chave': item['chave'],
+        'valor': Dinheiro.do_dynamo(item['valor']),
+        'descricao': item['descricao'],
+        'data': item['data'],
+        'execucao_prevista': datetime.fromtimestamp(ms_do_ulid(item['agendamento_id']) / 1000, timezone.utc).isoformat(),
+        'recorrencia': item['recorrencia'],
+        'ocorrencia': int(item['ocorrencia']),
+        'restantes': int(item['restantes']) if 'restantes' in item else None,
+        'estado': item['estado'],
+        'motivo': item.get('motivo')
+    }
+
+
+def _data_agendamento(texto):
+    """Instante UTC da data ISO 8601; sem fuso vale AGENDAMENTO_FUSO_HORAS."""
+    data = datetime.fromisoformat(texto)
+    if data.tzinfo is None:
+        data = data.replace(tzinfo=timezone(timedelta(hours=AGENDAMENTO_FUSO_HORAS)))
+    return data.astimezone(timezone.utc)
+
+
+def montar_agendamento(serie, data):
+    """Item da ocorrência da série que vence em `data` (datetime UTC).
+
+    O atraso da série espalha a execução pela janela; nunca cai antes da
+    antecedência mínima, para não ir parar num minuto que o executor já passou.
+    """
+    atraso_ms = 0
+    if AGENDAMENTO_JANELA_S:
+        atraso_ms = int(hashlib.sha256(serie['serie_id'].encode()).hexdigest()[:8], 16) % (AGENDAMENTO_JANELA_S * 1000)
+    execucao_ms = max(int(data.timestamp() * 1000) + atraso_ms,
+                      int((time.time() + AGENDAMENTO_ANTECEDENCIA_S) * 1000))
+    agendamento_id = codificar_ulid(execucao_ms, int.from_bytes(os.urandom(10), 'big'))
+    fatia = int(hashlib.sha256(agendamento_id.encode()).hexdigest()[:8], 16) % AGENDAMENTO_FATIAS
+    return {
+        **serie,
+        'balde': f'{_rotulo_minuto(execucao_ms // 60000)}#{fatia:02d}',
+        'agendamento_id': agendamento_id,
+        'data': data.isoformat(),
+        'estado': 'PENDENTE',
+        'criado_em': datetime.now(timezone.utc).isoformat()
+    }
+
+
+def _rotulo_minuto(minuto):
+    return datetime.fromtimestamp(minuto * 60, timezone.utc).strftime('%Y-%m-%dT%H:%M')
+
+
+def _proxima_ocorrencia(item):
+    """Item da ocorrência seguinte da série, ou None se ela terminou."""
+    if item['recorrencia'] == 'UNICA' or item.get('restantes') == 0:
+        return None
+    data = datetime.fromisoformat(item['data']).astimezone(timezone(timedelta(hours=AGENDAMENTO_FUSO_HORAS)))
+    if item['recorrencia'] == 'DIARIA':
+        proxima = data + timedelta(days=1)
+    elif item['recorrencia'] == 'SEMANAL':
+        proxima = data + timedelta(days=7)
+    else:
+        # Mesmo dia do mês da primeira ocorrência, ou o último dia de meses mais curtos
+        ano, mes = divmod(data.year * 12 + data.month, 12)
+        mes += 1
+        proxima = data.replace(year=ano, month=mes, day=min(int(item['dia_mes']), calendar.monthrange(ano, mes)[1]))
+    serie = {campo: item[campo] for campo in CAMPOS_SERIE if campo in item}
+    serie['ocorrencia'] = item['ocorrencia'] + 1
+    if 'restantes' in item:
+        serie['restantes'] = item['restantes'] - 1
+    return montar_agendamento(serie, proxima.astimezone(timezone.utc))
+
+
+def _fechar_agendamento(item, estado, proximo=None, motivo=None):
+    """Itens de TransactWriteItems que concluem o agendamento (se ainda
+    pendente) e gravam a próxima ocorrência da série."""
+    valores = {
+        ':estado': estado, ':pendente': 'PENDENTE', ':agora': datetime.now(timezone.utc).isoformat(),
+        ':expira': int(time.time()) + AGENDAMENTO_HISTORICO_DIAS * 86400
+    }
+    expressao = 'SET estado = :estado, concluido_em = :agora, expira_em = :expira'
+    if motivo:
+        expressao += ', motivo = :motivo'
+        valores[':motivo'] = motivo
+    itens = [{'Update': {
+        'TableName': SCHEDULES_TABLE,
+        'Key': {'balde': item['balde'], 'agendamento_id': item['agendamento_id']},
+        'UpdateExpression': expressao,
+        'ConditionExpression': 'estado = :pendente',
+        'ExpressionAttributeValues': valores
+    }}]
+    if proximo:
+        itens.append({'Put': {
+            'TableName': SCHEDULES_TABLE,
+            'Item': proximo,
+            'ConditionExpression': 'attribute_not_exists(agendamento_id)'
+        }})
+    return itens
+
+
+def tarefa_executar_agendamentos(event):
+    """Paga os agendamentos dos minutos já fechados, do cursor até agora, por
+    até `orcamento_s` segundos; chame de novo enquanto trouxer `continuar`."""
+    prazo = time.monotonic() + float(event.get('orcamento_s', AGENDAMENTO_ORCAMENTO))
+    dono = _gerador_ids.gerar()
+    atual = int(time.time() // 60)
+    cursor = schedules_table.get_item(Key=_CURSOR_AGENDAMENTOS, ConsistentRead=True).get('Item')
+    minuto = int(cursor['minuto']) + 1 if cursor else atual - AGENDAMENTO_RECUPERACAO_S // 60
+    resumo = dict.fromkeys(('minutos', 'executados', 'falhas', 'ignorados', 'adiados', 'ocupados'), 0)
+
+    while minuto < atual and time.monotonic() < prazo:
+        if not executar_minuto(minuto, dono, prazo, resumo):
+            break
+        try:
+            schedules_table.put_item(
+                Item={**_CURSOR_AGENDAMENTOS, 'minuto': minuto},
+                ConditionExpression='attribute_not_exists(minuto) OR minuto < :minuto',
+                ExpressionAttributeValues={':minuto': minuto}
+            )
+        except ClientError as e:
+            # Outro executor já passou deste minuto
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+        resumo['minutos'] += 1
+        minuto += 1
+
+    return {**resumo, 'cursor': _rotulo_minuto(minuto - 1), 'continuar': minuto < atual}
+
+
+def executar_minuto(minuto, dono, prazo, resumo):
+    """Paga os pendentes das fatias do minuto. True se o minuto terminou."""
+    baldes = [f'{_rotulo_minuto(minuto)}#{fatia:02d}' for fatia in range(AGENDAMENTO_FATIAS)]
+    pendentes = dict(zip(baldes, executar_em_paralelo(_pendentes_do_balde, baldes, AGENDAMENTO_FATIAS)))
+    com_pendentes = [balde for balde in baldes if pendentes[balde]]
+    meus = [balde for balde in com_pendentes if _tomar_posse(balde, dono)]
+    resumo['ocupados'] += len(com_pendentes) - len(meus)
+    try:
+        terminou = executar_pagamentos([item for balde in meus for item in pendentes[balde]], prazo, resumo)
+    finally:
+        for balde in meus:
+            _liberar_posse(balde, dono)
+    return terminou and len(meus) == len(com_pendentes)
+
+
+def executar_pagamentos(itens, prazo, resumo):
+    """Resolve chaves e contas de origem em lote e paga, um grupo por conta de
+    origem em paralelo. True se nada ficou para depois por falta de tempo."""
+    if not itens:
+        return True
+    chaves, contas = em_paralelo(
+        lambda: buscar_chaves_pix_em_lote({item['chave'] for item in itens}),
+        lambda: buscar_contas([item['conta_id'] for item in itens])
+    )
+    grupos = {}
+    for item in sorted(itens, key=lambda item: item['agendamento_id']):
+        grupos.setdefault(item['conta_id'], []).append(item)
+
+    def pagar_grupo(grupo):
+        conta = contas.get(grupo[0]['conta_id'])
+        desfechos = []
+        for item in grupo:
+            if time.monotonic() >= prazo:
+                desfechos.append('adiados')
+                continue
+            conta, desfecho = pagar_agendamento(item, conta, chaves.get(item['chave']))
+            desfechos.append(desfecho)
+        return desfechos
+
+    adiados = 0
+    for desfechos in executar_em_paralelo(pagar_grupo, list(grupos.values()), AGENDAMENTO_PARALELISMO):
+        for desfecho in desfechos:
+            resumo[desfecho] += 1
+        adiados += desfechos.count('adiados')
+    return not adiados
+
+
+def pagar_agendamento(item, conta, item_pix):
+    """Executa um agendamento; devolve (conta de origem atualizada, desfecho).
+
+    Conflitos e erros do DynamoDB são repetidos AGENDAMENTO_TENTATIVAS vezes;
+    recusas (saldo, limite, chave) concluem o agendamento como FALHOU. A série
+    continua nos dois casos.
+    """
+    proximo = _proxima_ocorrencia(item)
+    if not conta:
+        return conta, _fechar_sem_pagar(item, proximo, 'Conta de origem não encontrada')
+    if not item_pix:
+        return conta, _fechar_sem_pagar(item, proximo, 'Chave PIX não encontrada')
+    if item_pix['conta_id'] == conta['conta_id']:
+        return conta, _fechar_sem_pagar(item, proximo, 'Não é possível fazer PIX para você mesmo')
+
+    motivo = None
+    for tentativa in range(AGENDAMENTO_TENTATIVAS):
+        try:
+            conta = garantir_saldo(conta, Dinheiro.do_dynamo(item['valor']))
+            saldo = executar_transferencia(
+                conta, item_pix['conta_id'], item['valor'],
+                ('PIX_ENVIADO', f'{item["descricao"]} para {item_pix["nome_titular"]} (chave: {item["chave"]})'),
+                ('PIX_RECEBIDO', f'{item["descricao"]} de {conta["nome"]}'),
+                shards_destino=shards_da_conta(item_pix), limitar=True,
+                extras=_fechar_agendamento(item, 'EXECUTADO', proximo)
+            )
+            return {**conta, 'saldo': saldo}, 'executados'
+        except TransferenciaRecusada as e:
+            if e.status == 412:
+                # Cancelado ou pago por outro executor enquanto este esperava
+                return conta, 'ignorados'
+            if e.status != 409:
+                return conta, _fechar_sem_pagar(item, proximo, e.mensagem)
+            motivo = e.mensagem
+        except ClientError as e:
+            print(f"⚠️ Agendamento {item['agendamento_id']} (tentativa {tentativa + 1}): {e}")
+            motivo = 'Erro temporário ao executar o PIX'
+        time.sleep(0.05 * 2 ** tentativa)
+        conta = buscar_conta(item['conta_id']) or conta
+    return conta, _fechar_sem_pagar(item, proximo, motivo)
+
+
+def _fechar_sem_pagar(item, proximo, motivo):
+    try:
+        dynamodb.meta.client.transact_write_items(TransactItems=_fechar_agendamento(item, 'FALHOU', proximo, motivo))
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'TransactionCanceledException':
+            raise
+        return 'ignorados'
+    return 'falhas'
+
+
+def _pendentes_do_balde(balde):
+    params = {
+        'KeyConditionExpression': Key('balde').eq(balde) & Key('agendamento_id').lt(_POSSE),
+        'FilterExpression': Attr('estado').eq('PENDENTE'),
+        'ConsistentRead': True
+    }
+    itens = []
+    while True:
+        resultado = schedules_table.query(**params)
+        itens.extend(resultado.get('Items', []))
+        if 'LastEvaluatedKey' not in resultado:
+            return itens
+        params['ExclusiveStartKey'] = resultado['LastEvaluatedKey']
+
+
+def _tomar_posse(balde, dono):
+    """Posse do balde por AGENDAMENTO_POSSE_S segundos (expira_em também é o TTL)."""
+    agora = int(time.time())
+    try:
+        schedules_table.put_item(
+            Item={'balde': balde, 'agendamento_id': _POSSE, 'dono': dono, 'expira_em': agora + AGENDAMENTO_POSSE_S},
+            ConditionExpression='attribute_not_exists(dono) OR expira_em < :agora',
+            ExpressionAttributeValues={':agora': agora}
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        return False
+
+
+def _liberar_posse(balde, dono):
+    try:
+        schedules_table.delete_item(
+            Key={'balde': balde, 'agendamento_id': _POSSE},
+            ConditionExpression='dono = :dono',
+            ExpressionAttributeValues={':dono': dono}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+
+
+# ══════════════════════════════════════
+# 🧩 SALDO FRAGMENTADO
+# ══════════════════════════════════════
+# Contas que recebem muitos PIX por minuto estouram o limite de escrita de um
+# único item. Com `shards_saldo` = N na conta (e copiado nas chaves PIX), os
+# créditos caem em N sub-contadores `<conta_id>#S<i>` na própria tabela de
+# contas; débitos só saem do saldo principal, que é reabastecido pela
+# consolidação dos shards (sob demanda ou pela tarefa agendada).
+
+def shards_da_conta(item):
+    return int(item.get('shards_saldo') or 0)
+
+
+def operacao_credito(conta_id, valor, agora, shards=0):
+    """Update de TransactWriteItems que credita a conta ou um shard aleatório dela."""
+    if not shards:
+        return {'Update': {
+            'TableName': ACCOUNTS_TABLE,
+            'Key': {'conta_id': conta_id},
+            'UpdateExpression': 'SET saldo = saldo + :val, atualizado_em = :now',
+            'ConditionExpression': 'attribute_exists(conta_id)',
+            'ExpressionAttributeValues': {':val': valor, ':now': agora}
+        }}
+    return {'Update': {
+        'TableName': ACCOUNTS_TABLE,
+        'Key': {'conta_id': f'{conta_id}#S{random.randrange(shards)}'},
+        'UpdateExpression': 'SET saldo = if_not_exists(saldo, :zero) + :val, shard_de = :conta, atualizado_em = :now',
+        'ExpressionAttributeValues': {':val': valor, ':zero': Decimal('0'), ':conta': conta_id, ':now': agora}
+    }}
+
+
+def ler_shards(conta_id, shards):
+    """Saldos dos shards da conta (chave → saldo), com leitura consistente."""
+    chaves = [{'conta_id': f'{conta_id}#S{i}'} for i in range(shards)]
+    saldos = {}
+    pedido = {ACCOUNTS_TABLE: {'Keys': chaves, 'ConsistentRead': True}}
+    while pedido:
+        resultado = dynamodb.batch_get_item(RequestItems=pedido)
+        for item in resultado.get('Responses', {}).get(ACCOUNTS_TABLE, []):
+            saldos[item['conta_id']] = item['saldo']
+        pedido = resultado.get('UnprocessedKeys')
+    return saldos
+
+
+def saldo_total(conta):
+    """Saldo principal mais os shards (só lê os shards se a conta for fragmentada)."""
+    return com_shards(conta, conta['saldo'])
+
+
+def com_shards(conta, saldo_principal):
+    shards = shards_da_conta(conta)
+    if not shards:
+        return saldo_principal
+    return saldo_principal + sum(ler_shards(conta['conta_id'], shards).values(), Decimal('0'))
+
+
+def versao_conta(conta):
+    """Saldo total e versão da conta para ETags, lendo os shards uma vez só.
+
+    Toda escrita de saldo ou de lançamento atualiza `atualizado_em` do item
+    que toca (conta ou shard); nos shards o próprio saldo denuncia a mudança.
+    """
+    shards = shards_da_conta(conta)
+    saldos = ler_shards(conta['conta_id'], shards) if shards else {}
+    saldo = conta['saldo'] + sum(saldos.values(), Decimal('0'))
+    return saldo, '|'.join([conta['atualizado_em'], *(f'{k}={v}' for k, v in sorted(saldos.items()))])
+
+
+def garantir_saldo(conta, valor):
+    """Antes de um débito (valor em Dinheiro): se o principal não cobre o valor,
+    consolida os shards e relê a conta."""
+    if Dinheiro.do_dynamo(conta['saldo']) >= valor or not shards_da_conta(conta):
+        return conta
+    if consolidar_shards(conta['conta_id'], shards_da_conta(conta)):
+        return buscar_conta(conta['conta_id']) or conta
+    return conta
+
+
+def consolidar_shards(conta_id, shards):
+    """Move o saldo dos shards para o principal numa única transação. Retorna o valor movido."""
+    for _ in range(TRANSFERENCIA_MAX_TENTATIVAS):
+        saldos = {k: v for k, v in ler_shards(conta_id, shards).items() if v > 0}
+        if not saldos:
+            return Decimal('0')
+        total = sum(saldos.values(), Decimal('0'))
+        agora = datetime.now(timezone.utc).isoformat()
+        itens = [{'Update': {
+            'TableName': ACCOUNTS_TABLE,
+            'Key': {'conta_id': chave},
+            'UpdateExpression': 'SET saldo = saldo - :val',
+            'ConditionExpression': 'saldo >= :val',
+            'ExpressionAttributeValues': {':val': valor}
+        }} for chave, valor in saldos.items()]
+        itens.append({'Update': {
+            'TableName': ACCOUNTS_TABLE,
+            'Key': {'conta_id': conta_id},
+            'UpdateExpression': 'SET saldo = saldo + :val, atualizado_em = :now',
+            'ConditionExpression': 'attribute_exists(conta_id)',
+            'ExpressionAttributeValues': {':val': total, ':now': agora}
+        }})
+        try:
+            dynamodb.meta.client.transact_write_items(TransactItems=itens)
+            return total
+        except ClientError as e:
+            # Conflito com créditos simultâneos nos mesmos shards: relê e tenta de novo
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise
+    return Decimal('0')
+
+
+def fragmentar_saldo(conta_id, shards):
+    """Liga (shards > 0), muda ou desliga (0) o saldo fragmentado de uma conta."""
+    if not 0 <= shards <= SALDO_SHARDS_MAX:
+        raise ValueError(f'shards deve estar entre 0 e {SALDO_SHARDS_MAX}')
+    conta = buscar_conta(conta_id)
+    if not conta:
+        raise ValueError(f'Conta não encontrada: {conta_id}')
+
+    # Shards que deixarem de existir precisam estar vazios. Chaves PIX em cache
+    # noutros containers ainda podem creditá-los por CACHE_CHAVES_TTL: a conta
+    # segue no índice com shards_residuais até a consolidação passar do prazo.
+    anteriores = max(shards_da_conta(conta), int(conta.get('shards_residuais', 0)))
+    if anteriores > shards:
+        consolidar_shards(conta_id, anteriores)
+        accounts_table.update_item(
+            Key={'conta_id': conta_id},
+            UpdateExpression='SET shards_residuais = :ant, residuais_ate = :ate, fragmentada = :sim',
+            ExpressionAttributeValues={
+                ':ant': anteriores, ':ate': int(time.time()) + CACHE_CHAVES_TTL, ':sim': 'SIM'
+            }
+        )
+
+    if shards:
+        accounts_table.update_item(
+            Key={'conta_id': conta_id},
+            UpdateExpression='SET shards_saldo = :n, fragmentada = :sim',
+            ExpressionAttributeValues={':n': shards, ':sim': 'SIM'}
+        )
+    elif anteriores == 0:
+        accounts_table.update_item(Key={'conta_id': conta_id}, UpdateExpression='REMOVE shards_saldo, fragmentada')
+    else:
+        accounts_table.update_item(Key={'conta_id': conta_id}, UpdateExpression='REMOVE shards_saldo')
+
+    # As chaves PIX levam o número de shards para o crédito não precisar ler a conta
+    for chave in buscar_chaves_por_conta(conta_id):
+        _cache_chaves_pix.remover(chave['chave'])
+        if shards:
+            pix_keys_table.update_item(
+                Key={'chave_valor': chave['chave']},
+                UpdateExpression='SET shards_saldo = :n',
+                ExpressionAttributeValues={':n': shards}
+            )
+        else:
+            pix_keys_table.update_item(Key={'chave_valor': chave['chave']}, UpdateExpression='REMOVE shards_saldo')
+    return {'conta_id': conta_id, 'shards': shards}
+
+
+def tarefa_fragmentar_saldo(event):
+    return fragmentar_saldo(event['conta_id'], int(event['shards']))
+
+
+def tarefa_consolidar_saldos(event):
+    """Consolida os shards de todas as contas fragmentadas (GSI esparso fragmentada-index).
+
+    Shards residuais de uma redução entram na consolidação; passado o prazo do
+    cache de chaves PIX, a última consolidação os encerra.
+    """
+    params = {
+        'IndexName': 'fragmentada-index',
+        'KeyConditionExpression': Key('fragmentada').eq('SIM'),
+        'ProjectionExpression': 'conta_id, shards_saldo, shards_residuais, residuais_ate'
+    }
+    contas, movido = 0, Decimal('0')
+    while True:
+        resultado = accounts_table.query(**params)
+        for conta in resultado.get('Items', []):
+            residuais = int(conta.get('shards_residuais', 0))
+            encerrar = residuais and conta['residuais_ate'] < time.time()
+            movido += consolidar_shards(conta['conta_id'], max(shards_da_conta(conta), residuais))
+            if encerrar:
+                remover = 'shards_residuais, residuais_ate' + ('' if shards_da_conta(conta) else ', fragmentada')
+                accounts_table.update_item(Key={'conta_id': conta['conta_id']}, UpdateExpression=f'REMOVE {remover}')
+            contas += 1
+        if 'LastEvaluatedKey' not in resultado:
+            return {'contas': contas, 'consolidado': movido}
+        params['ExclusiveStartKey'] = resultado['LastEvaluatedKey']
+
+
+# ══════════════════════════════════════
+# 📒 LIVRO RAZÃO
+# ══════════════════════════════════════
+# Todo lançamento é gravado na mesma TransactWriteItems que muda o saldo ou
+# cria a conta (criar_conta, gravar_com_lancamento, executar_transferencia):
+# não há saldo sem lançamento nem lançamento sem saldo. Cargas em massa
+# (importação, arquivo, scripts) usam gravar_em_lote.
+
+def gravar_em_lote(tabela, itens):
+    """Grava itens com BatchWriteItem (25 por chamada), repetindo os não processados."""
+    for i in range(0, len(itens), 25):
+        pedido = {tabela: [{'PutRequest': {'Item': item}} for item in itens[i:i + 25]]}
+        for tentativa in range(LIVRO_MAX_TENTATIVAS):
+            pedido = dynamodb.batch_write_item(RequestItems=pedido).get('UnprocessedItems')
+            if not pedido:
+                break
+            time.sleep(0.05 * 2 ** tentativa)
+        else:
+            raise RuntimeError(f'BatchWriteItem em {tabela} não concluiu')
+
+
 # ══════════════════════════════════════
 # 📋 EXTRATO
 # ══════════════════════════════════════
 
-def ver_extrato(user_id):
+# Tamanho de página do extrato (JSON) e de cada parte da exportação
+EXTRATO_LIMITE_PADRAO = 30
+EXTRATO_LIMITE_MAX = 100
+EXPORTACAO_LINHAS_POR_PARTE = 5000
+EXTRATO_CAMPOS_CSV = ['data', 'tipo', 'valor', 'descricao', 'transacao_id']
+
+
+def ver_extrato(user_id, params=None, etag_cliente=None):
     conta = buscar_conta_por_user(user_id)
     if not conta:
         return resposta(404, {'erro': 'Conta não encontrada'})
-    return ver_extrato_por_id(conta['conta_id'])
+    return ver_extrato_por_id(conta['conta_id'], params, conta, etag_cliente)
 
 
-def ver_extrato_por_id(conta_id):
+def ver_extrato_da_conta(user_id, conta_id, params=None, etag_cliente=None):
+    """Legado v1: extrato por conta_id, só da conta do próprio usuário."""
     conta = buscar_conta(conta_id)
+    if not conta:
+        return resposta(404, {'erro': 'Conta não encontrada'})
+    if conta.get('user_id') != user_id:
+        return resposta(403, {'erro': 'A conta não pertence a você'})
+    return ver_extrato_por_id(conta_id, params, conta, etag_cliente)
+
+
+def ver_extrato_por_id(conta_id, params=None, conta=None, etag_cliente=None):
+    """Extrato paginado por cursor, com filtros de período (de/ate) e tipo.
+
+    Query string: limite, cursor, de, ate, tipo e formato (json, ndjson ou csv).
+    Nos formatos de exportação cada resposta traz uma parte do histórico em
+    ordem cronológica; o header X-Proximo-Cursor aponta para a seguinte.
+    Com If-None-Match igual à versão atual da conta responde 304 sem
+    consultar os lançamentos.
+    """
+    params = params or {}
+    conta = conta or buscar_conta(conta_id)
     if not conta:
         return resposta(404, {'erro': 'Conta não encontrada'})
 
-    from boto3.dynamodb.conditions import Key
+    saldo, versao = versao_conta(conta)
+    etag = gerar_etag(versao, *(f'{k}={params[k]}' for k in sorted(params) if params[k])) if versao else None
+    if etag and etag == etag_cliente:
+        return nao_modificado(etag)
 
-    resultado = transactions_table.query(
-        KeyConditionExpression=Key('conta_id').eq(conta_id),
-        ScanIndexForward=False,
-        Limit=30
+    formato = (params.get('formato') or 'json').lower()
+    if formato not in ('json', 'ndjson', 'csv'):
+        return resposta(400, {'erro': 'Formato deve ser: json, ndjson ou csv'})
+
+    try:
+        inicio = _decodificar_cursor(params.get('cursor'), conta_id)
+        faixa = _faixa_periodo(params.get('de'), params.get('ate'))
+        if formato == 'json':
+            limite = min(int(params.get('limite') or EXTRATO_LIMITE_PADRAO), EXTRATO_LIMITE_MAX)
+        else:
+            limite = EXPORTACAO_LINHAS_POR_PARTE
+    except ValueError:
+        return resposta(400, {'erro': 'Parâmetros inválidos (cursor, de, ate ou limite)'})
+    if limite <= 0:
+        return resposta(400, {'erro': 'Limite deve ser positivo'})
+
+    transacoes = iterar_extrato(
+        conta, faixa, params.get('tipo'), inicio, recentes_primeiro=(formato == 'json')
     )
+    pagina, proximo_cursor = _recortar_pagina(transacoes, limite)
 
-    transacoes = []
-    for t in resultado.get('Items', []):
-        transacoes.append({
-            'tipo': t['tipo'],
-            'valor': float(t['valor']),
-            'descricao': t.get('descricao', ''),
-            'data': t['data']
-        })
+    if formato != 'json':
+        # No CSV o cabeçalho só vai na primeira parte
+        corpo = ''.join(exportar_linhas(pagina, formato, cabecalho=not inicio))
+        tipo_conteudo = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+        cabecalhos = cabecalhos_cache(etag)
+        if proximo_cursor:
+            cabecalhos['X-Proximo-Cursor'] = proximo_cursor
+        return resposta_texto(200, corpo, f'{tipo_conteudo}; charset=utf-8', cabecalhos)
 
     return resposta(200, {
         'conta_id': conta_id,
         'nome': conta['nome'],
-        'saldo_atual': float(conta['saldo']),
-        'transacoes': transacoes
-    })
+        'saldo_atual': Dinheiro.do_dynamo(saldo),
+        'transacoes': [_formatar_transacao(t) for t in pagina],
+        'proximo_cursor': proximo_cursor
+    }, cabecalhos_cache(etag))
+
+
+def iterar_extrato(conta, faixa=(None, None), tipo=None, inicio=None, recentes_primeiro=True):
+    """Lançamentos da conta na faixa de transacao_id: a tabela quente acima da
+    fronteira do arquivo e, abaixo dela, os segmentos arquivados.
+
+    Os lançamentos arquivados que ainda esperam o TTL ficam fora da consulta à
+    tabela, então nada aparece duas vezes. O cursor (inicio) pode cair em
+    qualquer dos dois lados.
+    """
+    conta_id = conta['conta_id']
+    de, ate = faixa
+    fronteira = fronteira_arquivo(conta)
+    if fronteira < 0:
+        yield from iterar_transacoes(_condicao_faixa(conta_id, de, ate), tipo, inicio, recentes_primeiro)
+        return
+
+    primeiro_quente = limite_ulid(fronteira + 1)
+    apos = inicio['transacao_id'] if inicio else None
+    cursor_no_arquivo = apos is not None and apos < primeiro_quente
+
+    def quentes():
+        inferior = max(de or '', primeiro_quente)
+        if ate and ate < inferior:
+            return
+        yield from iterar_transacoes(
+            _condicao_faixa(conta_id, inferior, ate), tipo,
+            None if cursor_no_arquivo else inicio, recentes_primeiro
+        )
+
+    arquivados = iterar_arquivados(conta, de, ate, tipo, apos, recentes_primeiro)
+    if recentes_primeiro:
+        if not cursor_no_arquivo:
+            yield from quentes()
+        yield from arquivados
+    else:
+        if apos is None or cursor_no_arquivo:
+            yield from arquivados
+        yield from quentes()
+
+
+def iterar_transacoes(condicao, tipo=None, inicio=None, recentes_primeiro=True, tamanho_pagina=100):
+    """Gera os lançamentos da consulta página a página, sem acumular em memória."""
+    params = {
+        'KeyConditionExpression': condicao,
+        'ScanIndexForward': not recentes_primeiro,
+        'Limit': tamanho_pagina
+    }
+    if tipo:
+        params['FilterExpression'] = Attr('tipo').eq(tipo.upper())
+    if inicio:
+        params['ExclusiveStartKey'] = inicio
+
+    while True:
+        resultado = transactions_table.query(**params)
+        yield from resultado.get('Items', [])
+        if 'LastEvaluatedKey' not in resultado:
+            return
+        params['ExclusiveStartKey'] = resultado['LastEvaluatedKey']
+
+
+def exportar_extrato(conta_id, formato='ndjson', de=None, ate=None, tipo=None):
+    """Histórico completo em NDJSON/CSV como gerador de blocos de texto.
+
+    Memória limitada a um bloco por vez; serve para quem consome o gerador
+    direto (scripts, servidor HTTP) em vez de paginar pelo cursor.
+    """
+    conta = buscar_conta(conta_id)
+    if not conta:
+        return
+    transacoes = iterar_extrato(conta, _faixa_periodo(de, ate), tipo, recentes_primeiro=False)
+    linhas = exportar_linhas(transacoes, formato)
+    bloco = []
+    for linha in linhas:
+        bloco.append(linha)
+        if len(bloco) >= EXTRATO_LIMITE_MAX:
+            yield ''.join(bloco)
+            bloco = []
+    if bloco:
+        yield ''.join(bloco)
+
+
+def exportar_linhas(transacoes, formato, cabecalho=True):
+    """Converte lançamentos em linhas NDJSON ou CSV."""
+    if formato == 'csv':
+        buffer = io.StringIO()
+        escritor = csv.DictWriter(buffer, fieldnames=EXTRATO_CAMPOS_CSV, lineterminator='\n')
+        if cabecalho:
+            escritor.writeheader()
+        for t in transacoes:
+            escritor.writerow({**_formatar_transacao(t), 'transacao_id': t['transacao_id']})
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        for t in transacoes:
+            linha = {**_formatar_transacao(t), 'transacao_id': t['transacao_id']}
+            yield json.dumps(linha, ensure_ascii=False, default=_json_padrao) + '\n'
+
+
+def _formatar_transacao(t):
+    return {
+        'tipo': t['tipo'],
+        'valor': Dinheiro.do_dynamo(t['valor']),
+        'descricao': t.get('descricao', ''),
+        'data': t['data']
+    }
+
+
+def _recortar_pagina(transacoes, limite):
+    """Pega até `limite` itens; o cursor aponta para o último entregue se houver mais."""
+    pagina = []
+    for t in transacoes:
+        if len(pagina) == limite:
+            ultimo = pagina[-1]
+            return pagina, _codificar_cursor({
+                'conta_id': ultimo['conta_id'],
+                'transacao_id': ultimo['transacao_id']
+            })
+        pagina.append(t)
+    return pagina, None
+
+
+def _faixa_periodo(de=None, ate=None):
+    """Período → (primeiro, último) transacao_id, None onde não há limite.
+
+    transacao_id é um ULID, então datas (AAAA-MM-DD) ou timestamps ISO (UTC
+    quando sem fuso) viram faixas da sort key; `ate` inclui o dia/instante
+    informado.
+    """
+    inicio = limite_ulid(_instante_ms(de)) if de else None
+    fim = limite_ulid(_instante_ms(ate, fim_do_dia=True), ultimo=True) if ate else None
+    return inicio, fim
+
+
+def _condicao_faixa(conta_id, inicio=None, fim=None):
+    """KeyCondition da conta com a faixa de transacao_id."""
+    condicao = Key('conta_id').eq(conta_id)
+    if inicio and fim:
+        return condicao & Key('transacao_id').between(inicio, fim)
+    if inicio:
+        return condicao & Key('transacao_id').gte(inicio)
+    if fim:
+        return condicao & Key('transacao_id').lte(fim)
+    return condicao
+
+
+def _instante_ms(texto, fim_do_dia=False):
+    """Data ou timestamp ISO em milissegundos UTC (ValueError se inválido)."""
+    instante = datetime.fromisoformat(texto)
+    if instante.tzinfo is None:
+        instante = instante.replace(tzinfo=timezone.utc)
+    ms = int(instante.timestamp() * 1000)
+    if fim_do_dia and len(texto) == 10:
+        ms += 86_400_000 - 1
+    return ms
+
+
+def _codificar_cursor(chave):
+    return base64.urlsafe_b64encode(json.dumps(chave).encode()).decode()
+
+
+def _decodificar_cursor(cursor, conta_id):
+    if not cursor:
+        return None
+    try:
+        chave = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError('cursor inválido')
+    if not isinstance(chave, dict) or set(chave) != {'conta_id', 'transacao_id'}:
+        raise ValueError('cursor inválido')
+    if chave['conta_id'] != conta_id:
+        raise ValueError('cursor de outra conta')
+    return chave
+
+
+# ══════════════════════════════════════
+# 🆔 IDS DE TRANSAÇÃO
+# ══════════════════════════════════════
+# transacao_id no formato ULID: 48 bits de milissegundos + 80 bits aleatórios
+# em base32 Crockford, 26 caracteres. A ordem lexicográfica é a ordem no
+# tempo, então períodos viram faixas da sort key. No mesmo milissegundo o
+# gerador incrementa a parte aleatória (monotônico dentro do container);
+# entre containers, colidir exigiria os mesmos 80 bits no mesmo milissegundo.
+#
+# Ids antigos (timestamp ISO + '#xxxx') começam pelo ano e ordenam depois de
+# qualquer ULID: até a tarefa migrar_transacao_ids regravá-los, aparecem no
+# topo do extrato (recentes primeiro), à frente dos lançamentos novos, e ficam
+# fora dos filtros de período. A migração roda uma vez depois do deploy, antes
+# de arquivar_livro; repetir não faz mal (o ULID deriva do id antigo).
+
+_CROCKFORD = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+_ALEATORIO_MAX = (1 << 80) - 1
+
+
+class GeradorULID:
+    """Gera ULIDs crescentes; seguro entre threads."""
+
+    def __init__(self):
+        self._ultimo_ms = -1
+        self._ultimo_aleatorio = 0
+        self._trava = threading.Lock()
+
+    def gerar(self, instante_ms=None):
+        ms = int(time.time() * 1000) if instante_ms is None else instante_ms
+        with self._trava:
+            if ms <= self._ultimo_ms:
+                # Mesmo milissegundo (ou relógio voltou): segue a sequência do último
+                ms, aleatorio = self._ultimo_ms, self._ultimo_aleatorio + 1
+                if aleatorio > _ALEATORIO_MAX:
+                    ms, aleatorio = ms + 1, int.from_bytes(os.urandom(10), 'big')
+            else:
+                aleatorio = int.from_bytes(os.urandom(10), 'big')
+            self._ultimo_ms, self._ultimo_aleatorio = ms, aleatorio
+        return codificar_ulid(ms, aleatorio)
+
+
+def codificar_ulid(ms, aleatorio):
+    valor = (ms << 80) | aleatorio
+    return ''.join(_CROCKFORD[(valor >> deslocamento) & 31] for deslocamento in range(125, -1, -5))
+
+
+def limite_ulid(ms, ultimo=False):
+    """Menor (ou maior) ULID possível no milissegundo, para faixas de período."""
+    return codificar_ulid(ms, _ALEATORIO_MAX if ultimo else 0)
+
+
+def ms_do_ulid(ulid):
+    """Milissegundos UTC dos 10 primeiros caracteres do ULID."""
+    ms = 0
+    for caractere in ulid[:10]:
+        ms = ms * 32 + _CROCKFORD.index(caractere)
+    return ms
+
+
+def ulid_do_legado(transacao_id):
+    """ULID para um id antigo (timestamp ISO + '#xxxx'): mesmo instante e bits
+    aleatórios derivados do id antigo, então a migração pode ser repetida."""
+    ms = _instante_ms(transacao_id.split('#')[0])
+    aleatorio = int.from_bytes(hashlib.sha256(transacao_id.encode()).digest()[:10], 'big')
+    return codificar_ulid(ms, aleatorio)
+
+
+_gerador_ids = GeradorULID()
+
+
+def tarefa_migrar_transacao_ids(event):
+    """Regrava lançamentos com transacao_id no formato antigo como ULID.
+
+    O item novo guarda o id antigo em transacao_id_legado; o antigo só é
+    apagado depois que o novo foi gravado. Processa até `paginas` páginas do
+    scan por execução e devolve `proximo` para retomar de onde parou.
+    """
+    params = {
+        # ULIDs deste milênio começam com '0'; os ids antigos com o ano
+        'FilterExpression': ~Attr('transacao_id').begins_with('0'),
+        'Limit': 500
+    }
+    if event.get('inicio'):
+        params['ExclusiveStartKey'] = event['inicio']
+
+    migrados = 0
+    for _ in range(int(event.get('paginas', 20))):
+        resultado = transactions_table.scan(**params)
+        antigos = resultado.get('Items', [])
+        gravar_em_lote(TRANSACTIONS_TABLE, [
+            {**item, 'transacao_id': ulid_do_legado(item['transacao_id']),
+             'transacao_id_legado': item['transacao_id']}
+            for item in antigos
+        ])
+        with transactions_table.batch_writer() as lote:
+            for item in antigos:
+                lote.delete_item(Key={'conta_id': item['conta_id'], 'transacao_id': item['transacao_id']})
+        migrados += len(antigos)
+
+        if 'LastEvaluatedKey' not in resultado:
+            return {'migrados': migrados, 'proximo': None}
+        params['ExclusiveStartKey'] = resultado['LastEvaluatedKey']
+    return {'migrados': migrados, 'proximo': params['ExclusiveStartKey']}
+
+
+# ══════════════════════════════════════
+# 📥 IMPORTAÇÃO DE CONTAS
+# ══════════════════════════════════════
+# Migração de clientes de bancos parceiros sem um POST /contas por cliente.
+# A tarefa importar_contas lê um CSV (cabeçalho com nome, cpf e, opcional,
+# user_id) ou NDJSON, local ou s3://, em blocos de IMPORTACAO_BLOCO linhas:
+#   1. valida e descarta CPFs repetidos no bloco (em memória);
+#   2. confere os CPFs na tabela de chaves com BatchGetItem consistente (nas
+#      duas grafias, com e sem máscara), os user_id no user_id-index e os
+#      conta_id gerados na de contas;
+#   3. grava contas e lançamentos de abertura com BatchWriteItem e, por
+#      último, as chaves CPF com PutItem condicional, em
+#      IMPORTACAO_PARALELISMO threads.
+# A posição (byte) do próximo bloco vai para o estado ao fim de cada bloco.
+# conta_id e transacao_id da abertura derivam da execução e do CPF, e a chave
+# guarda a execução e a linha (`importacao`): refazer um bloco interrompido
+# regrava os mesmos itens e reconhece as chaves que já tinha gravado.
+#
+# Uma chave registrada pela API entre a conferência e a escrita não é
+# sobrescrita: a linha sai como rejeitada e a conta e a abertura que já
+# tinham sido gravadas para ela são apagadas.
+
+_CPF = re.compile(r'\d{3}\.?\d{3}\.?\d{3}-?\d{2}')
+
+
+def normalizar_cpf(cpf):
+    """CPF na grafia do app (000.000.000-00), ou None se não tem 11 dígitos."""
+    cpf = str(cpf or '').strip()
+    if not _CPF.fullmatch(cpf):
+        return None
+    digitos = cpf.replace('.', '').replace('-', '')
+    return f'{digitos[:3]}.{digitos[3:6]}.{digitos[6:9]}-{digitos[9:]}'
+
+
+def ler_linhas(caminho, inicio=0, tamanho_leitura=1 << 20):
+    """Linhas do arquivo (local ou s3://) a partir do byte `inicio`, cada uma com
+    a posição do byte seguinte, para retomar dali."""
+    if caminho.startswith('s3://'):
+        bucket, chave = caminho[5:].split('/', 1)
+        faixa = {'Range': f'bytes={inicio}-'} if inicio else {}
+        corpo = s3.get_object(Bucket=bucket, Key=chave, **faixa)['Body']
+    else:
+        corpo = open(caminho, 'rb')
+        corpo.seek(inicio)
+    try:
+        posicao, resto = inicio, b''
+        while True:
+            pedaco = corpo.read(tamanho_leitura)
+            if not pedaco:
+                break
+            linhas = (resto + pedaco).split(b'\n')
+            resto = linhas.pop()
+            for linha in linhas:
+                posicao += len(linha) + 1
+                yield linha, posicao
+        if resto:
+            yield resto, posicao + len(resto)
+    finally:
+        corpo.close()
+
+
+def _registros_do_bloco(bloco, estado):
+    """Linhas do bloco → registros válidos e sem CPF repetido; anota as rejeitadas."""
+    textos = [linha.decode('utf-8-sig').rstrip('\r') for linha, _ in bloco]
+    primeira = estado['linha'] + 1
+    if estado['formato'] == 'csv':
+        if estado['colunas'] is None:
+            estado['colunas'] = [c.strip().lower() for c in next(csv.reader([textos.pop(0)]))]
+            primeira += 1
+        brutos = (dict(zip(estado['colunas'], valores)) for valores in csv.reader(textos))
+    else:
+        brutos = (_ler_json_ou_nada(texto) for texto in textos)
+
+    registros, cpfs, usuarios = [], set(), set()
+    for numero, (texto, bruto) in enumerate(zip(textos, brutos), start=primeira):
+        if not texto.strip():
+            continue
+        bruto = bruto or {}
+        nome = str(bruto.get('nome') or '').strip()
+        cpf = normalizar_cpf(bruto.get('cpf'))
+        user_id = str(bruto.get('user_id') or '').strip() or f'importado-{cpf}'
+        if not nome or not cpf:
+            _anotar(estado, 'rejeitadas', numero, 'nome e CPF válido são obrigatórios')
+        elif cpf in cpfs or user_id in usuarios:
+            _anotar(estado, 'duplicadas', numero, 'CPF ou user_id repetido no arquivo')
+        else:
+            cpfs.add(cpf)
+            usuarios.add(user_id)
+            registros.append({'linha': numero, 'nome': nome, 'cpf': cpf, 'user_id': user_id})
+    return registros
+
+
+def _ler_json_ou_nada(texto):
+    try:
+        registro = json.loads(texto)
+    except ValueError:
+        return None
+    return registro if isinstance(registro, dict) else None
+
+
+def _anotar(estado, contador, linha, motivo):
+    """Conta a linha não importada e guarda as primeiras como exemplo."""
+    estado[contador] += 1
+    if len(estado['exemplos']) < 20:
+        estado['exemplos'].append({'linha': linha, 'motivo': motivo})
+
+
+def _id_da_importacao(execucao, cpf, tentativa):
+    return hashlib.sha256(f'{execucao}:{cpf}:{tentativa}'.encode()).hexdigest()[:8]
+
+
+def importar_bloco(registros, estado):
+    """Confere e grava um bloco de registros; devolve quantas contas foram criadas
+    (inclusive as que uma tentativa interrompida do bloco já tinha completado)."""
+    def em_partes(itens, tamanho):
+        return [itens[i:i + tamanho] for i in range(0, len(itens), tamanho)]
+
+    # CPFs já cadastrados, nas duas grafias
+    grafias = [c for r in registros for c in (r['cpf'], r['cpf'].replace('.', '').replace('-', ''))]
+    existentes = {}
+    for itens in executar_em_paralelo(buscar_itens_pix, em_partes(grafias, 100), IMPORTACAO_PARALELISMO):
+        existentes.update((item['chave_valor'], item) for item in itens)
+
+    novos, refeitos = [], 0
+    for registro in registros:
+        registro['importacao'] = f'{estado["execucao"]}:{registro["linha"]}'
+        chave = existentes.get(registro['cpf']) or existentes.get(registro['cpf'].replace('.', '').replace('-', ''))
+        if not chave:
+            registro['conta_id'] = _id_da_importacao(estado['execucao'], registro['cpf'], 0)
+            novos.append(registro)
+        elif chave.get('importacao') == registro['importacao']:
+            # Chave desta linha: bloco refeito, a conta já está completa
+            refeitos += 1
+        else:
+            _anotar(estado, 'duplicadas', registro['linha'], 'CPF já cadastrado')
+    novos = _sem_conta_anterior(novos, estado)
+
+    # Com milhões de contas, conta_id de 8 caracteres colide: quem cai no id de
+    # outra conta (ou de outro registro do bloco) passa para o próximo candidato.
+    # Conta com o mesmo CPF é desta importação, gravada antes da interrupção.
+    for tentativa in range(1, 10):
+        ocupadas = {}
+        for contas in executar_em_paralelo(buscar_contas, em_partes([r['conta_id'] for r in novos], 100),
+                                           IMPORTACAO_PARALELISMO):
+            ocupadas.update(contas)
+        no_bloco, colididos = set(), []
+        for r in novos:
+            conta = ocupadas.get(r['conta_id'])
+            if r['conta_id'] in no_bloco or (conta and conta.get('cpf') != r['cpf']):
+                colididos.append(r)
+            no_bloco.add(r['conta_id'])
+        if not colididos:
+            break
+        for r in colididos:
+            r['conta_id'] = _id_da_importacao(estado['execucao'], r['cpf'], tentativa)
+    else:
+        raise RuntimeError('Não foi possível gerar conta_id livres para a importação')
+
+    criado_em = estado['inicio']
+    inicio_ms = int(datetime.fromisoformat(criado_em).timestamp() * 1000)
+    contas, lancamentos, chaves = [], [], []
+    for r in novos:
+        contas.append({
+            'conta_id': r['conta_id'], 'user_id': r['user_id'], 'nome': r['nome'], 'cpf': r['cpf'],
+            'saldo': Decimal('0.00'), 'criado_em': criado_em, 'atualizado_em': criado_em, 'ativo': True
+        })
+        aleatorio = int.from_bytes(hashlib.sha256(f'{estado["execucao"]}:{r["conta_id"]}'.encode()).digest()[:10], 'big')
+        lancamentos.append({
+            'conta_id': r['conta_id'], 'transacao_id': codificar_ulid(inicio_ms, aleatorio), 'tipo': 'ABERTURA',
+            'valor': Decimal('0'), 'descricao': 'Conta criada', 'data': criado_em
+        })
+        chaves.append({
+            'chave_valor': r['cpf'], 'chave_tipo': 'CPF', 'conta_id': r['conta_id'],
+            'user_id': r['user_id'], 'nome_titular': r['nome'], 'criado_em': criado_em,
+            'importacao': r['importacao']
+        })
+
+    # As chaves por último: chave presente significa conta e abertura já gravadas
+    escritas = [(ACCOUNTS_TABLE, parte) for parte in em_partes(contas, 25)]
+    escritas += [(TRANSACTIONS_TABLE, parte) for parte in em_partes(lancamentos, 25)]
+    executar_em_paralelo(lambda escrita: gravar_em_lote(*escrita), escritas, IMPORTACAO_PARALELISMO)
+    gravadas = set().union(*executar_em_paralelo(_gravar_chaves_importadas, em_partes(chaves, 100),
+                                                 IMPORTACAO_PARALELISMO))
+    if chaves and FILTRO_CHAVES_PIX:
+        marcar_sem_anotacao(datetime.now(timezone.utc))
+
+    # Chave registrada pela API depois da conferência: desfaz a conta da linha
+    perdidas = [(r, lancamento) for r, lancamento in zip(novos, lancamentos) if r['cpf'] not in gravadas]
+    if perdidas:
+        with accounts_table.batch_writer() as lote:
+            for r, _ in perdidas:
+                lote.delete_item(Key={'conta_id': r['conta_id']})
+        with transactions_table.batch_writer() as lote:
+            for _, lancamento in perdidas:
+                lote.delete_item(Key={'conta_id': lancamento['conta_id'], 'transacao_id': lancamento['transacao_id']})
+        for r, _ in perdidas:
+            _anotar(estado, 'rejeitadas', r['linha'], 'CPF registrado por outra conta durante a importação')
+    return len(novos) - len(perdidas) + refeitos
+
+
+def _sem_conta_anterior(registros, estado):
+    """Registros cujo user_id ainda não tem conta; anota os outros como rejeitados.
+
+    Conta do user_id com o mesmo CPF, criada no início desta execução, é de
+    uma tentativa interrompida do bloco e segue. O user_id padrão
+    (importado-<cpf>) não é consultado: a conferência do CPF já o cobre.
+    """
+    informados = [r['user_id'] for r in registros if r['user_id'] != f'importado-{r["cpf"]}']
+    conta_ids = executar_em_paralelo(resolver_conta_id, informados, IMPORTACAO_PARALELISMO)
+    anteriores = {user_id: conta_id for user_id, conta_id in zip(informados, conta_ids) if conta_id}
+    if not anteriores:
+        return registros
+    contas = buscar_contas(anteriores.values())
+
+    aceitos = []
+    for r in registros:
+        conta = contas.get(anteriores.get(r['user_id'])) or {}
+        if r['user_id'] in anteriores and (conta.get('cpf'), conta.get('criado_em')) != (r['cpf'], estado['inicio']):
+            _anotar(estado, 'rejeitadas', r['linha'], 'user_id já tem conta')
+        else:
+            aceitos.append(r)
+    return aceitos
+
+
+def _gravar_chaves_importadas(chaves):
+    """Até 100 chaves CPF numa TransactWriteItems, cada uma só se não existe ou é
+    da mesma linha. Devolve as gravadas; as que outra conta já tem ficam de fora
+    e as demais vão de novo."""
+    pendentes, gravadas = list(chaves), set()
+    for tentativa in range(LIVRO_MAX_TENTATIVAS):
+        try:
+            dynamodb.meta.client.transact_write_items(TransactItems=[{'Put': {
+                'TableName': PIX_KEYS_TABLE,
+                'Item': chave,
+                'ConditionExpression': 'attribute_not_exists(chave_valor) OR importacao = :importacao',
+                'ExpressionAttributeValues': {':importacao': chave['importacao']}
+            }} for chave in pendentes])
+            return gravadas | {chave['chave_valor'] for chave in pendentes}
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise
+            motivos = e.response.get('CancellationReasons') or []
+        ocupadas = [i for i, motivo in enumerate(motivos) if motivo.get('Code') == 'ConditionalCheckFailed']
+        pendentes = [chave for i, chave in enumerate(pendentes) if i not in ocupadas]
+        if not pendentes:
+            return gravadas
+        if not ocupadas:
+            time.sleep(random.uniform(0, 0.05 * 2 ** tentativa))
+    raise RuntimeError('TransactWriteItems das chaves importadas não concluiu')
+
+
+def carregar_importacao(event):
+    """Estado da importação de `origem` para retomar, ou um novo (também com `reiniciar`)."""
+    caminho = event.get('estado') or IMPORTACAO_ESTADO
+    if not event.get('reiniciar'):
+        try:
+            estado = json.loads(ler_arquivo(caminho))
+        except Exception:
+            estado = None
+        if estado and estado['origem'] == event['origem']:
+            return estado
+    origem = event['origem']
+    return {
+        'execucao': _gerador_ids.gerar(), 'origem': origem,
+        'formato': event.get('formato') or ('csv' if origem.lower().endswith('.csv') else 'ndjson'),
+        'colunas': None, 'posicao': 0, 'linha': 0, 'inicio': datetime.now(timezone.utc).isoformat(),
+        'fim': None, 'criadas': 0, 'duplicadas': 0, 'rejeitadas': 0, 'exemplos': []
+    }
+
+
+def tarefa_importar_contas(event):
+    """Importa contas de `origem` até o fim ou até `orcamento_s` segundos; chame de
+    novo enquanto o resultado trouxer `continuar`."""
+    if not event.get('origem'):
+        raise ValueError('Informe origem (arquivo CSV ou NDJSON, local ou s3://)')
+    caminho = event.get('estado') or IMPORTACAO_ESTADO
+    exigir_duravel(caminho, 'IMPORTACAO_ESTADO')
+    estado = carregar_importacao(event)
+    prazo = time.monotonic() + float(event.get('orcamento_s', IMPORTACAO_ORCAMENTO))
+    bloco_tamanho = int(event.get('bloco', IMPORTACAO_BLOCO))
+
+    if not estado['fim']:
+        linhas = ler_linhas(estado['origem'], estado['posicao'])
+        try:
+            while time.monotonic() < prazo:
+                bloco = list(itertools.islice(linhas, bloco_tamanho))
+                if not bloco:
+                    estado['fim'] = datetime.now(timezone.utc).isoformat()
+                    break
+                estado['criadas'] += importar_bloco(_registros_do_bloco(bloco, estado), estado)
+                estado['posicao'] = bloco[-1][1]
+                estado['linha'] += len(bloco)
+                gravar_arquivo(caminho, json.dumps(estado).encode())
+        finally:
+            linhas.close()
+        gravar_arquivo(caminho, json.dumps(estado).encode())
+
+    return {
+        'execucao': estado['execucao'], 'linhas': estado['linha'], 'criadas': estado['criadas'],
+        'duplicadas': estado['duplicadas'], 'rejeitadas': estado['rejeitadas'],
+        'exemplos': estado['exemplos'], 'continuar': not estado['fim']
+    }
+
+
+# ══════════════════════════════════════
+# 🧊 ARQUIVO DO LIVRO
+# ══════════════════════════════════════
+# A tabela de transações só precisa dos meses recentes: os lançamentos de
+# meses fechados há mais de ARQUIVO_IDADE_DIAS vão para segmentos NDJSON em
+# gzip, um por conta e mês (ARQUIVO_LIVRO/<conta_id>/<AAAA-MM>.ndjson.gz),
+# e saem da tabela pelo TTL (`expira_em`). A conta guarda o checkpoint em
+# `arquivo`:
+#   {"ate_ms": <último milissegundo arquivado>, "marcados_ms": <até onde os
+#    lançamentos já têm expira_em>, "saldo": <soma do livro até ate_ms>,
+#    "segmentos": [{"mes": "2025-03", "lancamentos": 41, "saldo": <no fim do mês>}, ...]}
+#
+# Por mês: grava o segmento, avança a fronteira da conta (condicional à
+# fronteira lida) e só então marca os lançamentos com expira_em. Uma
+# interrupção no meio deixa no máximo lançamentos arquivados sem TTL, que a
+# próxima execução marca. O extrato lê a tabela acima da fronteira e os
+# segmentos abaixo dela; a reconciliação soma o saldo do checkpoint e ignora
+# os lançamentos com expira_em.
+#
+# migrar_transacao_ids deve rodar antes: lançamentos gravados com data
+# anterior à fronteira não seriam vistos.
+
+def fronteira_arquivo(conta):
+    """Último milissegundo arquivado da conta (-1 se nada foi arquivado)."""
+    return int((conta.get('arquivo') or {}).get('ate_ms', -1))
+
+
+def caminho_segmento(conta_id, mes):
+    return f'{ARQUIVO_LIVRO.rstrip("/")}/{conta_id}/{mes}.ndjson.gz'
+
+
+def _mes_do_ms(ms):
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).strftime('%Y-%m')
+
+
+def _limites_mes(mes):
+    """Primeiro e último milissegundo do mês (AAAA-MM) em UTC."""
+    inicio = datetime.strptime(mes, '%Y-%m').replace(tzinfo=timezone.utc)
+    seguinte = (inicio + timedelta(days=32)).replace(day=1)
+    return int(inicio.timestamp() * 1000), int(seguinte.timestamp() * 1000) - 1
+
+
+def ler_segmento(conta_id, mes):
+    """Lançamentos do segmento em ordem crescente. Segmentos não mudam: ficam em cache."""
+    caminho = caminho_segmento(conta_id, mes)
+    lancamentos = _cache_segmentos.obter(caminho)
+    if lancamentos is None:
+        lancamentos = []
+        for linha in gzip.decompress(ler_arquivo(caminho)).splitlines():
+            lancamento = json.loads(linha)
+            lancamento['valor'] = Decimal(lancamento['valor'])
+            lancamentos.append(lancamento)
+        _cache_segmentos.guardar(caminho, lancamentos)
+    return lancamentos
+
+
+def iterar_arquivados(conta, de=None, ate=None, tipo=None, apos=None, recentes_primeiro=True):
+    """Lançamentos arquivados da conta na faixa [de, ate] de transacao_id, depois
+    do cursor `apos`. Meses fora da faixa não são lidos."""
+    segmentos = (conta.get('arquivo') or {}).get('segmentos', [])
+    for segmento in (reversed(segmentos) if recentes_primeiro else segmentos):
+        primeiro_ms, ultimo_ms = _limites_mes(segmento['mes'])
+        primeiro, ultimo = limite_ulid(primeiro_ms), limite_ulid(ultimo_ms, ultimo=True)
+        if (ate and primeiro > ate) or (de and ultimo < de):
+            continue
+        if apos and (primeiro >= apos if recentes_primeiro else ultimo <= apos):
+            continue
+        lancamentos = ler_segmento(conta['conta_id'], segmento['mes'])
+        for t in (reversed(lancamentos) if recentes_primeiro else lancamentos):
+            transacao_id = t['transacao_id']
+            if (de and transacao_id < de) or (ate and transacao_id > ate):
+                continue
+            if apos and (transacao_id >= apos if recentes_primeiro else transacao_id <= apos):
+                continue
+            if tipo and t['tipo'] != tipo.upper():
+                continue
+            yield t
+
+
+def arquivar_conta(conta, ate_ms):
+    """Arquiva os lançamentos da conta até ate_ms, um mês por vez; devolve quantos."""
+    conta_id = conta['conta_id']
+    arquivo = marcar_arquivados(conta_id, conta.get('arquivo'))
+    desde_ms = fronteira_arquivo(conta) + 1
+    if desde_ms > ate_ms:
+        return 0
+
+    faixa = _condicao_faixa(conta_id, limite_ulid(desde_ms), limite_ulid(ate_ms, ultimo=True))
+    arquivados, mes, lancamentos = 0, None, []
+    for t in iterar_transacoes(faixa, recentes_primeiro=False):
+        mes_lancamento = _mes_do_ms(ms_do_ulid(t['transacao_id']))
+        if mes_lancamento != mes and lancamentos:
+            arquivo = _fechar_segmento(conta_id, arquivo, mes, lancamentos)
+            arquivados += len(lancamentos)
+            lancamentos = []
+        mes = mes_lancamento
+        lancamentos.append(t)
+    if lancamentos:
+        _fechar_segmento(conta_id, arquivo, mes, lancamentos)
+        arquivados += len(lancamentos)
+    return arquivados
+
+
+def _fechar_segmento(conta_id, arquivo, mes, lancamentos):
+    """Grava o segmento do mês, avança o checkpoint da conta e marca os lançamentos."""
+    corpo = ''.join(
+        json.dumps({**t, 'valor': str(t['valor'])}, ensure_ascii=False, default=str) + '\n'
+        for t in lancamentos
+    )
+    gravar_arquivo(caminho_segmento(conta_id, mes), gzip.compress(corpo.encode()))
+
+    soma = sum(SINAIS_LANCAMENTO.get(t['tipo'], 0) * centavos(t['valor']) for t in lancamentos)
+    saldo = (arquivo['saldo'] if arquivo else Decimal('0')) + Decimal(soma).scaleb(-2)
+    novo = {
+        'ate_ms': _limites_mes(mes)[1],
+        'marcados_ms': arquivo['marcados_ms'] if arquivo else -1,
+        'saldo': saldo,
+        'segmentos': [*(arquivo['segmentos'] if arquivo else []),
+                      {'mes': mes, 'lancamentos': len(lancamentos), 'saldo': saldo}]
+    }
+    # Condicional à fronteira lida: duas execuções não arquivam o mesmo mês duas vezes
+    if arquivo:
+        condicao, valores = 'arquivo.ate_ms = :ate_anterior', {':ate_anterior': arquivo['ate_ms']}
+    else:
+        condicao, valores = 'attribute_not_exists(arquivo)', {}
+    accounts_table.update_item(
+        Key={'conta_id': conta_id},
+        UpdateExpression='SET arquivo = :arquivo',
+        ConditionExpression=condicao,
+        ExpressionAttributeValues={':arquivo': novo, **valores}
+    )
+    return marcar_arquivados(conta_id, novo)
+
+
+def marcar_arquivados(conta_id, arquivo):
+    """Põe expira_em nos lançamentos arquivados que ainda não têm (até ate_ms) e
+    devolve o checkpoint atualizado. O TTL da tabela remove os lançamentos depois
+    de ARQUIVO_CARENCIA."""
+    if not arquivo or int(arquivo['marcados_ms']) >= int(arquivo['ate_ms']):
+        return arquivo
+    expira_em = int(time.time()) + ARQUIVO_CARENCIA
+    faixa = _condicao_faixa(
+        conta_id, limite_ulid(int(arquivo['marcados_ms']) + 1), limite_ulid(int(arquivo['ate_ms']), ultimo=True)
+    )
+    gravar_em_lote(TRANSACTIONS_TABLE, [
+        {**t, 'expira_em': expira_em} for t in iterar_transacoes(faixa, recentes_primeiro=False)
+        if 'expira_em' not in t
+    ])
+    accounts_table.update_item(
+        Key={'conta_id': conta_id},
+        UpdateExpression='SET arquivo.marcados_ms = :ms',
+        ConditionExpression='arquivo.ate_ms = :ms',
+        ExpressionAttributeValues={':ms': arquivo['ate_ms']}
+    )
+    return {**arquivo, 'marcados_ms': arquivo['ate_ms']}
+
+
+def tarefa_arquivar_livro(event):
+    """Arquiva, conta por conta, os meses fechados há mais de `idade_dias`.
+
+    Processa até `paginas` páginas do scan de contas por execução e devolve
+    `proximo` para retomar de onde parou.
+    """
+    if not ARQUIVO_LIVRO:
+        raise ValueError('Defina ARQUIVO_LIVRO')
+    exigir_duravel(ARQUIVO_LIVRO, 'ARQUIVO_LIVRO')
+    limite = datetime.now(timezone.utc) - timedelta(days=int(event.get('idade_dias', ARQUIVO_IDADE_DIAS)))
+    # Último milissegundo do último mês que terminou antes do limite
+    ate_ms = int(limite.replace(day=1, hour=0, minute=0, second=0, microsecond=0).timestamp() * 1000) - 1
+
+    params = {'ProjectionExpression': 'conta_id, shard_de, arquivo', 'Limit': 100}
+    if event.get('inicio'):
+        params['ExclusiveStartKey'] = event['inicio']
+    contas = lancamentos = adiadas = 0
+    for _ in range(int(event.get('paginas', 20))):
+        resultado = accounts_table.scan(**params)
+        for conta in resultado.get('Items', []):
+            if conta.get('shard_de'):
+                continue
+            try:
+                arquivados = arquivar_conta(conta, ate_ms)
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                # Outra execução arquivou a conta ao mesmo tempo
+                adiadas += 1
+                continue
+            contas += bool(arquivados)
+            lancamentos += arquivados
+
+        if 'LastEvaluatedKey' not in resultado:
+            return {'contas': contas, 'lancamentos': lancamentos, 'adiadas': adiadas, 'proximo': None}
+        params['ExclusiveStartKey'] = resultado['LastEvaluatedKey']
+    return {'contas': contas, 'lancamentos': lancamentos, 'adiadas': adiadas, 'proximo': params['ExclusiveStartKey']}
+
+
+# ══════════════════════════════════════
+# 🧮 RECONCILIAÇÃO
+# ══════════════════════════════════════
+# Confere o saldo de cada conta (principal + shards) contra a soma do livro
+# (lançamentos gravados + checkpoint do arquivo). Duas fases de scan paralelo por
+# segmentos: contas e depois lançamentos, somados em centavos inteiros por
+# conta_id. A memória cresce com o número de contas, não de lançamentos; com
+# `particoes` > 1 cada passada cuida só das contas cujo hash cai na partição
+# (menos memória, um scan completo a mais por partição).
+#
+# Uma execução pode levar várias invocações: ao fim do orçamento de tempo o
+# estado (fase, posição de cada segmento, somas parciais) vai para
+# RECONCILIACAO_ESTADO e a próxima invocação retoma dali. Divergências do
+# scan são reconferidas com leituras consistentes da conta antes de entrar
+# no relatório: o scan não é um instantâneo e pega transferências no meio.
+
+# Sinal de cada tipo de lançamento no saldo
+SINAIS_LANCAMENTO = {
+    'ABERTURA': 1,
+    'DEPOSITO': 1,
+    'SAQUE': -1,
+    'PIX_ENVIADO': -1,
+    'PIX_RECEBIDO': 1,
+    'TRANSFERENCIA_ENVIADA': -1,
+    'TRANSFERENCIA_RECEBIDA': 1,
+}
+
+
+def na_particao(conta_id, particao, particoes):
+    return particoes == 1 or zlib.crc32(conta_id.encode()) % particoes == particao
+
+
+def somar_contas(itens, somas, particao, particoes):
+    """Itens da tabela de contas → somas[conta_id] = [saldo, livro arquivado] em centavos."""
+    for item in itens:
+        conta_id = item.get('shard_de') or item['conta_id']
+        if '#' in conta_id or not na_particao(conta_id, particao, particoes):
+            continue
+        soma = somas.setdefault(conta_id, [0, 0])
+        soma[0] += centavos(item.get('saldo', 0))
+        if 'arquivo' in item:
+            soma[1] += centavos(item['arquivo']['saldo'])
+
+
+def somar_lancamentos(itens, somas, particao, particoes):
+    """Lançamentos → somas[conta_id][1] += valor com sinal; devolve os tipos desconhecidos.
+
+    Os já arquivados (com expira_em) estão no saldo do checkpoint da conta.
+    """
+    desconhecidos = set()
+    for item in itens:
+        conta_id = item['conta_id']
+        if 'expira_em' in item or not na_particao(conta_id, particao, particoes):
+            continue
+        sinal = SINAIS_LANCAMENTO.get(item['tipo'])
+        if sinal is None:
+            desconhecidos.add(item['tipo'])
+            continue
+        somas.setdefault(conta_id, [0, 0])[1] += sinal * centavos(item['valor'])
+    return desconhecidos
+
+
+class RelatorioDivergencias:
+    """Uma linha JSON por divergência, numa parte por invocação.
+
+    Em arquivo local cada linha é gravada assim que encontrada; em s3:// a
+    parte sobe inteira no fim da invocação.
+    """
+
+    def __init__(self, prefixo, execucao, parte):
+        self.caminho = f'{prefixo.rstrip("/")}/{execucao}-{parte:04d}.jsonl'
+        self.linhas = 0
+        self._buffer = [] if self.caminho.startswith('s3://') else None
+        self._arquivo = None
+
+    def escrever(self, divergencia):
+        linha = json.dumps(divergencia, ensure_ascii=False, default=str) + '\n'
+        print(f"⚠️ Divergência: {linha.strip()}")
+        self.linhas += 1
+        if self._buffer is not None:
+            self._buffer.append(linha)
+            return
+        if self._arquivo is None:
+            os.makedirs(os.path.dirname(self.caminho) or '.', exist_ok=True)
+            self._arquivo = open(self.caminho, 'a', encoding='utf-8')
+        self._arquivo.write(linha)
+        self._arquivo.flush()
+
+    def fechar(self):
+        if self._buffer:
+            gravar_arquivo(self.caminho, ''.join(self._buffer).encode())
+        if self._arquivo:
+            self._arquivo.close()
+
+
+def conferir_conta(conta_id):
+    """(saldo, livro) da conta em centavos com leituras consistentes, ou None se a
+    conta mudou durante a leitura (fica para a próxima execução)."""
+    for _ in range(3):
+        conta, saldo = _saldo_consistente(conta_id)
+
+        # Até a fronteira do arquivo vale o saldo do checkpoint; da tabela, só o que vem depois
+        arquivo = (conta or {}).get('arquivo')
+        fronteira = fronteira_arquivo(conta or {})
+        params = {
+            'KeyConditionExpression': _condicao_faixa(conta_id, limite_ulid(fronteira + 1) if arquivo else None),
+            'ProjectionExpression': 'transacao_id, tipo, valor',
+            'ConsistentRead': True
+        }
+        livro = centavos(arquivo['saldo']) if arquivo else 0
+        while True:
+            resultado = transactions_table.query(**params)
+            for item in resultado.get('Items', []):
+                livro += SINAIS_LANCAMENTO.get(item['tipo'], 0) * centavos(item['valor'])
+            if 'LastEvaluatedKey' not in resultado:
+                break
+            params['ExclusiveStartKey'] = resultado['LastEvaluatedKey']
+
+        # Créditos em shard não mudam o item principal: compara o saldo também
+        depois, saldo_depois = _saldo_consistente(conta_id)
+        if (saldo == saldo_depois and (conta or {}).get('atualizado_em') == (depois or {}).get('atualizado_em')
+                and arquivo == (depois or {}).get('arquivo')):
+            return saldo, livro
+    return None
+
+
+def _saldo_consistente(conta_id):
+    """(item da conta, saldo em centavos com os shards, inclusive residuais)."""
+    conta = accounts_table.get_item(Key={'conta_id': conta_id}, ConsistentRead=True).get('Item')
+    if not conta:
+        return None, 0
+    shards = max(shards_da_conta(conta), int(conta.get('shards_residuais', 0)))
+    saldo = conta['saldo'] + sum(ler_shards(conta_id, shards).values(), Decimal('0')) if shards else conta['saldo']
+    return conta, centavos(saldo)
+
+
+def _varrer_segmento(tabela, projecao, somar, estado, segmento, prazo):
+    """Continua o scan de um segmento até o fim ou o prazo; devolve (somas, desconhecidos, posição, lidos)."""
+    params = {
+        'Segment': segmento,
+        'TotalSegments': estado['segmentos'],
+        'ProjectionExpression': projecao
+    }
+    posicao = estado['posicoes'][str(segmento)]
+    if posicao:
+        params['ExclusiveStartKey'] = posicao
+    somas, desconhecidos, lidos = {}, set(), 0
+    while time.monotonic() < prazo:
+        resultado = tabela.scan(**params)
+        itens = resultado.get('Items', [])
+        desconhecidos |= somar(itens, somas, estado['particao'], estado['particoes']) or set()
+        lidos += len(itens)
+        if 'LastEvaluatedKey' not in resultado:
+            return somas, desconhecidos, 'fim', lidos
+        params['ExclusiveStartKey'] = resultado['LastEvaluatedKey']
+    return somas, desconhecidos, params.get('ExclusiveStartKey'), lidos
+
+
+def _nova_reconciliacao(event):
+    particoes = int(event.get('particoes', RECONCILIACAO_PARTICOES))
+    segmentos = int(event.get('segmentos', RECONCILIACAO_SEGMENTOS))
+    return {
+        'execucao': _gerador_ids.gerar(), 'inicio': datetime.now(timezone.utc).isoformat(),
+        'fim': None, 'fase': 'contas', 'particao': 0, 'particoes': particoes,
+        'segmentos': segmentos, 'posicoes': {str(s): None for s in range(segmentos)},
+        'somas': {}, 'conferidas_ate': '', 'parte': 0, 'lidos': {'contas': 0, 'lancamentos': 0},
+        'divergencias': 0, 'instaveis': 0, 'tipos_desconhecidos': []
+    }
+
+
+def carregar_reconciliacao(event):
+    """Estado salvo para retomar; uma execução nova se não há estado, se pedido
+    com `reiniciar` ou se a última terminou há mais de RECONCILIACAO_INTERVALO s."""
+    if not event.get('reiniciar'):
+        try:
+            estado = json.loads(gzip.decompress(ler_arquivo(RECONCILIACAO_ESTADO)))
+        except Exception:
+            estado = None
+        if estado and (not estado['fim'] or
+                       time.time() - datetime.fromisoformat(estado['fim']).timestamp() < RECONCILIACAO_INTERVALO):
+            return estado
+    return _nova_reconciliacao(event)
+
+
+def tarefa_reconciliar_saldos(event):
+    """Avança a reconciliação até o fim ou até `orcamento_s` segundos; chame de novo
+    (agendamento) enquanto o resultado trouxer `continuar`."""
+    exigir_duravel(RECONCILIACAO_ESTADO, 'RECONCILIACAO_ESTADO')
+    exigir_duravel(RECONCILIACAO_RELATORIO, 'RECONCILIACAO_RELATORIO')
+    estado = carregar_reconciliacao(event)
+    if estado['fim']:
+        return {'execucao': estado['execucao'], 'fim': estado['fim'], 'continuar': False}
+
+    prazo = time.monotonic() + float(event.get('orcamento_s', RECONCILIACAO_ORCAMENTO))
+    estado['parte'] += 1
+    relatorio = RelatorioDivergencias(RECONCILIACAO_RELATORIO, estado['execucao'], estado['parte'])
+    fases = {
+        'contas': (accounts_table, 'conta_id, saldo, shard_de, arquivo', somar_contas),
+        'lancamentos': (transactions_table, 'conta_id, tipo, valor, expira_em', somar_lancamentos),
+    }
+    try:
+        while not estado['fim'] and time.monotonic() < prazo:
+            if estado['fase'] in fases:
+                tabela, projecao, somar = fases[estado['fase']]
+                pendentes = [s for s, p in estado['posicoes'].items() if p != 'fim']
+                parciais = executar_em_paralelo(
+                    lambda s: _varrer_segmento(tabela, projecao, somar, estado, int(s), prazo),
+                    pendentes, len(pendentes)
+                )
+                for segmento, (somas, desconhecidos, posicao, lidos) in zip(pendentes, parciais):
+                    for conta_id, (saldo, livro) in somas.items():
+                        soma = estado['somas'].setdefault(conta_id, [0, 0])
+                        soma[0] += saldo
+                        soma[1] += livro
+                    estado['tipos_desconhecidos'] = sorted(set(estado['tipos_desconhecidos']) | desconhecidos)
+                    estado['posicoes'][segmento] = posicao
+                    estado['lidos'][estado['fase']] += lidos
+                if all(p == 'fim' for p in estado['posicoes'].values()):
+                    estado['fase'] = 'lancamentos' if estado['fase'] == 'contas' else 'conferencia'
+                    estado['posicoes'] = {str(s): None for s in range(estado['segmentos'])}
+                continue
+
+            # Conferência: divergências do scan, em ordem, reconferidas uma a uma
+            for conta_id in sorted(c for c, (saldo, livro) in estado['somas'].items()
+                                   if saldo != livro and c > estado['conferidas_ate']):
+                if time.monotonic() >= prazo:
+                    break
+                conferida = conferir_conta(conta_id)
+                if conferida is None:
+                    estado['instaveis'] += 1
+                elif conferida[0] != conferida[1]:
+                    relatorio.escrever({
+                        'execucao': estado['execucao'], 'conta_id': conta_id,
+                        'saldo': Decimal(conferida[0]) / 100, 'livro': Decimal(conferida[1]) / 100,
+                        'diferenca': Decimal(conferida[0] - conferida[1]) / 100
+                    })
+                    estado['divergencias'] += 1
+                estado['conferidas_ate'] = conta_id
+            else:
+                estado['particao'] += 1
+                estado['somas'], estado['conferidas_ate'] = {}, ''
+                if estado['particao'] < estado['particoes']:
+                    estado['fase'] = 'contas'
+                else:
+                    estado['fase'], estado['fim'] = 'concluida', datetime.now(timezone.utc).isoformat()
+    finally:
+        relatorio.fechar()
+        gravar_arquivo(RECONCILIACAO_ESTADO, gzip.compress(json.dumps(estado).encode()))
+
+    return {
+        'execucao': estado['execucao'], 'fase': estado['fase'], 'particao': estado['particao'],
+        'lidos': estado['lidos'], 'divergencias': estado['divergencias'], 'instaveis': estado['instaveis'],
+        'tipos_desconhecidos': estado['tipos_desconhecidos'], 'relatorio': relatorio.caminho if relatorio.linhas else None,
+        'continuar': not estado['fim']
+    }
+
+
+# ══════════════════════════════════════
+# 🗃️ CACHE
+# ══════════════════════════════════════
+
+class CacheLRU:
+    """Cache LRU com TTL e contadores de acerto/erro, para viver no container.
+
+    Compartilhado pelas threads do servidor HTTP e do pool de leituras: toda
+    leitura-modificação do OrderedDict passa pela trava.
+    """
+
+    def __init__(self, max_itens, ttl):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self.acertos = 0
+        self.erros = 0
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave):
+        with self._trava:
+            return self._obter(chave)
+
+    def _obter(self, chave):
+        entrada = self._itens.get(chave)
+        if entrada is None or entrada[1] < time.monotonic():
+            if entrada is not None:
+                del self._itens[chave]
+            self.erros += 1
+            return None
+        self._itens.move_to_end(chave)
+        self.acertos += 1
+        return entrada[0]
+
+    def guardar(self, chave, valor, ttl=None):
+        with self._trava:
+            self._guardar(chave, valor, ttl)
+
+    def _guardar(self, chave, valor, ttl=None):
+        self._itens[chave] = (valor, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self._itens.move_to_end(chave)
+        while len(self._itens) > self.max_itens:
+            self._itens.popitem(last=False)
+
+    def obter_ou_criar(self, chave, criar):
+        """Valor em cache ou, atomicamente, o de criar() guardado no lugar."""
+        with self._trava:
+            valor = self._obter(chave)
+            if valor is None:
+                valor = criar()
+                self._guardar(chave, valor)
+            return valor
+
+    def remover(self, chave):
+        with self._trava:
+            self._itens.pop(chave, None)
+
+    def estatisticas(self):
+        with self._trava:
+            return {'itens': len(self._itens), 'acertos': self.acertos, 'erros': self.erros}
+
+
+class FiltroBloom:
+    """Filtro de Bloom: "não contém" é certeza, "contém" erra na taxa escolhida."""
+
+    def __init__(self, bits, hashes, gerado_em, dados=None):
+        self.bits = bits
+        self.hashes = hashes
+        self.gerado_em = gerado_em  # ms UTC do início da geração
+        self.dados = bytearray(dados) if dados is not None else bytearray((bits + 7) // 8)
+
+    @classmethod
+    def dimensionar(cls, itens, taxa, gerado_em):
+        bits = max(8192, int(-max(itens, 1) * math.log(taxa) / math.log(2) ** 2))
+        hashes = max(1, round(-math.log2(taxa)))
+        return cls(bits, hashes, gerado_em)
+
+    def _posicoes(self, chave):
+        resumo = hashlib.blake2b(chave.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(resumo[:8], 'big'), int.from_bytes(resumo[8:], 'big') | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def adicionar(self, chave):
+        for posicao in self._posicoes(chave):
+            self.dados[posicao >> 3] |= 1 << (posicao & 7)
+
+    def __contains__(self, chave):
+        return all(self.dados[posicao >> 3] & (1 << (posicao & 7)) for posicao in self._posicoes(chave))
+
+    def serializar(self):
+        cabecalho = json.dumps({'bits': self.bits, 'hashes': self.hashes, 'gerado_em': self.gerado_em})
+        return cabecalho.encode() + b'\n' + bytes(self.dados)
+
+    @classmethod
+    def carregar(cls, dados):
+        cabecalho, corpo = dados.split(b'\n', 1)
+        meta = json.loads(cabecalho)
+        return cls(meta['bits'], meta['hashes'], meta['gerado_em'], corpo)
+
+
+_cache_contas = CacheLRU(CACHE_CONTAS_MAX, CACHE_CONTAS_TTL)
+_cache_idempotencia = CacheLRU(CACHE_IDEMPOTENCIA_MAX, IDEMPOTENCIA_TTL)
+_cache_chaves_pix = CacheLRU(CACHE_CHAVES_MAX, CACHE_CHAVES_TTL)
+_cache_chaves_ausentes = CacheLRU(CACHE_CHAVES_MAX, CACHE_CHAVES_AUSENTES_TTL)
+_cache_recentes = CacheLRU(FILTRO_RECENTES_FATIAS, FILTRO_RECENTES_TTL)
+_estados_limite = CacheLRU(LIMITE_ESTADOS_MAX, 120)
+_cache_tokens = CacheLRU(CACHE_TOKENS_MAX, 3600)
+_cache_segmentos = CacheLRU(CACHE_SEGMENTOS_MAX, 86400)
+
+
+# ══════════════════════════════════════
+# 📈 MÉTRICAS
+# ══════════════════════════════════════
+
+# Operações que aceitam ReturnConsumedCapacity, separadas entre leitura e escrita
+_OPERACOES_LEITURA = {'GetItem', 'Query', 'Scan', 'BatchGetItem', 'TransactGetItems'}
+_OPERACOES_ESCRITA = {'PutItem', 'UpdateItem', 'DeleteItem', 'BatchWriteItem', 'TransactWriteItems'}
+
+_metricas_atuais = contextvars.ContextVar('metricas_requisicao', default=None)
+
+
+class MetricasRequisicao:
+    """Acumula rota, latência e chamadas ao DynamoDB de uma requisição e emite em EMF."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.rota = 'NAO_ENCONTRADA'
+        self.amostrada = random.random() < METRICAS_AMOSTRAGEM
+        self.chamadas = {}  # (tabela, operação) → [latências ms, capacidade]
+        self._trava = threading.Lock()
+
+    def registrar_chamada(self, tabela, operacao, latencia_ms, capacidade):
+        with self._trava:
+            chamada = self.chamadas.setdefault((tabela, operacao), [[], 0.0])
+            chamada[0].append(round(latencia_ms, 3))
+            chamada[1] += capacidade
+
+    def emitir(self, status):
+        if not self.amostrada and status < 500:
+            return
+        timestamp = int(time.time() * 1000)
+        rcu = sum(c[1] for (_, op), c in self.chamadas.items() if op in _OPERACOES_LEITURA)
+        wcu = sum(c[1] for (_, op), c in self.chamadas.items() if op in _OPERACOES_ESCRITA)
+        registro = {
+            '_aws': {'Timestamp': timestamp, 'CloudWatchMetrics': [{
+                'Namespace': METRICAS_NAMESPACE,
+                'Dimensions': [['Rota'], ['Rota', 'Status']],
+                'Metrics': [
+                    {'Name': 'Latencia', 'Unit': 'Milliseconds'},
+                    {'Name': 'ChamadasDynamo', 'Unit': 'Count'},
+                    {'Name': 'RCU', 'Unit': 'Count'},
+                    {'Name': 'WCU', 'Unit': 'Count'}
+                ]
+            }]},
+            'Rota': self.rota,
+            'Status': str(status),
+            'Latencia': round((time.perf_counter() - self.inicio) * 1000, 3),
+            'ChamadasDynamo': sum(len(c[0]) for c in self.chamadas.values()),
+            'RCU': rcu,
+            'WCU': wcu
+        }
+        print(json.dumps(registro, ensure_ascii=False))
+        for (tabela, operacao), (latencias, capacidade) in self.chamadas.items():
+            print(json.dumps({
+                '_aws': {'Timestamp': timestamp, 'CloudWatchMetrics': [{
+                    'Namespace': METRICAS_NAMESPACE,
+                    'Dimensions': [['Tabela', 'Operacao']],
+                    'Metrics': [
+                        {'Name': 'LatenciaDynamo', 'Unit': 'Milliseconds'},
+                        {'Name': 'CapacidadeConsumida', 'Unit': 'Count'}
+                    ]
+                }]},
+                'Rota': self.rota,
+                'Tabela': tabela,
+                'Operacao': operacao,
+                'LatenciaDynamo': latencias,
+                'CapacidadeConsumida': capacidade
+            }, ensure_ascii=False))
+
+
+def instrumentar_dynamodb(resource):
+    """Registra os hooks de métricas no client do resource (vale para tabelas e meta.client)."""
+    eventos = resource.meta.client.meta.events
+    eventos.register('provide-client-params.dynamodb', _preparar_chamada)
+    eventos.register('after-call.dynamodb', _finalizar_chamada)
+    return resource
+
+
+def _preparar_chamada(params, model, context, **kwargs):
+    """Pede a capacidade consumida e marca tabela e início da chamada."""
+    if model.name in _OPERACOES_LEITURA or model.name in _OPERACOES_ESCRITA:
+        params.setdefault('ReturnConsumedCapacity', 'TOTAL')
+    context['metricas_tabela'] = params.get('TableName') or ','.join(sorted(params.get('RequestItems', {}))) or '*'
+    context['metricas_inicio'] = time.perf_counter()
+
+
+def _finalizar_chamada(parsed, model, context, **kwargs):
+    if parsed.get('Error', {}).get('Code') in _ERROS_THROTTLING:
+        registrar_sobrecarga()
+    metricas = _metricas_atuais.get()
+    if metricas is None or 'metricas_inicio' not in context:
+        return
+    consumida = parsed.get('ConsumedCapacity') or []
+    if isinstance(consumida, dict):
+        consumida = [consumida]
+    metricas.registrar_chamada(
+        context['metricas_tabela'], model.name,
+        (time.perf_counter() - context['metricas_inicio']) * 1000,
+        sum(c.get('CapacityUnits', 0) for c in consumida)
+    )
+
+
+# ══════════════════════════════════════
+# 💵 DINHEIRO
+# ══════════════════════════════════════
+# Valores da API em centavos inteiros: validação, contas e formatação sem
+# passar por float. O DynamoDB continua guardando Number (Decimal no boto3);
+# a conversão fica na borda, em Dinheiro.decimal() e Dinheiro.do_dynamo().
+
+# Maior valor aceito numa requisição (R$ 10 bilhões)
+DINHEIRO_MAX_CENTAVOS = 10 ** 12
+
+
+def centavos(valor):
+    """Decimal (ou int) em reais → centavos inteiros, arredondando meio-para-par."""
+    quantia = valor * 100
+    inteiro = int(quantia)
+    # Valores gravados pela API têm até duas casas: o arredondamento é a exceção
+    return inteiro if inteiro == quantia else int(quantia.to_integral_value())
+
+
+class Dinheiro:
+    """Valor em centavos. No JSON sai como número em reais; em texto, como '12.50'."""
+
+    __slots__ = ('centavos',)
+
+    def __init__(self, centavos):
+        self.centavos = centavos
+
+    @classmethod
+    def ler(cls, valor):
+        """Valor vindo do corpo da requisição: inteiro, número ou texto com até duas casas.
+
+        ValueError para booleano, NaN/infinito, notação científica, mais de
+        duas casas ou acima de DINHEIRO_MAX_CENTAVOS.
+        """
+        tipo = type(valor)
+        if tipo is int:
+            quantia = valor * 100
+        elif tipo is float:
+            # O float do JSON volta idêntico a partir dos centavos só se tiver até duas casas
+            try:
+                quantia = round(valor * 100)
+            except (ValueError, OverflowError):
+                quantia = None
+            if quantia is None or quantia / 100 != valor:
+                raise ValueError('Valor inválido: use no máximo duas casas decimais')
+        elif tipo is str:
+            # '87.9' → int('8790'): um int() só, sem Decimal
+            texto = valor.strip()
+            inteiro, ponto, fracao = texto.partition('.')
+            digitos = inteiro[1:] if inteiro[:1] == '-' else inteiro
+            if (not digitos or len(digitos) > 13 or len(fracao) > 2 or (ponto and not fracao)
+                    or not (digitos + fracao).isdecimal() or not texto.isascii()):
+                raise ValueError('Valor inválido: use no máximo duas casas decimais')
+            quantia = int(inteiro + fracao.ljust(2, '0'))
+        else:
+            raise ValueError('Valor inválido: use no máximo duas casas decimais')
+        if abs(quantia) > DINHEIRO_MAX_CENTAVOS:
+            raise ValueError('Valor acima do limite')
+        return cls(quantia)
+
+    @classmethod
+    def positivo(cls, valor):
+        """Dinheiro.ler exigindo valor presente e maior que zero."""
+        if valor is None or valor == '':
+            raise ValueError('Valor deve ser positivo')
+        dinheiro = cls.ler(valor)
+        if dinheiro.centavos <= 0:
+            raise ValueError('Valor deve ser positivo')
+        return dinheiro
+
+    @classmethod
+    def do_dynamo(cls, valor):
+        return cls(centavos(valor))
+
+    def decimal(self):
+        return Decimal(self.centavos).scaleb(-2)
+
+    def __str__(self):
+        if self.centavos < 0:
+            return '-%d.%02d' % divmod(-self.centavos, 100)
+        return '%d.%02d' % divmod(self.centavos, 100)
+
+    def __repr__(self):
+        return f'Dinheiro({self})'
+
+    def __add__(self, outro):
+        return Dinheiro(self.centavos + outro.centavos)
+
+    def __radd__(self, outro):
+        # sum() começa em 0
+        if outro == 0:
+            return self
+        return NotImplemented
+
+    def __sub__(self, outro):
+        return Dinheiro(self.centavos - outro.centavos)
+
+    def __neg__(self):
+        return Dinheiro(-self.centavos)
+
+    def __eq__(self, outro):
+        return isinstance(outro, Dinheiro) and self.centavos == outro.centavos
+
+    def __hash__(self):
+        return hash(self.centavos)
+
+    def __lt__(self, outro):
+        return self.centavos < outro.centavos
+
+    def __le__(self, outro):
+        return self.centavos <= outro.centavos
+
+    def __gt__(self, outro):
+        return self.centavos > outro.centavos
+
+    def __ge__(self, outro):
+        return self.centavos >= outro.centavos
+
+    def __bool__(self):
+        return self.centavos != 0
 
 
 # ══════════════════════════════════════
 # 🔧 AUXILIARES
 # ══════════════════════════════════════
 
+def ler_header(event, nome):
+    """Header da requisição sem diferenciar maiúsculas (nome em minúsculas)."""
+    for chave, valor in (event.get('headers') or {}).items():
+        if chave.lower() == nome:
+            return valor
+    return None
+
+
+def executar_em_paralelo(funcao, itens, max_workers):
+    """Aplica funcao aos itens num pool de threads, levando o contexto da requisição."""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futuros = [executor.submit(contextvars.copy_context().run, funcao, item) for item in itens]
+        return [futuro.result() for futuro in futuros]
+
+
+# Vive entre invocações do container: não paga a criação de threads a cada requisição
+_pool_leituras = _Preguicoso(lambda: ThreadPoolExecutor(
+    max_workers=LEITURAS_PARALELAS, thread_name_prefix='leitura'
+))
+
+
+def em_paralelo(*chamadas):
+    """Executa leituras independentes (funções sem argumentos) ao mesmo tempo e
+    devolve os resultados na ordem; a latência passa a ser a da mais lenta.
+
+    A primeira roda na própria thread, as outras no pool compartilhado. Chamadas
+    feitas de dentro do pool rodam em sequência, para não esperar por vagas que
+    elas mesmas ocupam.
+    """
+    if len(chamadas) < 2 or threading.current_thread().name.startswith('leitura'):
+        return [chamada() for chamada in chamadas]
+    futuros = [_pool_leituras.submit(contextvars.copy_context().run, chamada) for chamada in chamadas[1:]]
+    primeiro = chamadas[0]()
+    return [primeiro, *(futuro.result() for futuro in futuros)]
+
+
 def buscar_conta(conta_id):
     resultado = accounts_table.get_item(Key={'conta_id': conta_id})
     return resultado.get('Item')
 
 
+def buscar_contas(conta_ids):
+    """Várias contas numa BatchGetItem (blocos de 100): conta_id → item, só as que existem."""
+    conta_ids = list(dict.fromkeys(conta_ids))
+    contas = {}
+    for i in range(0, len(conta_ids), 100):
+        pedido = {ACCOUNTS_TABLE: {'Keys': [{'conta_id': c} for c in conta_ids[i:i + 100]]}}
+        for tentativa in range(5):
+            resultado = dynamodb.batch_get_item(RequestItems=pedido)
+            for item in resultado.get('Responses', {}).get(ACCOUNTS_TABLE, []):
+                contas[item['conta_id']] = item
+            pedido = resultado.get('UnprocessedKeys')
+            if not pedido:
+                break
+            time.sleep(0.05 * 2 ** tentativa)
+        else:
+            raise RuntimeError('BatchGetItem de contas não concluiu')
+    return contas
+
+
 def buscar_conta_por_user(user_id):
-    from boto3.dynamodb.conditions import Key
-    try:
-        resultado = accounts_table.query(
-            IndexName='user_id-index',
-            KeyConditionExpression=Key('user_id').eq(user_id)
-        )
-        items = resultado.get('Items', [])
-        return items[0] if items else None
-    except Exception as e:
-        print(f"⚠️ Erro GSI user_id-index: {e}")
-        from boto3.dynamodb.conditions import Attr
-        resultado = accounts_table.scan(
-            FilterExpression=Attr('user_id').eq(user_id)
-        )
-        items = resultado.get('Items', [])
-        return items[0] if items else None
+    """Conta do usuário: conta_id vem do cache/GSI, o item em si é lido na tabela."""
+    conta_id = resolver_conta_id(user_id)
+    if not conta_id:
+        return None
+    return buscar_conta(conta_id)
+
+
+def resolver_conta_id(user_id):
+    """user_id → conta_id. O vínculo não muda depois de criar_conta, então fica em cache."""
+    conta_id = _cache_contas.obter(user_id)
+    if conta_id:
+        return conta_id
+
+    for tentativa in range(GSI_MAX_TENTATIVAS):
+        try:
+            resultado = accounts_table.query(
+                IndexName='user_id-index',
+                KeyConditionExpression=Key('user_id').eq(user_id),
+                ProjectionExpression='conta_id'
+            )
+            break
+        except ClientError as e:
+            # Sem scan de fallback: sob carga ele leria a tabela inteira
+            print(f"⚠️ Erro GSI user_id-index (tentativa {tentativa + 1}): {e}")
+            if tentativa + 1 == GSI_MAX_TENTATIVAS:
+                raise
+            time.sleep(0.05 * 2 ** tentativa)
+
+    items = resultado.get('Items', [])
+    if not items:
+        # Ausência não vai para o cache: a conta pode ser criada a seguir
+        return None
+    conta_id = items[0]['conta_id']
+    _cache_contas.guardar(user_id, conta_id)
+    return conta_id
 
 
 def buscar_chaves_por_conta(conta_id):
-    from boto3.dynamodb.conditions import Attr
-    try:
-        resultado = pix_keys_table.scan(
-            FilterExpression=Attr('conta_id').eq(conta_id)
-        )
-        return [
+    """Chaves PIX da conta via GSI conta_id-index, seguindo a paginação."""
+    params = {
+        'IndexName': 'conta_id-index',
+        'KeyConditionExpression': Key('conta_id').eq(conta_id)
+    }
+    chaves = []
+    while True:
+        resultado = pix_keys_table.query(**params)
+        chaves.extend(
             {
                 'tipo': item['chave_tipo'],
                 'chave': item['chave_valor'],
                 'criado_em': item.get('criado_em', '')
             }
             for item in resultado.get('Items', [])
-        ]
-    except Exception:
-        return []
+        )
+        if 'LastEvaluatedKey' not in resultado:
+            return chaves
+        params['ExclusiveStartKey'] = resultado['LastEvaluatedKey']
+
+
+def buscar_chaves_pix_em_lote(chaves):
+    """Resolve várias chaves PIX: caches e filtro primeiro, o resto com BatchGetItem
+    (100 por chamada), repetindo as não processadas."""
+    encontrados = {}
+    a_ler = []
+    for chave in chaves:
+        item = _cache_chaves_pix.obter(chave)
+        if item:
+            encontrados[chave] = item
+        elif not chave_ausente_sem_leitura(chave):
+            a_ler.append(chave)
+
+    for i in range(0, len(a_ler), 100):
+        pedido = {PIX_KEYS_TABLE: {
+            'Keys': [{'chave_valor': c} for c in a_ler[i:i + 100]],
+            'ProjectionExpression': CAMPOS_CHAVE_PIX
+        }}
+        for tentativa in range(5):
+            resultado = dynamodb.batch_get_item(RequestItems=pedido)
+            for item in resultado.get('Responses', {}).get(PIX_KEYS_TABLE, []):
+                encontrados[item['chave_valor']] = item
+            pedido = resultado.get('UnprocessedKeys')
+            if not pedido:
+                break
+            time.sleep(0.05 * 2 ** tentativa)
+        else:
+            raise RuntimeError('BatchGetItem de chaves PIX não concluiu')
+
+    for chave in a_ler:
+        if chave in encontrados:
+            _cache_chaves_pix.guardar(chave, encontrados[chave])
+        else:
+            _cache_chaves_ausentes.guardar(chave, True)
+    return encontrados
 
 
-def registrar_transacao(conta_id, tipo, valor, descricao=''):
-    transactions_table.put_item(Item={
+def montar_transacao(conta_id, tipo, valor, descricao=''):
+    agora = datetime.now(timezone.utc)
+    return {
         'conta_id': conta_id,
-        'transacao_id': datetime.now(timezone.utc).isoformat() + '#' + str(uuid.uuid4())[:4],
+        'transacao_id': _gerador_ids.gerar(int(agora.timestamp() * 1000)),
         'tipo': tipo,
         'valor': valor,
         'descricao': descricao,
-        'data': datetime.now(timezone.utc).isoformat()
-    })
+        'data': agora.isoformat()
+    }
+
+
+def resposta(status_code, body, cabecalhos_extras=None):
+    return {
+        'statusCode': status_code,
+        'headers': {**_cabecalhos('application/json'), **(cabecalhos_extras or {})},
+        'body': json.dumps(body, ensure_ascii=False, default=_json_padrao)
+    }
+
+
+def _json_padrao(valor):
+    # Dinheiro e Decimal do DynamoDB saem como número, sem passar por string
+    if type(valor) is Dinheiro:
+        return valor.centavos / 100
+    if isinstance(valor, Decimal):
+        return float(valor)
+    return str(valor)
+
+
+def gerar_etag(*partes):
+    # Fraca: o mesmo conteúdo pode sair com ou sem gzip
+    return 'W/"' + hashlib.sha256('\x1f'.join(partes).encode()).hexdigest()[:32] + '"'
+
+
+def cabecalhos_cache(etag):
+    """ETag e Cache-Control para o navegador revalidar com If-None-Match."""
+    if not etag:
+        return {'Cache-Control': 'no-store'}
+    return {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+
 
+def nao_modificado(etag):
+    return {'statusCode': 304, 'headers': {**_cabecalhos('application/json'), **cabecalhos_cache(etag)}, 'body': ''}
 
-def resposta(status_code, body):
+
+def comprimir(event, retorno):
+    """gzip no corpo quando o cliente aceita e vale a pena; o API Gateway decodifica o base64."""
+    corpo = retorno.get('body') or ''
+    if (not COMPRESSAO_ATIVA or retorno.get('isBase64Encoded') or len(corpo) < COMPRESSAO_MIN_BYTES
+            or 'gzip' not in (ler_header(event, 'accept-encoding') or '')):
+        return retorno
+    return {
+        **retorno,
+        'headers': {**retorno['headers'], 'Content-Encoding': 'gzip', 'Vary': 'Accept-Encoding'},
+        'body': base64.b64encode(gzip.compress(corpo.encode(), compresslevel=6)).decode(),
+        'isBase64Encoded': True
+    }
+
+
+def resposta_texto(status_code, corpo, content_type, cabecalhos_extras=None):
     return {
         'statusCode': status_code,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Methods': 'GET, POST, DELETE, OPTIONS',
-            'Access-Control-Allow-Headers': 'Content-Type,Authorization,X-User-Id'
-        },
-        'body': json.dumps(body, ensure_ascii=False, default=str)
-    }
\ No newline at end of file
+        'headers': {**_cabecalhos(content_type), **(cabecalhos_extras or {})},
+        'body': corpo
+    }
+
+
+def _cabecalhos(content_type):
+    return {
+        'Content-Type': content_type,
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'GET, POST, DELETE, OPTIONS',
+        'Access-Control-Allow-Headers': 'Content-Type,Authorization,X-User-Id,Idempotency-Key,If-None-Match',
+        'Access-Control-Expose-Headers': 'X-Proximo-Cursor,Idempotent-Replayed,ETag,Retry-After'
+    }
+
+
+# ══════════════════════════════════════
+# 🗓️ TAREFAS AGENDADAS
+# ══════════════════════════════════════
+# Disparadas por regras do EventBridge com entrada {"tarefa": "<nome>", ...}
+
+TAREFAS = {
+    'consolidar_saldos': tarefa_consolidar_saldos,
+    'migrar_transacao_ids': tarefa_migrar_transacao_ids,
+    'reconstruir_filtro_chaves': tarefa_reconstruir_filtro_chaves,
+    'reconciliar_saldos': tarefa_reconciliar_saldos,
+    'arquivar_livro': tarefa_arquivar_livro,
+    'importar_contas': tarefa_importar_contas,
+    'fragmentar_saldo': tarefa_fragmentar_saldo,
+    'executar_agendamentos': tarefa_executar_agendamentos,
+}
@@ -0,0 +1,254 @@
+"""
+🖥️ Mini Banco — modo servidor HTTP
+===================================
+Roda a API como serviço comum, fora do Lambda: cada requisição HTTP vira
+um evento no formato do proxy REST do API Gateway e passa pelo mesmo
+lambda_handler.
+
+Cada processo é um "container quente": importa lambda_function uma vez e
+reaproveita entre requisições o pool de conexões do DynamoDB, os caches
+(contas, chaves PIX, tokens, idempotência) e o filtro de chaves. Os
+processos escutam a mesma porta com SO_REUSEPORT e o kernel distribui as
+conexões; dentro de cada um, um pool de threads atende as requisições.
+Uma conexão keep-alive ociosa por mais de --ocioso segundos é fechada,
+devolvendo a thread ao pool.
+
+Tarefas agendadas (EventBridge no Lambda) podem rodar no primeiro
+processo com --agendar tarefa=segundos.
+
+Para um DynamoDB local (DynamoDB Local, moto_server), defina
+DYNAMODB_ENDPOINT e crie as tabelas com scripts/tabelas_locais.py. Sem o
+Cognito configurado, o header X-User-Id identifica o usuário com
+AUTH_MODO_TESTE=1.
+
+Uso: python backend/servidor.py [--host 0.0.0.0] [--porta 8080]
+         [--processos N] [--threads T] [--ocioso S] [--agendar executar_agendamentos=60 ...]
+"""
+
+import argparse
+import base64
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+# Aqui quem decodifica o base64 do gzip é o próprio servidor (_atender), sem
+# depender da configuração do API Gateway
+os.environ.setdefault('COMPRESSAO_ATIVA', '1')
+
+import lambda_function  # noqa: E402
+
+
+def montar_evento(metodo, alvo, cabecalhos, corpo, ip):
+    """Requisição HTTP → evento do proxy REST do API Gateway."""
+    url = urlsplit(alvo)
+    consulta = {}
+    for nome, valor in parse_qsl(url.query, keep_blank_values=True):
+        consulta.setdefault(nome, []).append(valor)
+    multi_cabecalhos = {}
+    for nome, valor in cabecalhos:
+        multi_cabecalhos.setdefault(nome, []).append(valor)
+    try:
+        texto, binario = (corpo.decode('utf-8'), False) if corpo else (None, False)
+    except UnicodeDecodeError:
+        texto, binario = base64.b64encode(corpo).decode(), True
+
+    return {
+        'resource': None,
+        'path': unquote(url.path),
+        'httpMethod': metodo,
+        'headers': {nome: valores[-1] for nome, valores in multi_cabecalhos.items()},
+        'multiValueHeaders': multi_cabecalhos,
+        'queryStringParameters': {nome: valores[-1] for nome, valores in consulta.items()} or None,
+        'multiValueQueryStringParameters': consulta or None,
+        'pathParameters': None,
+        'stageVariables': None,
+        'requestContext': {
+            'requestId': str(uuid.uuid4()),
+            'stage': 'local',
+            'requestTimeEpoch': int(time.time() * 1000),
+            'identity': {'sourceIp': ip}
+        },
+        'body': texto,
+        'isBase64Encoded': binario
+    }
+
+
+class ContextoLocal:
+    """O mínimo do objeto context do Lambda."""
+
+    function_name = 'mini-banco-servidor'
+
+    def __init__(self, id_requisicao):
+        self.aws_request_id = id_requisicao
+
+    def get_remaining_time_in_millis(self):
+        return 30000
+
+
+class Requisicao(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive: o cliente reaproveita a conexão
+    # Cada conexão ocupa uma thread do pool fixo enquanto estiver aberta: a
+    # espera pela próxima requisição tem prazo (servir() aplica --ocioso)
+    timeout = 5
+
+    def _atender(self):
+        tamanho = int(self.headers.get('Content-Length') or 0)
+        corpo = self.rfile.read(tamanho) if tamanho else b''
+
+        if self.command == 'OPTIONS':
+            # Preflight do CORS: no Lambda quem responde é o API Gateway
+            retorno = lambda_function.resposta_texto(204, '', 'text/plain')
+        else:
+            event = montar_evento(self.command, self.path, self.headers.items(), corpo, self.client_address[0])
+            try:
+                retorno = lambda_function.lambda_handler(event, ContextoLocal(event['requestContext']['requestId']))
+            except Exception as e:
+                print(f"❌ Erro no servidor em {self.command} {self.path}: {e}")
+                retorno = lambda_function.resposta(500, {'erro': 'Erro interno do servidor'})
+
+        dados = (retorno.get('body') or '').encode()
+        if retorno.get('isBase64Encoded'):
+            dados = base64.b64decode(dados)
+        if retorno['statusCode'] in (204, 304):
+            dados = b''
+
+        self.send_response(retorno['statusCode'])
+        for nome, valor in (retorno.get('headers') or {}).items():
+            self.send_header(nome, valor)
+        for nome, valores in (retorno.get('multiValueHeaders') or {}).items():
+            for valor in valores:
+                self.send_header(nome, valor)
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_OPTIONS = _atender
+
+    def log_message(self, formato, *args):
+        # Cada requisição já sai nos registros EMF do lambda_handler
+        pass
+
+
+class ServidorHTTP(HTTPServer):
+    """HTTPServer com um pool fixo de threads (o ThreadingHTTPServer abre uma por conexão)."""
+
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(self, endereco, threads, reutilizar_porta):
+        self.reutilizar_porta = reutilizar_porta
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='http')
+        super().__init__(endereco, Requisicao)
+
+    def server_bind(self):
+        if self.reutilizar_porta:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._processar, request, client_address)
+
+    def _processar(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def agendar(tarefas, parar):
+    """Roda cada tarefa a cada N segundos até `parar`, numa thread por tarefa."""
+    def repetir(nome, intervalo):
+        while not parar.wait(intervalo):
+            try:
+                lambda_function.lambda_handler({'tarefa': nome}, ContextoLocal(f'tarefa-{nome}'))
+            except Exception as e:
+                print(f"⚠️ Tarefa {nome} falhou: {e}")
+
+    for nome, intervalo in tarefas:
+        threading.Thread(target=repetir, args=(nome, intervalo), name=f'tarefa-{nome}', daemon=True).start()
+
+
+def servir(host, porta, threads, reutilizar_porta, tarefas=(), ocioso=5):
+    """Um processo: servidor com pool de threads até SIGTERM/SIGINT."""
+    Requisicao.timeout = ocioso
+    servidor = ServidorHTTP((host, porta), threads, reutilizar_porta)
+    parar = threading.Event()
+    agendar(tarefas, parar)
+
+    def encerrar(*_):
+        parar.set()
+        threading.Thread(target=servidor.shutdown).start()
+
+    signal.signal(signal.SIGTERM, encerrar)
+    signal.signal(signal.SIGINT, encerrar)
+    print(f"🖥️ Processo {os.getpid()} atendendo em http://{host}:{porta} com {threads} threads")
+    try:
+        servidor.serve_forever()
+    finally:
+        servidor.server_close()
+
+
+def ler_tarefas(especificacoes):
+    tarefas = []
+    for especificacao in especificacoes:
+        nome, _, intervalo = especificacao.partition('=')
+        if nome not in lambda_function.TAREFAS or not intervalo:
+            raise SystemExit(f"Tarefa inválida: {especificacao} (disponíveis: {', '.join(lambda_function.TAREFAS)})")
+        tarefas.append((nome, float(intervalo)))
+    return tarefas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=os.environ.get('SERVIDOR_HOST', '0.0.0.0'))
+    parser.add_argument('--porta', type=int, default=int(os.environ.get('SERVIDOR_PORTA', '8080')))
+    parser.add_argument('--processos', type=int, default=int(os.environ.get('SERVIDOR_PROCESSOS', os.cpu_count() or 1)))
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('SERVIDOR_THREADS', '16')))
+    parser.add_argument('--ocioso', type=float, default=float(os.environ.get('SERVIDOR_OCIOSO_S', '5')),
+                        help='segundos que uma conexão keep-alive pode ficar sem requisição')
+    parser.add_argument('--agendar', nargs='*', default=[], metavar='TAREFA=SEGUNDOS')
+    args = parser.parse_args()
+    tarefas = ler_tarefas(args.agendar)
+
+    if args.processos <= 1:
+        servir(args.host, args.porta, args.threads, False, tarefas, args.ocioso)
+        return
+
+    # Cada processo importa e aquece o seu lambda_function; só o primeiro roda as tarefas
+    processos = [
+        multiprocessing.Process(
+            target=servir,
+            args=(args.host, args.porta, args.threads, True, tarefas if i == 0 else (), args.ocioso),
+            name=f'servidor-{i}'
+        )
+        for i in range(args.processos)
+    ]
+    for processo in processos:
+        processo.start()
+
+    def encerrar(*_):
+        for processo in processos:
+            if processo.is_alive():
+                processo.terminate()
+
+    signal.signal(signal.SIGTERM, encerrar)
+    signal.signal(signal.SIGINT, encerrar)
+    for processo in processos:
+        processo.join()
+
+
+if __name__ == '__main__':
+    main()
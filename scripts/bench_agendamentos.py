@@ -0,0 +1,150 @@
+"""
+🧪 Benchmark — PIX agendado: pico de meia-noite
+===============================================
+--pagamentos agendamentos (padrão 100 mil) marcados para a mesma meia-noite.
+Duas medidas:
+  • espalhamento: quantos caem no minuto e no balde (partição) mais
+    cheios sem janela e com AGENDAMENTO_JANELA_S, e a taxa de escrita
+    que isso pede de uma partição se o minuto for pago em 60 s;
+  • execução: --amostra pagamentos vencidos todos no mesmo minuto, de
+    amostra/4 contas para --recebedores chaves, pagos pela tarefa
+    executar_agendamentos chamada até o cursor alcançar o relógio — em
+    sequência e com AGENDAMENTO_PARALELISMO. Mostra pagamentos/s,
+    chamadas ao DynamoDB por pagamento, a projeção para --pagamentos e
+    confere que cada um foi pago uma única vez (débitos = créditos).
+
+A execução roda numa amostra: no moto cada Query varre a tabela inteira,
+e com 100 mil agendamentos reler o minuto a cada invocação da tarefa já
+consome o orçamento dela — no DynamoDB são algumas páginas por fatia. As
+transações usam bench_comum.transacoes_leves.
+Latência modelada por chamada ao DynamoDB como em bench_leituras_paralelas
+(--latencia ms).
+
+Uso: python scripts/bench_agendamentos.py [--pagamentos N] [--amostra A] [--recebedores R] [--latencia MS]
+"""
+
+import argparse
+import contextlib
+import io
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from bench_comum import banco_local, transacoes_leves
+from bench_leituras_paralelas import modelar_latencia
+
+
+def criar_contas(lf, pagadores, recebedores):
+    agora = datetime.now(timezone.utc).isoformat()
+    contas, chaves = [], []
+    for i in range(pagadores + recebedores):
+        conta_id = f'bench-{i:07d}'
+        contas.append({'conta_id': conta_id, 'user_id': conta_id, 'nome': f'Cliente {i}', 'cpf': f'{i:011d}',
+                       'saldo': Decimal('1000.00') if i < pagadores else Decimal('0.00'),
+                       'criado_em': agora, 'atualizado_em': agora, 'ativo': True})
+        if i >= pagadores:
+            chaves.append({'chave_valor': f'{i:011d}', 'chave_tipo': 'CPF', 'conta_id': conta_id,
+                           'user_id': conta_id, 'nome_titular': f'Cliente {i}', 'criado_em': agora})
+    lf.gravar_em_lote(lf.ACCOUNTS_TABLE, contas)
+    lf.gravar_em_lote(lf.PIX_KEYS_TABLE, chaves)
+    return [c['conta_id'] for c in contas[:pagadores]], [c['chave_valor'] for c in chaves]
+
+
+def gerar_agendamentos(lf, quantidade, pagadores, chaves, meia_noite):
+    return [
+        lf.montar_agendamento({
+            'serie_id': lf._gerador_ids.gerar(), 'conta_id': pagadores[i % len(pagadores)],
+            'chave': chaves[i % len(chaves)], 'valor': Decimal('10.00'), 'descricao': 'Mensalidade',
+            'recorrencia': 'UNICA', 'ocorrencia': 1
+        }, meia_noite)
+        for i in range(quantidade)
+    ]
+
+
+def espalhamento(itens):
+    minutos = Counter(item['balde'].split('#')[0] for item in itens)
+    baldes = Counter(item['balde'] for item in itens)
+    return len(minutos), max(minutos.values()), max(baldes.values())
+
+
+def executar(args, paralelismo):
+    """Paga a amostra, toda vencida no mesmo minuto, num banco limpo."""
+    pagadores_n = max(1, args.amostra // 4)
+    with banco_local() as lf:
+        lf.LIMITE_NOITE_INICIO = lf.LIMITE_NOITE_FIM = 0  # mede o motor, não o limite noturno
+        lf.AGENDAMENTO_PARALELISMO = paralelismo
+        pagadores, chaves = criar_contas(lf, pagadores_n, args.recebedores)
+        vencimento = datetime.now(timezone.utc).replace(second=0, microsecond=0) - timedelta(minutes=2)
+        antecedencia, janela = lf.AGENDAMENTO_ANTECEDENCIA_S, lf.AGENDAMENTO_JANELA_S
+        lf.AGENDAMENTO_ANTECEDENCIA_S, lf.AGENDAMENTO_JANELA_S = -3600, 0
+        lf.gravar_em_lote(lf.SCHEDULES_TABLE, gerar_agendamentos(lf, args.amostra, pagadores, chaves, vencimento))
+        lf.AGENDAMENTO_ANTECEDENCIA_S, lf.AGENDAMENTO_JANELA_S = antecedencia, janela
+        # Regime normal: o cursor parado no minuto anterior ao vencimento
+        lf.schedules_table.put_item(Item={**lf._CURSOR_AGENDAMENTOS, 'minuto': int(vencimento.timestamp() // 60) - 1})
+        saldo_antes = sum(c['saldo'] for c in lf.buscar_contas(pagadores).values())
+
+        modelar_latencia(lf, args.latencia)
+        chamadas = []
+        lf.dynamodb.meta.client.meta.events.register(
+            'provide-client-params.dynamodb.*', lambda **kwargs: chamadas.append(1)
+        )
+        total = Counter()
+        inicio = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            while True:
+                resultado = lf.lambda_handler({'tarefa': 'executar_agendamentos'}, None)
+                total.update({k: v for k, v in resultado.items() if type(v) is int})
+                total['invocacoes'] += 1
+                if not resultado['continuar']:
+                    break
+        total['segundos'] = time.perf_counter() - inicio
+        total['chamadas'] = len(chamadas)
+
+        total['debitado'] = saldo_antes - sum(c['saldo'] for c in lf.buscar_contas(pagadores).values())
+        total['creditado'] = sum(c['saldo'] for c in lf.buscar_contas(
+            [f'bench-{i:07d}' for i in range(pagadores_n, pagadores_n + args.recebedores)]).values())
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pagamentos', type=int, default=100_000)
+    parser.add_argument('--amostra', type=int, default=400)
+    parser.add_argument('--recebedores', type=int, default=50)
+    parser.add_argument('--latencia', type=float, default=5.0)
+    args = parser.parse_args()
+
+    with banco_local() as lf:
+        meia_noite = datetime.now(timezone.utc).replace(hour=3, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        pagadores = [f'bench-{i:07d}' for i in range(args.pagamentos // 4)]
+        chaves = [f'{i:011d}' for i in range(args.recebedores)]
+        janela = lf.AGENDAMENTO_JANELA_S
+        lf.AGENDAMENTO_JANELA_S = 0
+        sem_janela = espalhamento(gerar_agendamentos(lf, args.pagamentos, pagadores, chaves, meia_noite))
+        lf.AGENDAMENTO_JANELA_S = janela
+        com_janela = espalhamento(gerar_agendamentos(lf, args.pagamentos, pagadores, chaves, meia_noite))
+        paralelismo = lf.AGENDAMENTO_PARALELISMO
+
+    print(f'{args.pagamentos:,} agendamentos para a meia-noite, {lf.AGENDAMENTO_FATIAS} fatias por minuto')
+    print(f'{"espalhamento":<16} | {"minutos":>7} | {"minuto mais cheio":>17} | {"balde mais cheio":>16} | {"escritas/s no balde":>19}')
+    for nome, (minutos, minuto, balde) in (('sem janela', sem_janela), (f'janela {janela} s', com_janela)):
+        # Pagar o minuto em 60 s: uma conclusão por agendamento na partição do balde (limite: 1.000 WCU/s)
+        print(f'{nome:<16} | {minutos:>7} | {minuto:>17,} | {balde:>16,} | {balde / 60:>19,.0f}')
+
+    transacoes_leves()
+    print(f'\nexecução de {args.amostra} pagamentos vencidos no mesmo minuto, latência {args.latencia} ms por chamada')
+    rotulo_projecao = f'{args.pagamentos // 1000}k pagamentos'
+    print(f'{"modo":<16} | {"segundos":>8} | {"pag/s":>6} | {"chamadas/pag":>12} | {rotulo_projecao:>16} | conferência')
+    for nome, n in (('sequencial', 1), (f'{paralelismo} em paralelo', paralelismo)):
+        r = executar(args, n)
+        taxa = args.amostra / r['segundos']
+        esperado = Decimal('10.00') * r['executados']
+        conferencia = (f"executados {r['executados']}/{args.amostra}, falhas {r['falhas']}, "
+                       f"uma vez cada: {r['debitado'] == r['creditado'] == esperado}")
+        print(f"{nome:<16} | {r['segundos']:>8.1f} | {taxa:>6.0f} | {r['chamadas'] / args.amostra:>12.2f} | "
+              f"{args.pagamentos / taxa / 60:>12.1f} min | {conferencia}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+🧪 Benchmark — arquivo do livro (tabela quente × segmentos mensais)
+===================================================================
+Gera um histórico de --meses meses para --contas contas, roda a tarefa
+arquivar_livro e simula o TTL apagando os lançamentos marcados. Compara
+antes e depois:
+  • itens e bytes na tabela de transações (tamanho de item como o
+    DynamoDB cobra: nomes + valores dos atributos) × bytes dos segmentos;
+  • latência do extrato: primeira página (o caso comum), uma página
+    funda (cursor já dentro do arquivo) e a exportação completa.
+
+Uso: python scripts/bench_arquivo_livro.py [--contas N] [--meses M] [--por-mes K]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+ARQUIVO = tempfile.mkdtemp(prefix='arquivo-livro-')
+os.environ['ARQUIVO_LIVRO'] = ARQUIVO
+
+from bench_comum import banco_local, cronometrar, resumo  # noqa: E402
+
+
+def tamanho_item(item):
+    return sum(len(nome) + len(str(valor)) for nome, valor in item.items())
+
+
+def gerar_historico(lf, contas, meses, por_mes, semente=7):
+    sorteio = random.Random(semente)
+    hoje = datetime.now(timezone.utc).replace(day=1, hour=12, minute=0, second=0, microsecond=0)
+    for conta_id in contas:
+        itens = []
+        for m in range(meses, 0, -1):
+            inicio_mes = (hoje - timedelta(days=31 * m)).replace(day=1)
+            for _ in range(por_mes):
+                ms = int((inicio_mes + timedelta(minutes=sorteio.randrange(27 * 24 * 60))).timestamp() * 1000)
+                itens.append({
+                    'conta_id': conta_id, 'transacao_id': lf.codificar_ulid(ms, sorteio.getrandbits(80)),
+                    'tipo': 'DEPOSITO', 'valor': Decimal(sorteio.randint(100, 100_000)) / 100,
+                    'descricao': 'Depósito', 'data': datetime.fromtimestamp(ms / 1000, timezone.utc).isoformat()
+                })
+        lf.gravar_em_lote(lf.TRANSACTIONS_TABLE, itens)
+
+
+def tabela_quente(lf):
+    itens = []
+    params = {}
+    while True:
+        resultado = lf.transactions_table.scan(**params)
+        itens += resultado.get('Items', [])
+        if 'LastEvaluatedKey' not in resultado:
+            return itens
+        params['ExclusiveStartKey'] = resultado['LastEvaluatedKey']
+
+
+def medir_extrato(lf, user_id, repeticoes):
+    def chamar(params):
+        evento = {'path': '/extrato', 'httpMethod': 'GET', 'headers': {'X-User-Id': user_id},
+                  'queryStringParameters': params}
+        with contextlib.redirect_stdout(io.StringIO()):
+            retorno = lf.lambda_handler(evento, None)
+        assert retorno['statusCode'] == 200, retorno
+        return retorno
+
+    fundo = json.loads(chamar({'limite': '100'})['body'])
+    for _ in range(3):
+        fundo = json.loads(chamar({'limite': '100', 'cursor': fundo['proximo_cursor']})['body'])
+    cursor_fundo = fundo['proximo_cursor']
+    conta_id = fundo['conta_id']
+    return {
+        'primeira página': resumo(cronometrar(lambda: chamar({}), repeticoes)),
+        'página funda': resumo(cronometrar(lambda: chamar({'cursor': cursor_fundo}), repeticoes)),
+        'exportação': resumo(cronometrar(lambda: sum(1 for _ in lf.exportar_extrato(conta_id)), max(1, repeticoes // 10))),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--contas', type=int, default=20)
+    parser.add_argument('--meses', type=int, default=24)
+    parser.add_argument('--por-mes', type=int, default=40)
+    parser.add_argument('--repeticoes', type=int, default=50)
+    args = parser.parse_args()
+
+    with banco_local() as lf:
+        contas = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(args.contas):
+                evento = {'path': '/contas', 'httpMethod': 'POST', 'headers': {'X-User-Id': f'bench-{i}'},
+                          'body': json.dumps({'nome': f'Conta {i}', 'cpf': f'{i:011d}'})}
+                contas.append(json.loads(lf.lambda_handler(evento, None)['body'])['conta_id'])
+        gerar_historico(lf, contas, args.meses, args.por_mes)
+
+        antes = tabela_quente(lf)
+        latencias_antes = medir_extrato(lf, 'bench-0', args.repeticoes)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            resultado = lf.lambda_handler({'tarefa': 'arquivar_livro'}, None)
+        # O TTL do DynamoDB apaga os marcados; o moto não, então o benchmark apaga
+        with lf.transactions_table.batch_writer() as lote:
+            for item in tabela_quente(lf):
+                if 'expira_em' in item:
+                    lote.delete_item(Key={'conta_id': item['conta_id'], 'transacao_id': item['transacao_id']})
+        lf._cache_segmentos._itens.clear()
+
+        depois = tabela_quente(lf)
+        segmentos = sum(
+            os.path.getsize(os.path.join(raiz, nome)) for raiz, _, nomes in os.walk(ARQUIVO) for nome in nomes
+        )
+        latencias_depois = medir_extrato(lf, 'bench-0', args.repeticoes)
+
+    print(f"arquivados: {resultado['lancamentos']:,} lançamentos de {resultado['contas']} contas\n")
+    print(f'{"":<22} | {"itens":>8} | {"bytes":>12}')
+    print(f'{"tabela quente antes":<22} | {len(antes):>8,} | {sum(map(tamanho_item, antes)):>12,}')
+    print(f'{"tabela quente depois":<22} | {len(depois):>8,} | {sum(map(tamanho_item, depois)):>12,}')
+    print(f'{"segmentos (gzip)":<22} | {"":>8} | {segmentos:>12,}\n')
+    print(f'{"extrato":<16} | {"p50 antes":>10} | {"p50 depois":>10} | {"p95 antes":>10} | {"p95 depois":>10}')
+    for caso in latencias_antes:
+        a, d = latencias_antes[caso], latencias_depois[caso]
+        print(f'{caso:<16} | {a["p50"]:>8.2f}ms | {d["p50"]:>8.2f}ms | {a["p95"]:>8.2f}ms | {d["p95"]:>8.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
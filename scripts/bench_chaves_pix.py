@@ -0,0 +1,62 @@
+"""
+🧪 Benchmark — listagem de chaves PIX por conta
+================================================
+Compara o scan filtrado antigo com a consulta ao GSI conta_id-index
+conforme a tabela de chaves cresce. O custo no DynamoDB acompanha os
+itens examinados: no scan cresce com a tabela, no GSI fica no número de
+chaves da conta. A latência medida no moto cresce nos dois casos porque o
+simulador percorre o índice em memória; no DynamoDB real quem manda é a
+coluna de itens examinados.
+
+Uso: python scripts/bench_chaves_pix.py [tamanho ...]
+"""
+
+import sys
+
+from bench_comum import banco_local, cronometrar, resumo
+
+CHAVES_POR_CONTA = 3
+
+
+def popular(lf, total):
+    with lf.pix_keys_table.batch_writer() as lote:
+        for i in range(total):
+            lote.put_item(Item={
+                'chave_valor': f'chave-{i:09d}',
+                'chave_tipo': 'ALEATORIA',
+                'conta_id': f'conta-{i // CHAVES_POR_CONTA:08d}',
+                'user_id': f'user-{i // CHAVES_POR_CONTA:08d}',
+                'nome_titular': 'Bench',
+                'criado_em': '2026-01-01T00:00:00+00:00'
+            })
+
+
+def scan_antigo(lf, conta_id):
+    """O caminho anterior: scan com filtro (aqui paginado, para contar tudo)."""
+    from boto3.dynamodb.conditions import Attr
+    params = {'FilterExpression': Attr('conta_id').eq(conta_id)}
+    examinados = 0
+    while True:
+        resultado = lf.pix_keys_table.scan(**params)
+        examinados += resultado['ScannedCount']
+        if 'LastEvaluatedKey' not in resultado:
+            return examinados
+        params['ExclusiveStartKey'] = resultado['LastEvaluatedKey']
+
+
+def main():
+    tamanhos = [int(t) for t in sys.argv[1:]] or [1_000, 10_000, 50_000]
+    print(f"{'chaves':>10} | {'scan itens':>10} {'scan p50 ms':>12} | {'gsi itens':>9} {'gsi p50 ms':>11}")
+    for total in tamanhos:
+        with banco_local() as lf:
+            popular(lf, total)
+            conta_id = f'conta-{(total // CHAVES_POR_CONTA) // 2:08d}'
+            examinados = scan_antigo(lf, conta_id)
+            t_scan = resumo(cronometrar(lambda: scan_antigo(lf, conta_id), 5))
+            chaves = lf.buscar_chaves_por_conta(conta_id)
+            t_gsi = resumo(cronometrar(lambda: lf.buscar_chaves_por_conta(conta_id), 50))
+        print(f"{total:>10} | {examinados:>10} {t_scan['p50']:>12} | {len(chaves):>9} {t_gsi['p50']:>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""
+🧪 Base dos benchmarks — DynamoDB local em memória
+===================================================
+Sobe as tabelas do Mini Banco num DynamoDB simulado (moto), sem rede,
+e carrega backend/lambda_function.py apontando para ele.
+
+Requer: pip install -r scripts/requirements.txt
+"""
+
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, 'backend'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-2')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+# Os benchmarks se identificam pelo header X-User-Id (login de teste)
+os.environ.setdefault('AUTH_MODO_TESTE', '1')
+# Como em produção depois do deploy (API Gateway com binaryMediaTypes '*/*')
+os.environ.setdefault('COMPRESSAO_ATIVA', '1')
+# Os benchmarks disparam rajadas de um mesmo usuário: limites de taxa altos
+# (bench_limite_taxa.py configura os seus)
+os.environ.setdefault('LIMITES_TAXA', json.dumps({
+    nome: [1e9, 1e9, False] for nome in ('padrao', 'consulta', 'extrato', 'publica', 'lote')
+}))
+
+
+def _s(nome):
+    return {'AttributeName': nome, 'AttributeType': 'S'}
+
+
+def _gsi(nome, chave):
+    return {
+        'IndexName': nome,
+        'KeySchema': [{'AttributeName': chave, 'KeyType': 'HASH'}],
+        'Projection': {'ProjectionType': 'ALL'}
+    }
+
+
+# Esquema das tabelas como está na AWS (chaves e GSIs)
+TABELAS = [
+    {
+        'TableName': 'mini-banco-contas',
+        'AttributeDefinitions': [_s('conta_id'), _s('user_id'), _s('fragmentada')],
+        'KeySchema': [{'AttributeName': 'conta_id', 'KeyType': 'HASH'}],
+        'GlobalSecondaryIndexes': [_gsi('user_id-index', 'user_id'), _gsi('fragmentada-index', 'fragmentada')]
+    },
+    {
+        'TableName': 'mini-banco-transacoes',
+        'AttributeDefinitions': [_s('conta_id'), _s('transacao_id')],
+        'KeySchema': [
+            {'AttributeName': 'conta_id', 'KeyType': 'HASH'},
+            {'AttributeName': 'transacao_id', 'KeyType': 'RANGE'}
+        ]
+    },
+    {
+        'TableName': 'mini-banco-pix-keys',
+        'AttributeDefinitions': [_s('chave_valor'), _s('conta_id')],
+        'KeySchema': [{'AttributeName': 'chave_valor', 'KeyType': 'HASH'}],
+        'GlobalSecondaryIndexes': [_gsi('conta_id-index', 'conta_id')]
+    },
+    {
+        'TableName': 'mini-banco-idempotencia',
+        'AttributeDefinitions': [_s('chave')],
+        'KeySchema': [{'AttributeName': 'chave', 'KeyType': 'HASH'}]
+    },
+    {
+        'TableName': 'mini-banco-limites',
+        'AttributeDefinitions': [_s('chave')],
+        'KeySchema': [{'AttributeName': 'chave', 'KeyType': 'HASH'}]
+    },
+    {
+        'TableName': 'mini-banco-agendamentos',
+        'AttributeDefinitions': [_s('balde'), _s('agendamento_id'), _s('conta_id')],
+        'KeySchema': [
+            {'AttributeName': 'balde', 'KeyType': 'HASH'},
+            {'AttributeName': 'agendamento_id', 'KeyType': 'RANGE'}
+        ],
+        'GlobalSecondaryIndexes': [_gsi('conta_id-index', 'conta_id')]
+    },
+]
+
+
+def _serializar_moto():
+    """O moto não é thread-safe: as chamadas ao backend simulado passam uma de cada vez.
+
+    A espera de rede/partição modelada pelos benchmarks fica fora desta trava.
+    """
+    from moto.core.botocore_stubber import BotocoreStubber
+    if getattr(BotocoreStubber, '_serializado', False):
+        return
+    original = BotocoreStubber.__call__
+    trava = threading.RLock()
+
+    def chamar(self, *args, **kwargs):
+        with trava:
+            return original(self, *args, **kwargs)
+
+    BotocoreStubber.__call__ = chamar
+    BotocoreStubber._serializado = True
+
+
+def transacoes_leves():
+    """Para desfazer uma TransactWriteItems cancelada, o moto copia inteiras as
+    tabelas que ela toca: com milhares de itens a cópia domina o benchmark.
+    Aqui a cópia é só dos itens tocados, e só eles voltam no cancelamento."""
+    import copy
+    import types
+    from moto.dynamodb import models
+    from moto.dynamodb.models.table import Table
+    if getattr(models.DynamoDBBackend, '_transacoes_leves', False):
+        return
+    # Com a tabela "copiada" por referência, o rollback do moto não desfaz nada...
+    models.copy = types.SimpleNamespace(
+        deepcopy=lambda obj, memo=None: obj if isinstance(obj, Table) else copy.deepcopy(obj, memo)
+    )
+    original = models.DynamoDBBackend.transact_write_items
+
+    def transacao(self, transact_items):
+        copias = []
+        for item in transact_items:
+            op = next(iter(item.values()))
+            tabela = self.tables.get(op.get('TableName'))
+            if tabela is None:
+                continue
+            chave = op.get('Key') or {
+                nome: op['Item'][nome] for nome in (tabela.hash_key_attr, tabela.range_key_attr) if nome
+            }
+            copias.append((op['TableName'], chave, copy.deepcopy(self.get_item(op['TableName'], chave))))
+        try:
+            return original(self, transact_items)
+        except Exception:
+            # ...quem desfaz é esta cópia dos itens
+            for nome, chave, anterior in copias:
+                if anterior is None:
+                    self.delete_item(nome, chave)
+                else:
+                    self.put_item(nome, anterior.to_json()['Attributes'])
+            raise
+
+    models.DynamoDBBackend.transact_write_items = transacao
+    models.DynamoDBBackend._transacoes_leves = True
+
+
+@contextlib.contextmanager
+def banco_local():
+    """Cria as tabelas no moto e devolve o módulo lambda_function recém-importado."""
+    import boto3
+    from moto import mock_aws
+
+    _serializar_moto()
+    with mock_aws():
+        cliente = boto3.client('dynamodb')
+        for tabela in TABELAS:
+            cliente.create_table(BillingMode='PAY_PER_REQUEST', **tabela)
+        sys.modules.pop('lambda_function', None)
+        import lambda_function
+        yield lambda_function
+
+
+def cronometrar(funcao, repeticoes):
+    """Executa funcao() repeticoes vezes e devolve as durações em segundos."""
+    amostras = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        amostras.append(time.perf_counter() - inicio)
+    return amostras
+
+
+def percentil(amostras, p):
+    ordenadas = sorted(amostras)
+    indice = min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))
+    return ordenadas[indice]
+
+
+def resumo(amostras):
+    """p50/p95/p99 em milissegundos."""
+    return {f'p{p}': round(percentil(amostras, p) * 1000, 3) for p in (50, 95, 99)}
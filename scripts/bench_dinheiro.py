@@ -0,0 +1,75 @@
+"""
+🧪 Benchmark — Dinheiro (centavos inteiros) × caminho Decimal/float
+====================================================================
+Compara, por operação, o caminho antigo dos valores nos handlers com a
+classe Dinheiro:
+  • entrada: validar (float(valor) <= 0), converter (Decimal(str(valor)))
+    e formatar a mensagem (f'{float(valor):.2f}'), para valores int,
+    float e str como chegam no JSON;
+  • resposta: json.dumps de um corpo com valor e saldo;
+  • extrato: converter o valor Decimal de cada lançamento lido do DynamoDB.
+
+Uso: python scripts/bench_dinheiro.py [--repeticoes N]
+"""
+
+import argparse
+import json
+import time
+from decimal import Decimal
+
+import bench_comum  # noqa: F401 — coloca backend/ no sys.path
+import lambda_function as lf
+
+ENTRADAS = {'int': 150, 'float': 1234.5, 'str': '87.90'}
+
+
+def entrada_antiga(valor):
+    if not valor or float(valor) <= 0:
+        raise ValueError
+    valor = Decimal(str(valor))
+    return valor, f'Depósito de R$ {float(valor):.2f} realizado! 💰'
+
+
+def entrada_nova(valor):
+    valor = lf.Dinheiro.positivo(valor)
+    return valor, f'Depósito de R$ {valor} realizado! 💰'
+
+
+def medir(funcao, argumentos, repeticoes):
+    """Operações por segundo de funcao(arg) sobre a lista de argumentos."""
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        for argumento in argumentos:
+            funcao(argumento)
+    return repeticoes * len(argumentos) / (time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticoes', type=int, default=100_000)
+    args = parser.parse_args()
+
+    saldo = Decimal('10452.37')
+    lancamentos = [Decimal(v) / 100 for v in range(1, 1001)]
+    casos = {f'entrada {tipo}': (entrada_antiga, entrada_nova, [valor]) for tipo, valor in ENTRADAS.items()}
+    casos['json da resposta'] = (
+        lambda v: json.dumps({'valor': v, 'saldo_atual': float(saldo)}, default=lf._json_padrao),
+        lambda v: json.dumps({'valor': v, 'saldo_atual': lf.Dinheiro.do_dynamo(saldo)}, default=lf._json_padrao),
+        [None]
+    )
+    casos['lançamento do extrato'] = (float, lf.Dinheiro.do_dynamo, lancamentos)
+
+    print(f'{"operação":<24} | {"Decimal/float":>14} | {"Dinheiro":>14} | {"razão":>6}')
+    for nome, (antigo, novo, argumentos) in casos.items():
+        if nome == 'json da resposta':
+            argumentos_antigos, argumentos_novos = [Decimal('87.90')], [lf.Dinheiro(8790)]
+        else:
+            argumentos_antigos = argumentos_novos = argumentos
+        repeticoes = max(1, args.repeticoes // len(argumentos))
+        ops_antigo = medir(antigo, argumentos_antigos, repeticoes)
+        ops_novo = medir(novo, argumentos_novos, repeticoes)
+        print(f'{nome:<24} | {ops_antigo:>10,.0f} op/s | {ops_novo:>10,.0f} op/s | {ops_novo / ops_antigo:>5.2f}x')
+
+
+if __name__ == '__main__':
+    main()
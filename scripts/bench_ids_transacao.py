@@ -0,0 +1,59 @@
+"""
+🧪 Benchmark — geração de transacao_id
+=======================================
+Compara o formato antigo (timestamp ISO + '#' + 4 hex de uuid4) com o
+ULID de montar_transacao: ids/s numa thread e em várias, colisões numa
+rajada e se a ordem de geração bate com a ordem lexicográfica.
+
+Uso: python scripts/bench_ids_transacao.py [--ids N] [--threads T]
+"""
+
+import argparse
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import bench_comum  # noqa: F401 — coloca backend/ no sys.path
+import lambda_function as lf
+
+
+def id_legado():
+    return datetime.now(timezone.utc).isoformat() + '#' + str(uuid.uuid4())[:4]
+
+
+def medir(gerar, ids, threads):
+    """Gera `ids` ids divididos entre `threads`; devolve (ids/s, lista por thread)."""
+    por_thread = ids // threads
+
+    def lote(_):
+        return [gerar() for _ in range(por_thread)]
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        listas = list(executor.map(lote, range(threads)))
+    return por_thread * threads / (time.perf_counter() - inicio), listas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ids', type=int, default=200_000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    gerador = lf.GeradorULID()
+    formatos = [('legado', id_legado), ('ulid', gerador.gerar)]
+
+    print(f'{"formato":>8} | {"threads":>7} | {"ids/s":>10} | {"colisões":>8} | {"ordenado":>8} | {"tamanho":>7}')
+    for nome, gerar in formatos:
+        for threads in (1, args.threads):
+            vazao, listas = medir(gerar, args.ids, threads)
+            todos = [i for lista in listas for i in lista]
+            colisoes = len(todos) - len(set(todos))
+            ordenado = all(lista == sorted(lista) for lista in listas)
+            print(f'{nome:>8} | {threads:>7} | {vazao:>10,.0f} | {colisoes:>8} | '
+                  f'{"sim" if ordenado else "não":>8} | {len(todos[0]):>7}')
+
+
+if __name__ == '__main__':
+    main()
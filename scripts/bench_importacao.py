@@ -0,0 +1,84 @@
+"""
+🧪 Benchmark — importação em lote × POST /contas um a um
+=========================================================
+Cria --clientes contas de duas formas, cada uma num banco limpo:
+  • POST /contas por cliente, em sequência (como um script de migração
+    chamando a API faria);
+  • a tarefa importar_contas lendo um CSV com os mesmos clientes.
+
+O moto responde em microssegundos, então o benchmark modela a ida e
+volta ao DynamoDB como bench_leituras_paralelas (--latencia ms por
+chamada). Mostra contas/s, chamadas ao DynamoDB e a estimativa para um
+milhão de clientes.
+
+Uso: python scripts/bench_importacao.py [--clientes N] [--latencia MS] [--bloco B]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+
+ESTADO = tempfile.mkdtemp(prefix='importacao-')
+os.environ['IMPORTACAO_ESTADO'] = os.path.join(ESTADO, 'estado.json')
+
+from bench_comum import banco_local  # noqa: E402
+from bench_leituras_paralelas import modelar_latencia  # noqa: E402
+
+
+def contar_chamadas(lf):
+    chamadas = []
+    lf.dynamodb.meta.client.meta.events.register(
+        'provide-client-params.dynamodb.*', lambda **kwargs: chamadas.append(1)
+    )
+    return chamadas
+
+
+def pela_api(lf, clientes):
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i, cpf in enumerate(clientes):
+            evento = {'path': '/contas', 'httpMethod': 'POST', 'headers': {'X-User-Id': f'api-{i}'},
+                      'body': json.dumps({'nome': f'Cliente {i}', 'cpf': cpf})}
+            retorno = lf.lambda_handler(evento, None)
+            assert retorno['statusCode'] == 201, retorno
+
+
+def pela_tarefa(lf, clientes, bloco):
+    origem = os.path.join(ESTADO, 'clientes.csv')
+    with open(origem, 'w') as arquivo:
+        arquivo.write('nome,cpf\n')
+        arquivo.writelines(f'Cliente {i},{cpf}\n' for i, cpf in enumerate(clientes))
+    evento = {'tarefa': 'importar_contas', 'origem': origem, 'bloco': bloco, 'reiniciar': True}
+    with contextlib.redirect_stdout(io.StringIO()):
+        resultado = lf.lambda_handler(evento, None)
+    assert resultado['criadas'] == len(clientes), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clientes', type=int, default=2000)
+    parser.add_argument('--latencia', type=float, default=5.0)
+    parser.add_argument('--bloco', type=int, default=1000)
+    args = parser.parse_args()
+
+    clientes = [f'{i:011d}' for i in range(1, args.clientes + 1)]
+    print(f'{"modo":<18} | {"segundos":>9} | {"contas/s":>9} | {"chamadas":>9} | {"1M clientes":>12}')
+    for modo in ('POST /contas', 'importar_contas'):
+        with banco_local() as lf:
+            modelar_latencia(lf, args.latencia)
+            chamadas = contar_chamadas(lf)
+            inicio = time.perf_counter()
+            if modo == 'POST /contas':
+                pela_api(lf, clientes)
+            else:
+                pela_tarefa(lf, clientes, args.bloco)
+            duracao = time.perf_counter() - inicio
+        taxa = args.clientes / duracao
+        print(f'{modo:<18} | {duracao:>9.2f} | {taxa:>9,.0f} | {len(chamadas):>9,} | {1_000_000 / taxa / 3600:>10.1f} h')
+
+
+if __name__ == '__main__':
+    main()
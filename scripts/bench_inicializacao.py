@@ -0,0 +1,92 @@
+"""
+🧪 Benchmark — tempo de inicialização (cold start) do módulo
+=============================================================
+Importa backend/lambda_function.py em processos Python novos e mede:
+  - o tempo do import (o que o Lambda paga na fase de init);
+  - a criação preguiçosa do resource/tabelas no primeiro uso;
+  - os módulos mais caros segundo `python -X importtime`.
+
+Com --limite-ms, termina com erro se a mediana do import passar do limite
+(para usar como verificação no CI).
+
+Uso: python scripts/bench_inicializacao.py [--rodadas N] [--limite-ms MS]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND = os.path.join(RAIZ, 'backend')
+
+MEDICAO = '''
+import time
+inicio = time.perf_counter()
+import lambda_function as lf
+importado = time.perf_counter()
+lf.accounts_table.name, lf.transactions_table.name, lf.pix_keys_table.name
+pronto = time.perf_counter()
+print(importado - inicio, pronto - importado)
+'''
+
+
+def _ambiente():
+    ambiente = dict(os.environ)
+    ambiente.setdefault('AWS_DEFAULT_REGION', 'us-east-2')
+    ambiente.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+    ambiente.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+    return ambiente
+
+
+def medir_rodada():
+    saida = subprocess.run(
+        [sys.executable, '-c', MEDICAO], cwd=BACKEND, env=_ambiente(),
+        capture_output=True, text=True, check=True
+    )
+    importacao, primeiro_uso = saida.stdout.split()
+    return float(importacao), float(primeiro_uso)
+
+
+def perfil_importacao(top):
+    """Módulos com maior tempo acumulado de import (µs), via -X importtime."""
+    saida = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import lambda_function'],
+        cwd=BACKEND, env=_ambiente(), capture_output=True, text=True, check=True
+    )
+    linhas = []
+    for linha in saida.stderr.splitlines():
+        if not linha.startswith('import time:') or 'cumulative' in linha:
+            continue
+        _, acumulado, modulo = linha[len('import time:'):].split('|')
+        # Só os imports diretos do lambda_function (um nível abaixo dele)
+        if modulo.startswith('   ') and not modulo.startswith('     '):
+            linhas.append((int(acumulado), modulo.strip()))
+    return sorted(linhas, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rodadas', type=int, default=10)
+    parser.add_argument('--limite-ms', type=float)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    rodadas = [medir_rodada() for _ in range(args.rodadas)]
+    importacao = statistics.median(r[0] for r in rodadas) * 1000
+    primeiro_uso = statistics.median(r[1] for r in rodadas) * 1000
+    print(f'import do módulo (mediana de {args.rodadas}): {importacao:8.1f} ms')
+    print(f'primeiro uso das tabelas (mediana):       {primeiro_uso:8.1f} ms')
+
+    print('\nImports diretos mais caros (acumulado):')
+    for acumulado, modulo in perfil_importacao(args.top):
+        print(f'  {acumulado / 1000:8.1f} ms  {modulo}')
+
+    if args.limite_ms is not None and importacao > args.limite_ms:
+        print(f'\n❌ import acima do limite de {args.limite_ms:.0f} ms')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+🧪 Benchmark — verificação de JWT do Cognito
+=============================================
+Gera chaves RSA locais, publica um JWKS num arquivo (file://) e assina
+tokens no formato do Cognito. Primeiro confere os casos que precisam ser
+recusados (assinatura adulterada, expirado, emissor/público errados,
+alg diferente de RS256, kid desconhecido) e a troca de chave com recarga
+do JWKS; depois mede verificações/s sem cache e com o cache de claims.
+
+Requer: pip install cryptography (só para gerar e assinar as chaves)
+
+Uso: python scripts/bench_jwt.py [verificações]
+"""
+
+import base64
+import json
+import os
+import sys
+import tempfile
+import time
+import timeit
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+EMISSOR = 'https://cognito-idp.us-east-2.amazonaws.com/us-east-2_bench'
+CLIENT_ID = 'bench-client'
+JWKS = os.path.join(tempfile.mkdtemp(), 'jwks.json')
+
+os.environ.update({
+    'JWT_EMISSOR': EMISSOR, 'COGNITO_CLIENT_ID': CLIENT_ID,
+    'JWKS_URL': 'file://' + JWKS, 'JWKS_RECARGA_MIN': '0'
+})
+
+import bench_comum  # noqa: E402,F401 — coloca backend/ no sys.path
+import lambda_function as lf  # noqa: E402
+
+
+def b64url(dados):
+    return base64.urlsafe_b64encode(dados).rstrip(b'=').decode()
+
+
+def publicar_jwks(chaves):
+    with open(JWKS, 'w') as arquivo:
+        json.dump({'keys': [{
+            'kty': 'RSA', 'alg': 'RS256', 'use': 'sig', 'kid': kid,
+            'n': b64url(chave.public_key().public_numbers().n.to_bytes(256, 'big')),
+            'e': b64url(chave.public_key().public_numbers().e.to_bytes(3, 'big'))
+        } for kid, chave in chaves.items()]}, arquivo)
+
+
+def assinar(chave, kid, alg='RS256', **claims):
+    payload = {
+        'sub': 'user-bench', 'iss': EMISSOR, 'aud': CLIENT_ID, 'token_use': 'id',
+        'exp': int(time.time()) + 3600, 'iat': int(time.time()), **claims
+    }
+    cabecalho = b64url(json.dumps({'alg': alg, 'kid': kid}).encode())
+    corpo = b64url(json.dumps(payload).encode())
+    assinatura = chave.sign(f'{cabecalho}.{corpo}'.encode(), padding.PKCS1v15(), hashes.SHA256())
+    return f'{cabecalho}.{corpo}.{b64url(assinatura)}'
+
+
+def recusado(token):
+    try:
+        lf.verificar_jwt(token)
+    except lf.TokenInvalido:
+        return True
+    return False
+
+
+def conferir(chave):
+    valido = assinar(chave, 'k1')
+    cabecalho, corpo, assinatura = valido.split('.')
+    adulterado = f'{cabecalho}.{b64url(json.dumps({"sub": "outro", "iss": EMISSOR, "aud": CLIENT_ID, "exp": 2**40}).encode())}.{assinatura}'
+    casos = {
+        'válido aceito': not recusado(valido),
+        'access token (client_id) aceito': not recusado(assinar(chave, 'k1', token_use='access', aud=None, client_id=CLIENT_ID)),
+        'payload adulterado recusado': recusado(adulterado),
+        'expirado recusado': recusado(assinar(chave, 'k1', exp=int(time.time()) - 120)),
+        'emissor errado recusado': recusado(assinar(chave, 'k1', iss='https://outro')),
+        'público errado recusado': recusado(assinar(chave, 'k1', aud='outro-client')),
+        'alg HS256 recusado': recusado(assinar(chave, 'k1', alg='HS256')),
+        'kid desconhecido recusado': recusado(assinar(chave, 'k9')),
+        'malformado recusado': recusado('abc.def'),
+    }
+    # Rotação: chave nova publicada depois do primeiro carregamento do JWKS
+    nova = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    publicar_jwks({'k1': chave, 'k2': nova})
+    casos['kid novo aceito após recarga do JWKS'] = not recusado(assinar(nova, 'k2'))
+    evento = {'headers': {'Authorization': 'Bearer ' + valido}}
+    casos['extrair_user_id com Bearer'] = lf.extrair_user_id(evento) == 'user-bench'
+    return casos
+
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    chave = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    publicar_jwks({'k1': chave})
+
+    casos = conferir(chave)
+    for nome, ok in casos.items():
+        print(f'{"✅" if ok else "❌"} {nome}')
+
+    token = assinar(chave, 'k1')
+
+    def sem_cache():
+        lf._cache_tokens.remover(lf.hashlib.sha256(token.encode()).digest())
+        lf.verificar_jwt(token)
+
+    frio = min(timeit.repeat(sem_cache, number=repeticoes, repeat=3)) / repeticoes
+    quente = min(timeit.repeat(lambda: lf.verificar_jwt(token), number=repeticoes * 10, repeat=3)) / (repeticoes * 10)
+    print(f'\n{"caso":<32} | {"verificações/s":>14} | {"µs":>8}')
+    print(f'{"RS256 completo (sem cache)":<32} | {1 / frio:>14,.0f} | {frio * 1e6:>8.1f}')
+    print(f'{"claims em cache":<32} | {1 / quente:>14,.0f} | {quente * 1e6:>8.1f}')
+    if not all(casos.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+🧪 Benchmark — leituras independentes em paralelo dentro dos handlers
+======================================================================
+Compara minha-conta, pix/enviar e transferir (legado) fazendo as leituras
+em sequência (como era) e com em_paralelo/BatchGetItem. Os caches de
+conta e de chave PIX são limpos antes de cada requisição: é o caso em
+que as leituras vão mesmo ao banco.
+
+O moto responde em microssegundos, então o benchmark modela a ida e
+volta ao DynamoDB: cada chamada espera --latencia ms antes de chegar ao
+moto (fora da trava que serializa o moto, como a rede de verdade).
+
+Uso: python scripts/bench_leituras_paralelas.py [--requisicoes N] [--latencia MS]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import time
+
+from bench_comum import banco_local, cronometrar, resumo
+
+
+def modelar_latencia(lf, latencia_ms):
+    def esperar(**kwargs):
+        time.sleep(latencia_ms / 1000)
+
+    lf.dynamodb.meta.client.meta.events.register('provide-client-params.dynamodb.*', esperar)
+
+
+def evento(metodo, caminho, user_id, corpo=None):
+    return {
+        'path': caminho, 'resource': caminho, 'httpMethod': metodo,
+        'headers': {'X-User-Id': user_id, 'Content-Type': 'application/json'},
+        'body': json.dumps(corpo) if corpo is not None else None
+    }
+
+
+def chamar(lf, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        retorno = lf.lambda_handler(evento(*args, **kwargs), None)
+    assert retorno['statusCode'] in (200, 201), retorno
+    return json.loads(retorno['body'])
+
+
+def sequencial(lf):
+    """Restaura o comportamento anterior: uma leitura depois da outra, GetItem por conta."""
+    lf.em_paralelo = lambda *chamadas: [chamada() for chamada in chamadas]
+    lf.buscar_contas = lambda ids: {c['conta_id']: c for c in map(lf.buscar_conta, ids) if c}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requisicoes', type=int, default=50)
+    parser.add_argument('--latencia', type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f'{"rota":<18} | {"modo":<10} | {"p50 ms":>8} | {"p95 ms":>8}')
+    for modo in ('sequencial', 'paralelo'):
+        with banco_local() as lf:
+            if modo == 'sequencial':
+                sequencial(lf)
+            origem = chamar(lf, 'POST', '/contas', 'bench-origem', {'nome': 'Origem', 'cpf': '11111111111'})['conta_id']
+            destino = chamar(lf, 'POST', '/contas', 'bench-destino', {'nome': 'Destino', 'cpf': '22222222222'})['conta_id']
+            chamar(lf, 'POST', '/depositar', 'bench-origem', {'valor': 1_000_000})
+            modelar_latencia(lf, args.latencia)
+
+            def sem_cache():
+                lf._cache_contas.remover('bench-origem')
+                lf._cache_chaves_pix.remover('22222222222')
+
+            casos = {
+                'GET /minha-conta': lambda: (sem_cache(), chamar(lf, 'GET', '/minha-conta', 'bench-origem')),
+                'POST /pix/enviar': lambda: (sem_cache(), chamar(
+                    lf, 'POST', '/pix/enviar', 'bench-origem', {'chave': '22222222222', 'valor': 1})),
+                'POST /transferir': lambda: chamar(lf, 'POST', '/transferir', 'bench-origem', {
+                    'conta_origem': origem, 'conta_destino': destino, 'valor': 1}),
+            }
+            for rota, caso in casos.items():
+                r = resumo(cronometrar(caso, args.requisicoes))
+                print(f'{rota:<18} | {modo:<10} | {r["p50"]:>8.1f} | {r["p95"]:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
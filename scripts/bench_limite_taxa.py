@@ -0,0 +1,74 @@
+"""
+🧪 Benchmark — custo do limite de taxa
+=======================================
+Mede o middleware de limite isolado e o que ele acrescenta ao handler:
+
+- balde local: só o balde de tokens do container (LIMITE_COMPARTILHADO=0);
+- compartilhado: balde + reserva no contador por minuto (moto), mostrando
+  quantas idas à tabela de limites cada 1000 requisições custam;
+- recusa: requisições já negadas, que voltam 429 sem tocar em tabela.
+
+Uso: python scripts/bench_limite_taxa.py [requisições]
+"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+import timeit
+
+os.environ['LIMITES_TAXA'] = json.dumps({'bench': [1e6, 1e6, False], 'recusa': [1e-9, 1, False]})
+
+from bench_comum import banco_local  # noqa: E402
+
+
+def medir(funcao, repeticoes):
+    tempos = timeit.repeat(funcao, number=repeticoes, repeat=5)
+    return min(tempos) / repeticoes * 1e6
+
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    with banco_local() as lf:
+        chamadas = []
+        lf.dynamodb.meta.client.meta.events.register(
+            'provide-client-params.dynamodb.UpdateItem', lambda **kwargs: chamadas.append(1)
+        )
+
+        lf.LIMITE_COMPARTILHADO = False
+        local = medir(lambda: lf.verificar_limite('bench', 'u1'), repeticoes)
+
+        lf.LIMITE_COMPARTILHADO = True
+        chamadas.clear()
+        compartilhado = medir(lambda: lf.verificar_limite('bench', 'u2'), repeticoes)
+        idas = len(chamadas)
+
+        lf.verificar_limite('recusa', 'u3')
+        recusa = medir(lambda: lf.verificar_limite('recusa', 'u3'), repeticoes)
+
+        evento = {'httpMethod': 'GET', 'path': '/pix/chaves', 'headers': {'X-User-Id': 'u4'}}
+        sem_rota = lf.Rota('GET', '/x', lf.AUTENTICADA, lambda event, ctx: None)
+        com_rota = lf.Rota('GET', '/x', lf.AUTENTICADA + lf.limite('bench'), lambda event, ctx: None)
+
+        def middlewares(rota):
+            ctx = {}
+            for middleware in rota.middlewares:
+                middleware(evento, ctx)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            base = medir(lambda: middlewares(sem_rota), repeticoes)
+            limitado = medir(lambda: middlewares(com_rota), repeticoes)
+
+    print(f'{"caso":<34} | {"µs/req":>8}')
+    print(f'{"balde local":<34} | {local:>8.2f}')
+    print(f'{"balde + contador compartilhado":<34} | {compartilhado:>8.2f}')
+    print(f'{"recusa (429 sem tabela)":<34} | {recusa:>8.2f}')
+    print(f'{"middlewares sem limite":<34} | {base:>8.2f}')
+    print(f'{"middlewares com limite":<34} | {limitado:>8.2f}')
+    print(f'\nUpdateItem na tabela de limites: {idas} em {repeticoes * 5} requisições '
+          f'(cada reserva leva {lf.LIMITE_FRACAO_RESERVA:.0%} do orçamento do minuto)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+🧪 Benchmark — limites de débito (baldes na conta) sob disputa
+===============================================================
+Duas medidas:
+  • custo: p50/p95 de POST /sacar com e sem os limites na escrita do
+    débito, e quanto custaria somar o extrato das últimas 24 h a cada
+    débito (Query na tabela de transações) para uma conta com
+    --lancamentos lançamentos no dia;
+  • disputa: --threads threads disparando saques e, depois, PIX da
+    mesma conta, com limite diário de --limite reais. Confere que o total
+    debitado não passa do limite, que os baldes somam exatamente o que
+    saiu e conta recusas por limite, por saldo e conflitos (409). O PIX
+    roda também sem limites: os 409 vêm da condição otimista do saldo
+    no motor de transferência, não dos baldes.
+
+Latência modelada por chamada ao DynamoDB como em bench_leituras_paralelas
+(--latencia ms), fora da trava do moto: as escritas concorrentes se
+cruzam como no banco de verdade.
+
+Uso: python scripts/bench_limites_debito.py [--threads T] [--debitos N] [--limite R$] [--latencia MS]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import time
+from collections import Counter
+from decimal import Decimal
+
+from bench_comum import banco_local, cronometrar, resumo
+from bench_leituras_paralelas import modelar_latencia
+
+
+def chamar(lf, metodo, caminho, user_id, corpo=None):
+    evento = {'path': caminho, 'httpMethod': metodo, 'headers': {'X-User-Id': user_id},
+              'body': json.dumps(corpo) if corpo is not None else None}
+    with contextlib.redirect_stdout(io.StringIO()):
+        retorno = lf.lambda_handler(evento, None)
+    return retorno['statusCode'], json.loads(retorno['body'])
+
+
+def somar_extrato_do_dia(lf, conta_id):
+    """O que os limites custariam sem os baldes: somar os débitos das últimas 24 h."""
+    inicio = lf.limite_ulid(int((time.time() - 86400) * 1000))
+    return sum(
+        t['valor'] for t in lf.iterar_transacoes(lf._condicao_faixa(conta_id, inicio))
+        if t['tipo'] in ('SAQUE', 'PIX_ENVIADO')
+    )
+
+
+def medir_custo(args):
+    with banco_local() as lf:
+        chamar(lf, 'POST', '/contas', 'bench-custo', {'nome': 'Custo', 'cpf': '33333333333'})
+        chamar(lf, 'POST', '/depositar', 'bench-custo', {'valor': 1_000_000})
+        conta_id = lf.resolver_conta_id('bench-custo')
+        lf.accounts_table.update_item(Key={'conta_id': conta_id}, UpdateExpression='SET limite_diario = :l',
+                                      ExpressionAttributeValues={':l': Decimal(10 ** 9)})
+        lf.gravar_em_lote(lf.TRANSACTIONS_TABLE, [
+            lf.montar_transacao(conta_id, 'SAQUE', Decimal(1), 'histórico') for _ in range(args.lancamentos)
+        ])
+        modelar_latencia(lf, args.latencia)
+
+        def sacar():
+            status, corpo = chamar(lf, 'POST', '/sacar', 'bench-custo', {'valor': 1})
+            assert status == 200, corpo
+
+        com_limites = resumo(cronometrar(sacar, args.repeticoes))
+        escrita_debito = lf.escrita_debito
+        lf.escrita_debito = lambda conta, valor, debito, instante=None: debito
+        sem_limites = resumo(cronometrar(sacar, args.repeticoes))
+        lf.escrita_debito = escrita_debito
+        soma = resumo(cronometrar(lambda: somar_extrato_do_dia(lf, conta_id), max(1, args.repeticoes // 5)))
+
+    print(f'{"débito":<34} | {"p50 ms":>8} | {"p95 ms":>8}')
+    print(f'{"sacar sem limites":<34} | {sem_limites["p50"]:>8.1f} | {sem_limites["p95"]:>8.1f}')
+    print(f'{"sacar com baldes na escrita":<34} | {com_limites["p50"]:>8.1f} | {com_limites["p95"]:>8.1f}')
+    rotulo = f'+ somar 24 h ({args.lancamentos} lançamentos)'
+    print(f'{rotulo:<34} | {soma["p50"]:>8.1f} | {soma["p95"]:>8.1f}\n')
+
+
+def medir_disputa(args, caminho, corpo, limitar=True):
+    with banco_local() as lf:
+        chamar(lf, 'POST', '/contas', 'bench-origem', {'nome': 'Origem', 'cpf': '11111111111'})
+        chamar(lf, 'POST', '/contas', 'bench-destino', {'nome': 'Destino', 'cpf': '22222222222'})
+        chamar(lf, 'POST', '/depositar', 'bench-origem', {'valor': 1_000_000})
+        conta_id = lf.resolver_conta_id('bench-origem')
+        limite = Decimal(args.limite)
+        lf.accounts_table.update_item(Key={'conta_id': conta_id},
+                                      UpdateExpression='SET limite_diario = :l, limite_noturno = :l',
+                                      ExpressionAttributeValues={':l': limite})
+        if not limitar:
+            lf.escrita_debito = lambda conta, valor, debito, instante=None: debito
+        saldo_antes = lf.buscar_conta(conta_id)['saldo']
+        modelar_latencia(lf, args.latencia)
+
+        def debitar(i):
+            evento = {'path': caminho, 'httpMethod': 'POST', 'headers': {'X-User-Id': 'bench-origem'},
+                      'body': json.dumps(corpo)}
+            inicio = time.perf_counter()
+            retorno = lf.lambda_handler(evento, None)
+            return retorno['statusCode'], json.loads(retorno['body']).get('erro', ''), time.perf_counter() - inicio
+
+        # redirect_stdout troca o sys.stdout do processo: um só em volta das threads
+        with contextlib.redirect_stdout(io.StringIO()):
+            resultados = lf.executar_em_paralelo(debitar, range(args.debitos), args.threads)
+        conta = lf.buscar_conta(conta_id)
+
+    debitado = saldo_antes - conta['saldo']
+    baldes = sum((v for k, v in conta.items() if k.startswith('lim_d')), Decimal('0'))
+    motivos = Counter(
+        'ok' if status == 200 else 'limite' if 'Limite' in erro else 'saldo' if 'Saldo' in erro else str(status)
+        for status, erro, _ in resultados
+    )
+    latencias = resumo([duracao for _, _, duracao in resultados])
+    modo = '' if limitar else ' (sem limites)'
+    print(f'{args.debitos} × {caminho} de R$ {args.valor} em {args.threads} threads, limite R$ {limite}{modo}')
+    print(f'  resultados: {dict(motivos)}')
+    if limitar:
+        print(f'  debitado R$ {debitado} | baldes R$ {baldes} | dentro do limite: {debitado <= limite} | '
+              f'baldes = débitos: {baldes == debitado}')
+    print(f'  latência p50 {latencias["p50"]:.1f} ms, p95 {latencias["p95"]:.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--debitos', type=int, default=200)
+    parser.add_argument('--valor', type=int, default=10)
+    parser.add_argument('--limite', type=int, default=1000)
+    parser.add_argument('--lancamentos', type=int, default=300)
+    parser.add_argument('--repeticoes', type=int, default=50)
+    parser.add_argument('--latencia', type=float, default=5.0)
+    args = parser.parse_args()
+
+    medir_custo(args)
+    medir_disputa(args, '/sacar', {'valor': args.valor})
+    pix = {'chave': '22222222222', 'valor': args.valor}
+    medir_disputa(args, '/pix/enviar', pix)
+    medir_disputa(args, '/pix/enviar', pix, limitar=False)
+
+
+if __name__ == '__main__':
+    main()
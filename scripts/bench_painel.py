@@ -0,0 +1,78 @@
+"""
+🧪 Benchmark — abertura do app: três rotas × /painel
+=====================================================
+Reproduz o que o frontend faz depois do login:
+  • antes: GET /minha-conta e, com a resposta, GET /extrato e
+    GET /pix/chaves ao mesmo tempo (três invocações);
+  • agora: um GET /painel.
+
+O cache de user_id → conta é limpo antes de cada abertura (o caso do
+container frio ou de outra instância). Latência modelada por chamada ao
+DynamoDB como em bench_leituras_paralelas (--latencia ms). Mostra
+invocações, chamadas ao DynamoDB e p50/p95 da abertura completa.
+
+Uso: python scripts/bench_painel.py [--aberturas N] [--latencia MS] [--lancamentos K]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_comum import banco_local, cronometrar, resumo
+from bench_leituras_paralelas import modelar_latencia
+
+
+def chamar(lf, caminho, user_id):
+    evento = {'path': caminho, 'resource': caminho, 'httpMethod': 'GET',
+              'headers': {'X-User-Id': user_id}, 'queryStringParameters': None}
+    with contextlib.redirect_stdout(io.StringIO()):
+        retorno = lf.lambda_handler(evento, None)
+    assert retorno['statusCode'] == 200, retorno
+    return json.loads(retorno['body'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--aberturas', type=int, default=50)
+    parser.add_argument('--latencia', type=float, default=10.0)
+    parser.add_argument('--lancamentos', type=int, default=40)
+    args = parser.parse_args()
+
+    with banco_local() as lf:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for user_id, cpf in (('bench-a', '11111111111'), ('bench-b', '22222222222')):
+                evento = {'path': '/contas', 'httpMethod': 'POST', 'headers': {'X-User-Id': user_id},
+                          'body': json.dumps({'nome': user_id, 'cpf': cpf})}
+                lf.lambda_handler(evento, None)
+            for i in range(args.lancamentos):
+                evento = {'path': '/depositar', 'httpMethod': 'POST', 'headers': {'X-User-Id': 'bench-a'},
+                          'body': json.dumps({'valor': i + 1})}
+                lf.lambda_handler(evento, None)
+        modelar_latencia(lf, args.latencia)
+        chamadas = []
+        lf.dynamodb.meta.client.meta.events.register(
+            'provide-client-params.dynamodb.*', lambda **kwargs: chamadas.append(1)
+        )
+        pool = ThreadPoolExecutor(max_workers=2)
+
+        def tres_rotas():
+            lf._cache_contas.remover('bench-a')
+            chamar(lf, '/minha-conta', 'bench-a')
+            list(pool.map(lambda caminho: chamar(lf, caminho, 'bench-a'), ('/extrato', '/pix/chaves')))
+
+        def painel():
+            lf._cache_contas.remover('bench-a')
+            chamar(lf, '/painel', 'bench-a')
+
+        print(f'{"abertura":<28} | {"invocações":>10} | {"chamadas":>8} | {"p50 ms":>8} | {"p95 ms":>8}')
+        for nome, abertura, invocacoes in (('minha-conta+extrato+chaves', tres_rotas, 3), ('painel', painel, 1)):
+            chamadas.clear()
+            r = resumo(cronometrar(abertura, args.aberturas))
+            print(f'{nome:<28} | {invocacoes:>10} | {len(chamadas) / args.aberturas:>8.1f} | '
+                  f'{r["p50"]:>8.1f} | {r["p95"]:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+🧪 Benchmark — agregação da reconciliação saldo × livro
+========================================================
+Mede a soma por conta_id em centavos inteiros (somar_lancamentos) sobre
+páginas sintéticas no formato que o scan devolve (valores Decimal), com
+cada vez mais lançamentos para o mesmo número de contas: a vazão em
+lançamentos/s e o pico de memória (somas + uma página), que deve
+acompanhar o número de contas e não o de lançamentos.
+
+Uso: python scripts/bench_reconciliacao.py [--contas N] [--lancamentos N ...]
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+from decimal import Decimal
+
+import bench_comum  # noqa: F401 — coloca backend/ no sys.path
+import lambda_function as lf
+
+TIPOS = list(lf.SINAIS_LANCAMENTO)
+
+
+def paginas(contas, lancamentos, tamanho=1000, semente=7):
+    """Páginas do scan geradas sob demanda (só uma em memória por vez)."""
+    sorteio = random.Random(semente)
+    ids = [f'{i:08x}' for i in range(contas)]
+    for inicio in range(0, lancamentos, tamanho):
+        yield [
+            {'conta_id': sorteio.choice(ids), 'tipo': sorteio.choice(TIPOS),
+             'valor': Decimal(sorteio.randint(1, 100_000)) / 100}
+            for _ in range(min(tamanho, lancamentos - inicio))
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--contas', type=int, default=10_000)
+    parser.add_argument('--lancamentos', type=int, nargs='+', default=[100_000, 400_000, 1_600_000])
+    args = parser.parse_args()
+
+    print(f'{"lançamentos":>12} | {"contas":>8} | {"lanç./s":>10} | {"pico":>10}')
+    for lancamentos in args.lancamentos:
+        # Vazão sem tracemalloc (ele deixa a agregação várias vezes mais lenta)
+        somas = {}
+        duracao = 0.0
+        for pagina in paginas(args.contas, lancamentos):
+            inicio = time.perf_counter()
+            lf.somar_lancamentos(pagina, somas, 0, 1)
+            duracao += time.perf_counter() - inicio
+
+        tracemalloc.start()
+        somas = {}
+        for pagina in paginas(args.contas, lancamentos):
+            lf.somar_lancamentos(pagina, somas, 0, 1)
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f'{lancamentos:>12,} | {len(somas):>8,} | {lancamentos / duracao:>10,.0f} | {pico / 2 ** 20:>8.1f} MB')
+
+if __name__ == '__main__':
+    main()
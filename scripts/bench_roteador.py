@@ -0,0 +1,70 @@
+"""
+🧪 Benchmark — custo fixo por requisição no lambda_handler
+===========================================================
+Mede a busca na tabela de rotas e o handler completo numa rota sem
+acesso ao banco (/health), além do json.dumps do evento inteiro que
+era feito antes de despachar, para referência.
+
+Uso: python scripts/bench_roteador.py [repetições]
+"""
+
+import contextlib
+import io
+import json
+import sys
+import timeit
+
+from bench_comum import banco_local
+
+
+def evento_api_gateway(metodo, caminho):
+    """Evento no formato do proxy REST do API Gateway, com headers típicos de navegador."""
+    return {
+        'resource': caminho,
+        'path': caminho,
+        'httpMethod': metodo,
+        'headers': {
+            'Accept': 'application/json', 'Accept-Encoding': 'gzip, deflate, br',
+            'Accept-Language': 'pt-BR,pt;q=0.9', 'Authorization': 'Bearer ' + 'x' * 900,
+            'CloudFront-Forwarded-Proto': 'https', 'CloudFront-Is-Desktop-Viewer': 'true',
+            'Content-Type': 'application/json', 'Host': 'api.exemplo.com',
+            'Origin': 'https://dqkuu9khhhnt5.cloudfront.net', 'User-Agent': 'Mozilla/5.0 ' + 'x' * 100,
+            'Via': '2.0 abc.cloudfront.net (CloudFront)', 'X-Amz-Cf-Id': 'x' * 56,
+            'X-Amzn-Trace-Id': 'Root=1-00000000-000000000000000000000000',
+            'X-Forwarded-For': '200.1.2.3, 130.176.0.1', 'X-Forwarded-Port': '443',
+            'X-Forwarded-Proto': 'https'
+        },
+        'multiValueHeaders': {},
+        'queryStringParameters': None,
+        'pathParameters': None,
+        'stageVariables': None,
+        'requestContext': {
+            'resourcePath': caminho, 'httpMethod': metodo, 'stage': 'dev',
+            'identity': {'sourceIp': '200.1.2.3', 'userAgent': 'Mozilla/5.0'},
+            'requestTimeEpoch': 1760000000000, 'requestId': 'x' * 36
+        },
+        'body': None,
+        'isBase64Encoded': False
+    }
+
+
+def medir(rotulo, funcao, repeticoes):
+    # Os prints do handler não entram na saída do benchmark
+    with contextlib.redirect_stdout(io.StringIO()):
+        total = timeit.timeit(funcao, number=repeticoes)
+    print(f'{rotulo:<42} {total / repeticoes * 1e6:>9.2f} µs')
+
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    with banco_local() as lf:
+        evento = evento_api_gateway('GET', '/health')
+        medir('encontrar_rota (fixa, /pix/enviar)', lambda: lf.encontrar_rota('POST', '/pix/enviar'), repeticoes)
+        medir('encontrar_rota (template, /contas/abc)', lambda: lf.encontrar_rota('GET', '/contas/abc'), repeticoes)
+        medir('encontrar_rota (inexistente)', lambda: lf.encontrar_rota('GET', '/nao/existe'), repeticoes)
+        medir('json.dumps do evento (log antigo)', lambda: json.dumps(evento, default=str), repeticoes)
+        medir('lambda_handler GET /health', lambda: lf.lambda_handler(evento, None), repeticoes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+🧪 Benchmark — vazão de créditos numa conta quente com saldo fragmentado
+=========================================================================
+Dispara créditos PIX concorrentes para uma única conta de lojista e mede
+créditos/s com 1, 2, 4, 8... shards.
+
+O moto não limita escrita por partição, então o benchmark modela esse
+limite: cada item da tabela de contas aceita no máximo --limite-item
+escritas/s (o DynamoDB real aceita ~1000 WCU/s por partição; o padrão
+aqui é bem menor porque o próprio moto processa uma chamada por vez e
+copia a tabela a cada transação — acima de ~4 shards o gargalo passa a
+ser o moto, não a conta). Escritas no mesmo item fazem
+fila; em itens diferentes correm em paralelo. Cada configuração roda
+num banco novo.
+
+Uso: python scripts/bench_saldo_fragmentado.py [--creditos N] [--threads T]
+         [--limite-item W] [--shards 1 2 4 8]
+"""
+
+import argparse
+import contextlib
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from bench_comum import banco_local
+
+
+def limitar_escrita_por_item(lf, limite):
+    """Serializa escritas no mesmo item da tabela de contas a `limite` por segundo."""
+    travas = {}
+    trava_global = threading.Lock()
+    intervalo = 1 / limite
+
+    def ocupar(params, **kwargs):
+        for operacao in params.get('TransactItems', []):
+            update = operacao.get('Update')
+            if update and update['TableName'] == lf.ACCOUNTS_TABLE:
+                chave = update['Key']['conta_id']
+                with trava_global:
+                    trava = travas.setdefault(chave, threading.Lock())
+                with trava:
+                    time.sleep(intervalo)
+
+    lf.dynamodb.meta.client.meta.events.register(
+        'provide-client-params.dynamodb.TransactWriteItems', ocupar
+    )
+
+
+def medir(lf, shards, creditos, threads):
+    conta_id = f'loja-{shards}'
+    lf.accounts_table.put_item(Item={
+        'conta_id': conta_id, 'user_id': conta_id, 'nome': 'Loja', 'saldo': Decimal('0'),
+        'criado_em': '2026-01-01', 'atualizado_em': '2026-01-01'
+    })
+    if shards > 1:
+        lf.fragmentar_saldo(conta_id, shards)
+    # Só a perna de crédito de um PIX (crédito e lançamento): os débitos vêm
+    # de pagadores diferentes e não disputam o item da loja
+    def creditar(_):
+        agora = lf.datetime.now(lf.timezone.utc).isoformat()
+        lf.dynamodb.meta.client.transact_write_items(TransactItems=[
+            lf.operacao_credito(conta_id, Decimal('1'), agora, shards if shards > 1 else 0),
+            {'Put': {
+                'TableName': lf.TRANSACTIONS_TABLE,
+                'Item': lf.montar_transacao(conta_id, 'PIX_RECEBIDO', Decimal('1'), 'PIX de Pagador')
+            }}
+        ])
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(creditar, range(creditos)))
+    duracao = time.perf_counter() - inicio
+
+    conta = lf.buscar_conta(conta_id)
+    total = lf.saldo_total(conta)
+    assert total == creditos, f'saldo {total} != {creditos}'
+    return creditos / duracao
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--creditos', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--limite-item', type=float, default=25)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    base = None
+    print(f'{"shards":>6} | {"créditos/s":>10} | {"ganho":>6}')
+    for shards in args.shards:
+        with banco_local() as lf, contextlib.redirect_stdout(io.StringIO()):
+            limitar_escrita_por_item(lf, args.limite_item)
+            vazao = medir(lf, shards, args.creditos, args.threads)
+        base = base or vazao
+        print(f'{shards:>6} | {vazao:>10.1f} | {vazao / base:>5.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,314 @@
+"""
+🧪 Benchmark — tráfego realista no lambda_handler (gravação e replay)
+=====================================================================
+Gera (com semente fixa) ou reproduz um trace de eventos do API Gateway:
+abertura de conta, depósitos, PIX (buscar + enviar), polling do extrato
+e da minha-conta com If-None-Match. Executa tudo no DynamoDB em memória
+de bench_comum e lê os registros EMF de cada requisição para somar
+chamadas ao DynamoDB, RCU e WCU por rota.
+
+Relatório: vazão total e, por rota, p50/p95/p99 e custo médio por
+requisição. --salvar-base grava esses números; --comparar confere contra
+a base e sai com código 1 se alguma rota piorou (custo com tolerância
+estreita, latência com tolerância larga — moto não é a AWS). Os limites de
+taxa são os de produção, com o contador compartilhado ligado.
+
+Com --url o mesmo trace vai por HTTP a um servidor já rodando
+(backend/servidor.py), como teste de carga: as aberturas de conta
+primeiro, depois os eventos de cada usuário em ordem e os usuários em
+paralelo (--concorrencia). Nesse modo só há latência e vazão — o custo
+no DynamoDB fica nos registros EMF do servidor.
+
+Uso: python scripts/bench_trafego.py [--usuarios N] [--operacoes N] [--semente S]
+         [--gravar trace.jsonl | --reproduzir trace.jsonl]
+         [--salvar-base base.json | --comparar base.json]
+         [--url http://localhost:8080 --concorrencia C]
+"""
+
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+os.environ['METRICAS_AMOSTRAGEM'] = '1.0'
+os.environ.setdefault('AUTH_MODO_TESTE', '1')
+# Limites de taxa de produção, com o contador compartilhado ligado: as reservas
+# dele entram no custo por rota. Só as aberturas de conta, todas do mesmo IP,
+# passam do orçamento público
+os.environ.setdefault('LIMITE_COMPARTILHADO', '1')
+os.environ.setdefault('LIMITES_TAXA', json.dumps({'publica': [1e9, 1e9, False]}))
+
+from bench_comum import banco_local, resumo  # noqa: E402
+
+# Peso de cada tipo de operação depois das aberturas de conta
+MISTURA = [('extrato', 35), ('minha_conta', 25), ('pix', 20), ('depositar', 15), ('sacar', 5)]
+ETAG_ANTERIOR = '$etag'  # marcador no trace: usar o último ETag recebido por (usuário, caminho)
+# O contador compartilhado reserva por janela de um minuto: a execução começa
+# cedo numa janela para não virar no meio (e mudar o número de reservas)
+JANELA_FOLGA_S = 30
+
+
+def evento(metodo, caminho, user_id, corpo=None, cabecalhos=None):
+    return {
+        'resource': caminho,
+        'path': caminho,
+        'httpMethod': metodo,
+        'headers': {
+            'Accept': 'application/json', 'Accept-Encoding': 'gzip, deflate, br',
+            'Content-Type': 'application/json', 'X-User-Id': user_id,
+            'X-Forwarded-For': '200.1.2.3, 130.176.0.1', **(cabecalhos or {})
+        },
+        'queryStringParameters': None,
+        'pathParameters': None,
+        'requestContext': {'identity': {'sourceIp': '200.1.2.3'}},
+        'body': json.dumps(corpo) if corpo is not None else None,
+        'isBase64Encoded': False
+    }
+
+
+def gerar_trace(usuarios, operacoes, semente):
+    """Lista de eventos: uma abertura + depósito inicial por usuário e depois a mistura."""
+    sorteio = random.Random(semente)
+    cpfs = {f'bench-{i:04d}': f'{sorteio.randrange(10 ** 10, 10 ** 11)}' for i in range(usuarios)}
+    trace = []
+    for user_id, cpf in cpfs.items():
+        trace.append(evento('POST', '/contas', user_id, {'nome': f'Cliente {user_id}', 'cpf': cpf}))
+        trace.append(evento('POST', '/depositar', user_id, {'valor': 500}))
+
+    tipos, pesos = zip(*MISTURA)
+    for numero in range(operacoes):
+        user_id = sorteio.choice(list(cpfs))
+        tipo = sorteio.choices(tipos, pesos)[0]
+        if tipo == 'extrato':
+            trace.append(evento('GET', '/extrato', user_id, cabecalhos={'If-None-Match': ETAG_ANTERIOR}))
+        elif tipo == 'minha_conta':
+            trace.append(evento('GET', '/minha-conta', user_id, cabecalhos={'If-None-Match': ETAG_ANTERIOR}))
+        elif tipo == 'depositar':
+            trace.append(evento('POST', '/depositar', user_id, {'valor': sorteio.randint(1, 100)}))
+        elif tipo == 'sacar':
+            trace.append(evento('POST', '/sacar', user_id, {'valor': sorteio.randint(1, 20)}))
+        else:
+            destino = cpfs[sorteio.choice([u for u in cpfs if u != user_id])]
+            trace.append(evento('POST', '/pix/buscar', user_id, {'chave': destino}))
+            trace.append(evento('POST', '/pix/enviar', user_id,
+                                {'chave': destino, 'valor': sorteio.randint(1, 10), 'descricao': 'bench'},
+                                {'Idempotency-Key': f'bench-{semente}-{numero}'}))
+    return trace
+
+
+def registros_rota(saida):
+    """Registros EMF de rota (os que têm ChamadasDynamo) impressos durante uma requisição."""
+    for linha in saida.splitlines():
+        if '"ChamadasDynamo"' in linha:
+            yield json.loads(linha)
+
+
+def preparar(original, etags):
+    """Cópia do evento com o marcador de If-None-Match trocado pelo último ETag recebido."""
+    event = json.loads(json.dumps(original))
+    chave_etag = (event['headers']['X-User-Id'], event['path'])
+    if event['headers'].get('If-None-Match') == ETAG_ANTERIOR:
+        if chave_etag in etags:
+            event['headers']['If-None-Match'] = etags[chave_etag]
+        else:
+            del event['headers']['If-None-Match']
+    return event, chave_etag
+
+
+def amostras_por_rota(com_custo=True):
+    zero = 0 if com_custo else None
+    return defaultdict(lambda: {'latencias': [], 'chamadas': zero, 'rcu': zero, 'wcu': zero, 'status': defaultdict(int)})
+
+
+def alinhar_janela():
+    """Espera a próxima janela do contador se na atual restam menos de JANELA_FOLGA_S."""
+    restante = 60 - time.time() % 60
+    if restante < JANELA_FOLGA_S:
+        time.sleep(restante)
+    return int(time.time() // 60)
+
+
+def reproduzir(trace):
+    """Executa o trace em ordem; devolve (duração total em s, amostras por rota)."""
+    etags = {}
+    por_rota = amostras_por_rota()
+    with banco_local() as lf:
+        janela = alinhar_janela() if lf.LIMITE_COMPARTILHADO else None
+        inicio_total = time.perf_counter()
+        for original in trace:
+            event, chave_etag = preparar(original, etags)
+
+            saida = io.StringIO()
+            inicio = time.perf_counter()
+            with contextlib.redirect_stdout(saida):
+                retorno = lf.lambda_handler(event, None)
+            latencia = time.perf_counter() - inicio
+
+            if 'ETag' in retorno.get('headers', {}):
+                etags[chave_etag] = retorno['headers']['ETag']
+            for registro in registros_rota(saida.getvalue()):
+                rota = por_rota[registro['Rota']]
+                rota['latencias'].append(latencia)
+                rota['chamadas'] += registro['ChamadasDynamo']
+                rota['rcu'] += registro['RCU']
+                rota['wcu'] += registro['WCU']
+                rota['status'][registro['Status']] += 1
+        if janela is not None and int(time.time() // 60) != janela:
+            print('⚠️ A janela do contador de limites virou durante a execução: custo por rota pode variar')
+        return time.perf_counter() - inicio_total, por_rota
+
+
+def reproduzir_http(trace, url, concorrencia):
+    """Envia o trace a um servidor HTTP; devolve (duração total em s, amostras por rota)."""
+    destino = urlsplit(url)
+    etags = {}
+    por_rota = amostras_por_rota(com_custo=False)
+    trava = threading.Lock()
+    local = threading.local()
+
+    def enviar(original):
+        event, chave_etag = preparar(original, etags)
+        if not hasattr(local, 'conexao'):
+            local.conexao = http.client.HTTPConnection(destino.hostname, destino.port or 80, timeout=30)
+        inicio = time.perf_counter()
+        local.conexao.request(event['httpMethod'], event['path'], body=event['body'], headers=event['headers'])
+        retorno = local.conexao.getresponse()
+        retorno.read()
+        latencia = time.perf_counter() - inicio
+        with trava:
+            if retorno.getheader('ETag'):
+                etags[chave_etag] = retorno.getheader('ETag')
+            rota = por_rota[f"{event['httpMethod']} {event['path']}"]
+            rota['latencias'].append(latencia)
+            rota['status'][str(retorno.status)] += 1
+
+    def sequencia(eventos):
+        for original in eventos:
+            enviar(original)
+
+    # Contas antes de tudo (PIX para quem ainda não abriu conta daria 404);
+    # depois cada usuário em ordem, usuários em paralelo
+    aberturas = [e for e in trace if (e['httpMethod'], e['path']) == ('POST', '/contas')]
+    por_usuario = defaultdict(list)
+    for original in trace:
+        if (original['httpMethod'], original['path']) != ('POST', '/contas'):
+            por_usuario[original['headers']['X-User-Id']].append(original)
+
+    inicio_total = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        list(executor.map(lambda e: sequencia([e]), aberturas))
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        list(executor.map(sequencia, por_usuario.values()))
+    return time.perf_counter() - inicio_total, por_rota
+
+
+def consolidar(duracao, por_rota):
+    total = sum(len(r['latencias']) for r in por_rota.values())
+    rotas = {}
+    for nome, r in sorted(por_rota.items()):
+        n = len(r['latencias'])
+        rotas[nome] = {
+            'requisicoes': n,
+            **resumo(r['latencias']),
+            **{campo: None if r[campo] is None else round(r[campo] / n, 3) for campo in ('chamadas', 'rcu', 'wcu')},
+            'status': dict(r['status'])
+        }
+    return {'requisicoes': total, 'vazao': round(total / duracao, 1), 'rotas': rotas}
+
+
+def imprimir(resultado):
+    print(f'{resultado["requisicoes"]} requisições — {resultado["vazao"]:,.1f} req/s\n')
+    print(f'{"rota":<22} | {"n":>5} | {"p50 ms":>8} | {"p95 ms":>8} | {"p99 ms":>8} | '
+          f'{"chamadas":>8} | {"RCU":>6} | {"WCU":>6} | status')
+    for nome, r in resultado['rotas'].items():
+        status = ' '.join(f'{s}×{q}' for s, q in sorted(r['status'].items()))
+        custo = ' | '.join('-'.rjust(largura) if r[campo] is None else f'{r[campo]:>{largura}.2f}'
+                           for campo, largura in (('chamadas', 8), ('rcu', 6), ('wcu', 6)))
+        print(f'{nome:<22} | {r["requisicoes"]:>5} | {r["p50"]:>8.2f} | {r["p95"]:>8.2f} | {r["p99"]:>8.2f} | '
+              f'{custo} | {status}')
+
+
+def comparar(resultado, base, tolerancia_custo, tolerancia_latencia, folga_ms):
+    """Lista de regressões (texto) de resultado em relação à base.
+
+    Latência só conta como regressão se passar da tolerância relativa e da
+    folga absoluta: rotas servidas de cache ficam abaixo de 1 ms e oscilam.
+    """
+    regressoes = []
+    for nome, antes in base['rotas'].items():
+        agora = resultado['rotas'].get(nome)
+        if agora is None:
+            regressoes.append(f'{nome}: rota ausente no resultado')
+            continue
+        for campo in ('chamadas', 'rcu', 'wcu'):
+            if agora[campo] is None or antes[campo] is None:
+                continue
+            if agora[campo] > antes[campo] * (1 + tolerancia_custo) + 1e-9:
+                regressoes.append(f'{nome}: {campo} {antes[campo]} → {agora[campo]}')
+        for campo in ('p50', 'p95'):
+            if agora[campo] > max(antes[campo] * (1 + tolerancia_latencia), antes[campo] + folga_ms):
+                regressoes.append(f'{nome}: {campo} {antes[campo]} ms → {agora[campo]} ms')
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--usuarios', type=int, default=20)
+    parser.add_argument('--operacoes', type=int, default=400)
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--gravar', help='grava o trace gerado (JSONL) e segue com a execução')
+    parser.add_argument('--reproduzir', help='executa um trace JSONL gravado em vez de gerar')
+    parser.add_argument('--salvar-base')
+    parser.add_argument('--comparar')
+    parser.add_argument('--tolerancia-custo', type=float, default=0.05)
+    parser.add_argument('--tolerancia-latencia', type=float, default=0.5)
+    parser.add_argument('--folga-latencia-ms', type=float, default=5.0)
+    parser.add_argument('--url', help='servidor HTTP (backend/servidor.py) em vez do handler em processo')
+    parser.add_argument('--concorrencia', type=int, default=8)
+    args = parser.parse_args()
+
+    if args.reproduzir:
+        with open(args.reproduzir, encoding='utf-8') as arquivo:
+            trace = [json.loads(linha) for linha in arquivo if linha.strip()]
+    else:
+        trace = gerar_trace(args.usuarios, args.operacoes, args.semente)
+    if args.gravar:
+        with open(args.gravar, 'w', encoding='utf-8') as arquivo:
+            arquivo.writelines(json.dumps(e, ensure_ascii=False) + '\n' for e in trace)
+
+    if args.url:
+        resultado = consolidar(*reproduzir_http(trace, args.url, args.concorrencia))
+    else:
+        resultado = consolidar(*reproduzir(trace))
+    imprimir(resultado)
+
+    if args.salvar_base:
+        with open(args.salvar_base, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+            arquivo.write('\n')
+        print(f'\n💾 Base salva em {args.salvar_base}')
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            base = json.load(arquivo)
+        regressoes = comparar(resultado, base, args.tolerancia_custo, args.tolerancia_latencia,
+                               args.folga_latencia_ms)
+        if regressoes:
+            print('\n❌ Regressões em relação à base:')
+            for regressao in regressoes:
+                print(f'   {regressao}')
+            sys.exit(1)
+        print(f'\n✅ Sem regressões em relação a {args.comparar}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+🔑 Filtro de Bloom das chaves PIX a partir de um export do DynamoDB
+=====================================================================
+Alternativa à tarefa reconstruir_filtro_chaves para tabelas grandes: lê
+um export da tabela de chaves (ExportTableToPointInTime, formato
+DYNAMODB_JSON, arquivos *.json.gz) e grava o filtro no caminho usado em
+FILTRO_CHAVES_PIX (arquivo local ou s3://bucket/chave).
+
+--exportado-em é o instante do export (ExportTime). Chaves registradas
+depois dele são cobertas pelos itens de recentes; informar um instante
+posterior ao real faria o filtro negar chaves que existem.
+
+Uso: python scripts/filtro_chaves_pix.py <pasta do export> <destino>
+         --exportado-em 2026-10-16T03:00:00Z [--taxa 0.01]
+"""
+
+import argparse
+import glob
+import gzip
+import json
+import os
+from datetime import datetime
+
+import bench_comum  # noqa: F401 — coloca backend/ no sys.path
+import lambda_function as lf
+
+
+def ler_chaves(pasta):
+    for caminho in sorted(glob.glob(os.path.join(pasta, '**', '*.json.gz'), recursive=True)):
+        with gzip.open(caminho, 'rt', encoding='utf-8') as arquivo:
+            for linha in arquivo:
+                chave = json.loads(linha)['Item']['chave_valor']['S']
+                if not chave.startswith(lf.PREFIXO_INTERNO):
+                    yield chave
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pasta')
+    parser.add_argument('destino')
+    parser.add_argument('--exportado-em', required=True)
+    parser.add_argument('--taxa', type=float, default=lf.FILTRO_FALSO_POSITIVO)
+    args = parser.parse_args()
+
+    gerado_em = lf._instante_ms(args.exportado_em.replace('Z', '+00:00'))
+    chaves = list(ler_chaves(args.pasta))
+    filtro = lf.FiltroBloom.dimensionar(len(chaves), args.taxa, gerado_em)
+    for chave in chaves:
+        filtro.adicionar(chave)
+    lf.gravar_arquivo(args.destino, filtro.serializar())
+
+    print(f'{len(chaves)} chaves → {filtro.bits} bits ({filtro.bits // 8 // 1024} KiB), '
+          f'{filtro.hashes} hashes, gerado em {datetime.fromtimestamp(gerado_em / 1000).isoformat()}')
+
+
+if __name__ == '__main__':
+    main()
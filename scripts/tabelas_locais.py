@@ -0,0 +1,32 @@
+"""
+🗄️ Tabelas do Mini Banco num DynamoDB local
+============================================
+Cria as tabelas (mesmo esquema de bench_comum.TABELAS) num DynamoDB
+Local ou moto_server, para o modo servidor (backend/servidor.py com
+DYNAMODB_ENDPOINT) e testes de carga. Tabelas que já existem ficam
+como estão.
+
+Uso: python scripts/tabelas_locais.py [endpoint, padrão http://localhost:8000]
+"""
+
+import sys
+
+import boto3
+
+from bench_comum import TABELAS
+
+
+def main():
+    endpoint = sys.argv[1] if len(sys.argv) > 1 else 'http://localhost:8000'
+    cliente = boto3.client('dynamodb', endpoint_url=endpoint)
+    existentes = set(cliente.list_tables()['TableNames'])
+    for tabela in TABELAS:
+        if tabela['TableName'] in existentes:
+            print(f"• {tabela['TableName']} já existe")
+            continue
+        cliente.create_table(BillingMode='PAY_PER_REQUEST', **tabela)
+        print(f"✅ {tabela['TableName']} criada")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+🧪 Base dos testes — mesma DynamoDB em memória (moto) dos benchmarks
+=====================================================================
+Cada teste recebe um lambda_function recém-importado sobre tabelas vazias
+(bench_comum.banco_local) e chama o lambda_handler com eventos do proxy
+REST do API Gateway.
+
+Requer: pip install -r scripts/requirements.txt
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+from bench_comum import banco_local  # noqa: E402
+
+
+@pytest.fixture
+def lf():
+    with banco_local() as modulo:
+        yield modulo
+
+
+@pytest.fixture
+def api(lf):
+    """chamar(metodo, caminho, user_id, corpo, headers, params) → (status, corpo decodificado)."""
+    def chamar(metodo, caminho, user_id=None, corpo=None, headers=None, params=None):
+        cabecalhos = dict(headers or {})
+        if user_id:
+            cabecalhos['X-User-Id'] = user_id
+        retorno = lf.lambda_handler({
+            'httpMethod': metodo, 'path': caminho, 'headers': cabecalhos,
+            'queryStringParameters': params, 'pathParameters': None,
+            'body': json.dumps(corpo) if corpo is not None else None
+        }, None)
+        return retorno['statusCode'], json.loads(retorno['body']) if retorno.get('body') else None
+    return chamar
+
+
+@pytest.fixture
+def abrir_conta(api, lf):
+    """Abre a conta do usuário (com a chave PIX do CPF), deposita `saldo` e devolve o conta_id."""
+    def abrir(user_id, cpf, saldo=0):
+        status, _ = api('POST', '/contas', user_id, {'nome': f'Cliente {user_id}', 'cpf': cpf})
+        assert status == 201
+        if saldo:
+            assert api('POST', '/depositar', user_id, {'valor': saldo})[0] == 200
+        return lf.buscar_conta_por_user(user_id)['conta_id']
+    return abrir
+
+
+@pytest.fixture
+def lancamentos(lf):
+    """Lançamentos gravados na tabela de transações para a conta, sem passar pela API."""
+    def ler(conta_id):
+        return lf.transactions_table.query(KeyConditionExpression=lf.Key('conta_id').eq(conta_id))['Items']
+    return ler
@@ -0,0 +1,172 @@
+"""PIX agendado: baldes por minuto, posse com validade, cursor e execução única."""
+
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+
+@pytest.fixture
+def executor(lf, monkeypatch):
+    # Poucas fatias e pouca recuperação: cada minuto custa AGENDAMENTO_FATIAS consultas
+    monkeypatch.setattr(lf, 'AGENDAMENTO_FATIAS', 4)
+    monkeypatch.setattr(lf, 'AGENDAMENTO_RECUPERACAO_S', 180)
+    return lf
+
+
+def agendar_vencido(lf, conta_id, chave, valor, minuto, fatia=0):
+    """Grava um agendamento PENDENTE já vencido no `minuto` (a API só aceita datas futuras)."""
+    item = {
+        'serie_id': lf._gerador_ids.gerar(), 'conta_id': conta_id, 'chave': chave,
+        'valor': Decimal(str(valor)), 'descricao': 'PIX agendado', 'recorrencia': 'UNICA', 'ocorrencia': 1,
+        'balde': f'{lf._rotulo_minuto(minuto)}#{fatia:02d}',
+        'agendamento_id': lf._gerador_ids.gerar(minuto * 60000),
+        'data': datetime.fromtimestamp(minuto * 60, timezone.utc).isoformat(),
+        'estado': 'PENDENTE', 'criado_em': datetime.now(timezone.utc).isoformat()
+    }
+    lf.schedules_table.put_item(Item=item)
+    return item
+
+
+def estado(lf, item):
+    chave = {'balde': item['balde'], 'agendamento_id': item['agendamento_id']}
+    return lf.schedules_table.get_item(Key=chave, ConsistentRead=True)['Item']['estado']
+
+
+def test_balde_e_id_seguem_o_minuto_de_execucao(lf, monkeypatch):
+    data = datetime.now(timezone.utc).replace(second=0, microsecond=0) + timedelta(days=2)
+    serie = {'serie_id': lf._gerador_ids.gerar(), 'conta_id': 'c', 'chave': 'k', 'valor': Decimal('1'),
+             'descricao': 'PIX agendado', 'recorrencia': 'UNICA', 'ocorrencia': 1}
+
+    with monkeypatch.context() as m:
+        m.setattr(lf, 'AGENDAMENTO_JANELA_S', 0)
+        item = lf.montar_agendamento(serie, data)
+    minuto, fatia = item['balde'].split('#')
+    assert minuto == data.strftime('%Y-%m-%dT%H:%M')
+    assert 0 <= int(fatia) < lf.AGENDAMENTO_FATIAS
+    assert lf.ms_do_ulid(item['agendamento_id']) // 60000 == int(data.timestamp()) // 60
+
+    # Com janela, o atraso é o mesmo para toda a série e fica dentro dela
+    atrasos = {lf.ms_do_ulid(lf.montar_agendamento(serie, data)['agendamento_id']) - int(data.timestamp() * 1000)
+               for _ in range(5)}
+    assert len(atrasos) == 1
+    assert 0 <= atrasos.pop() < lf.AGENDAMENTO_JANELA_S * 1000
+
+
+def test_agendar_grava_no_balde_do_minuto(api, lf, abrir_conta):
+    abrir_conta('pagador', '80000000001', saldo=50)
+    abrir_conta('recebedor', '80000000002')
+    data = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+
+    status, corpo = api('POST', '/pix/agendamentos', 'pagador', {'chave': '80000000002', 'valor': 10, 'data': data})
+    assert status == 201
+    agendamento_id = corpo['agendamento']['agendamento_id']
+    minuto = lf.ms_do_ulid(agendamento_id) // 60000
+    baldes = [f'{lf._rotulo_minuto(minuto)}#{f:02d}' for f in range(lf.AGENDAMENTO_FATIAS)]
+    assert [i['agendamento_id'] for b in baldes for i in lf._pendentes_do_balde(b)] == [agendamento_id]
+
+
+def test_posse_expira(lf):
+    balde = '2030-01-01T00:00#00'
+    assert lf._tomar_posse(balde, 'a')
+    assert not lf._tomar_posse(balde, 'b')
+
+    # Só o dono libera
+    lf._liberar_posse(balde, 'b')
+    assert not lf._tomar_posse(balde, 'b')
+
+    lf.schedules_table.update_item(
+        Key={'balde': balde, 'agendamento_id': lf._POSSE},
+        UpdateExpression='SET expira_em = :vencida',
+        ExpressionAttributeValues={':vencida': int(time.time()) - 1}
+    )
+    assert lf._tomar_posse(balde, 'b')
+    lf._liberar_posse(balde, 'b')
+    assert lf._tomar_posse(balde, 'c')
+
+
+def test_cursor_anda_ate_o_ultimo_minuto_fechado(executor, abrir_conta):
+    lf = executor
+    origem = abrir_conta('pagador', '80000000001', saldo=50)
+    destino = abrir_conta('recebedor', '80000000002')
+    atual = int(time.time() // 60)
+    item = agendar_vencido(lf, origem, '80000000002', 10, atual - 2, fatia=1)
+
+    resultado = lf.tarefa_executar_agendamentos({})
+    assert resultado['executados'] == 1
+    assert resultado['minutos'] >= lf.AGENDAMENTO_RECUPERACAO_S // 60
+    assert not resultado['continuar']
+    cursor = lf.schedules_table.get_item(Key=lf._CURSOR_AGENDAMENTOS, ConsistentRead=True)['Item']
+    assert int(cursor['minuto']) >= atual - 1
+    assert resultado['cursor'] == lf._rotulo_minuto(int(cursor['minuto']))
+    assert estado(lf, item) == 'EXECUTADO'
+    assert lf.buscar_conta(destino)['saldo'] == Decimal('10')
+
+    # Nada de novo: o cursor não volta aos minutos pagos
+    assert lf.tarefa_executar_agendamentos({})['executados'] == 0
+    assert lf.buscar_conta(origem)['saldo'] == Decimal('40')
+
+
+def test_balde_ocupado_segura_o_cursor_ate_a_posse_expirar(executor, abrir_conta):
+    lf = executor
+    origem = abrir_conta('pagador', '80000000001', saldo=50)
+    abrir_conta('recebedor', '80000000002')
+    atual = int(time.time() // 60)
+    item = agendar_vencido(lf, origem, '80000000002', 10, atual - 2, fatia=3)
+    assert lf._tomar_posse(item['balde'], 'outro-executor')
+
+    resultado = lf.tarefa_executar_agendamentos({})
+    assert resultado['ocupados'] == 1 and resultado['executados'] == 0
+    assert resultado['cursor'] == lf._rotulo_minuto(atual - 3)
+    assert estado(lf, item) == 'PENDENTE'
+
+    # O outro executor morreu: a posse vence e o minuto é pago na próxima rodada
+    lf.schedules_table.update_item(
+        Key={'balde': item['balde'], 'agendamento_id': lf._POSSE},
+        UpdateExpression='SET expira_em = :vencida',
+        ExpressionAttributeValues={':vencida': int(time.time()) - 1}
+    )
+    assert lf.tarefa_executar_agendamentos({})['executados'] == 1
+    assert estado(lf, item) == 'EXECUTADO'
+    assert lf.buscar_conta(origem)['saldo'] == Decimal('40')
+
+
+def test_leitura_antiga_nao_paga_duas_vezes(lf, abrir_conta):
+    # Executor cuja posse venceu no meio do pagamento: o outro já pagou o balde
+    origem = abrir_conta('pagador', '80000000001', saldo=50)
+    destino = abrir_conta('recebedor', '80000000002')
+    item = agendar_vencido(lf, origem, '80000000002', 10, int(time.time() // 60) - 2)
+    pendentes = lf._pendentes_do_balde(item['balde'])
+    resumo = dict.fromkeys(('executados', 'falhas', 'ignorados', 'adiados'), 0)
+
+    assert lf.executar_pagamentos(pendentes, time.monotonic() + 30, resumo)
+    assert lf.executar_pagamentos(pendentes, time.monotonic() + 30, resumo)
+    assert resumo['executados'] == 1 and resumo['ignorados'] == 1
+    assert lf.buscar_conta(origem)['saldo'] == Decimal('40')
+    assert lf.buscar_conta(destino)['saldo'] == Decimal('10')
+
+
+def test_executores_simultaneos_pagam_uma_vez(executor, abrir_conta):
+    lf = executor
+    origem = abrir_conta('pagador', '80000000001', saldo=100)
+    destino = abrir_conta('recebedor', '80000000002')
+    atual = int(time.time() // 60)
+    itens = [agendar_vencido(lf, origem, '80000000002', 5, atual - 1 - i % 2, fatia=i % lf.AGENDAMENTO_FATIAS)
+             for i in range(6)]
+
+    resultados = []
+    executores = [threading.Thread(target=lambda: resultados.append(lf.tarefa_executar_agendamentos({})))
+                  for _ in range(2)]
+    for t in executores:
+        t.start()
+    for t in executores:
+        t.join()
+    # O que um deixou por posse ocupada, a rodada seguinte termina
+    resultados.append(lf.tarefa_executar_agendamentos({}))
+
+    assert sum(r['executados'] for r in resultados) == 6
+    assert all(estado(lf, item) == 'EXECUTADO' for item in itens)
+    assert lf.buscar_conta(origem)['saldo'] == Decimal('70')
+    assert lf.buscar_conta(destino)['saldo'] == Decimal('30')
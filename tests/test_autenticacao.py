@@ -0,0 +1,89 @@
+"""Autenticação: JWT do Cognito no Authorization e o login de teste (X-User-Id)."""
+
+import base64
+import json
+import time
+
+import pytest
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+EMISSOR = 'https://cognito-idp.us-east-2.amazonaws.com/us-east-2_testes'
+CLIENT_ID = 'testes-client'
+
+
+def b64url(dados):
+    return base64.urlsafe_b64encode(dados).rstrip(b'=').decode()
+
+
+@pytest.fixture(scope='module')
+def chave():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+@pytest.fixture
+def assinar(lf, chave, monkeypatch, tmp_path):
+    """Publica o JWKS num arquivo, configura o Cognito e devolve assinar(**claims) → token."""
+    numeros = chave.public_key().public_numbers()
+    jwks = tmp_path / 'jwks.json'
+    jwks.write_text(json.dumps({'keys': [{
+        'kty': 'RSA', 'alg': 'RS256', 'use': 'sig', 'kid': 'k1',
+        'n': b64url(numeros.n.to_bytes(256, 'big')), 'e': b64url(numeros.e.to_bytes(3, 'big'))
+    }]}))
+    monkeypatch.setattr(lf, 'JWT_EMISSOR', EMISSOR)
+    monkeypatch.setattr(lf, 'COGNITO_CLIENT_ID', CLIENT_ID)
+    monkeypatch.setattr(lf, 'JWKS_URL', f'file://{jwks}')
+
+    def assinar_token(**claims):
+        payload = {'sub': 'usuario-jwt', 'iss': EMISSOR, 'aud': CLIENT_ID, 'token_use': 'id',
+                   'exp': int(time.time()) + 3600, 'iat': int(time.time()), **claims}
+        cabecalho = b64url(json.dumps({'alg': 'RS256', 'kid': 'k1'}).encode())
+        corpo = b64url(json.dumps(payload).encode())
+        assinatura = chave.sign(f'{cabecalho}.{corpo}'.encode(), padding.PKCS1v15(), hashes.SHA256())
+        return f'{cabecalho}.{corpo}.{b64url(assinatura)}'
+    return assinar_token
+
+
+def test_bearer_valido_identifica_o_usuario(api, abrir_conta, assinar):
+    abrir_conta('usuario-jwt', '20000000001')
+    status, corpo = api('GET', '/minha-conta', headers={'Authorization': f'Bearer {assinar()}'})
+    assert status == 200
+    assert corpo['nome'] == 'Cliente usuario-jwt'
+
+
+@pytest.mark.parametrize('token', [
+    'a.b.c',
+    'malformado',
+    'expirado',
+    'emissor',
+    'publico',
+])
+def test_bearer_invalido_nao_cai_para_x_user_id(api, abrir_conta, assinar, token):
+    abrir_conta('vitima', '20000000002')
+    tokens = {
+        'expirado': assinar(exp=int(time.time()) - 3600),
+        'emissor': assinar(iss='https://outro-emissor'),
+        'publico': assinar(aud='outro-client'),
+    }
+    autorizacao = f'Bearer {tokens.get(token, token)}'
+    status, _ = api('GET', '/minha-conta', 'vitima', headers={'Authorization': autorizacao})
+    assert status == 401
+
+
+def test_x_user_id_so_vale_em_modo_teste(api, lf, abrir_conta, monkeypatch):
+    abrir_conta('teste', '20000000003')
+    assert api('GET', '/minha-conta', 'teste')[0] == 200
+
+    monkeypatch.setattr(lf, 'AUTH_MODO_TESTE', False)
+    assert api('GET', '/minha-conta', 'teste')[0] == 401
+
+
+def test_modo_teste_desligado_por_padrao(monkeypatch):
+    import importlib
+    import lambda_function
+    monkeypatch.delenv('AUTH_MODO_TESTE')
+    try:
+        assert importlib.reload(lambda_function).AUTH_MODO_TESTE is False
+    finally:
+        monkeypatch.undo()
+        importlib.reload(lambda_function)
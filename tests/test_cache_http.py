@@ -0,0 +1,69 @@
+"""ETag/If-None-Match e gzip das respostas."""
+
+import base64
+import gzip
+import json
+
+
+def _get(lf, caminho, user_id, headers=None):
+    return lf.lambda_handler({
+        'httpMethod': 'GET', 'path': caminho, 'headers': {'X-User-Id': user_id, **(headers or {})},
+        'queryStringParameters': None, 'pathParameters': None, 'body': None
+    }, None)
+
+
+def test_if_none_match_igual_responde_304(lf, abrir_conta):
+    abrir_conta('cliente', '60000000001', saldo=30)
+    for caminho in ('/minha-conta', '/extrato'):
+        etag = _get(lf, caminho, 'cliente')['headers']['ETag']
+        retorno = _get(lf, caminho, 'cliente', {'If-None-Match': etag})
+        assert retorno['statusCode'] == 304
+        assert retorno['body'] == ''
+        assert retorno['headers']['ETag'] == etag
+
+
+def test_etag_muda_depois_de_um_deposito(lf, api, abrir_conta):
+    abrir_conta('cliente', '60000000001', saldo=30)
+    antes = {c: _get(lf, c, 'cliente')['headers']['ETag'] for c in ('/minha-conta', '/extrato')}
+    api('POST', '/depositar', 'cliente', {'valor': 5})
+
+    for caminho, etag in antes.items():
+        retorno = _get(lf, caminho, 'cliente', {'If-None-Match': etag})
+        assert retorno['statusCode'] == 200
+        assert retorno['headers']['ETag'] != etag
+    assert json.loads(retorno['body'])['transacoes'][0]['valor'] == 5.0
+
+
+def _retorno(lf, tamanho):
+    return lf.resposta_texto(200, 'x' * tamanho, 'application/json')
+
+
+def test_gzip_a_partir_do_tamanho_minimo(lf, monkeypatch):
+    monkeypatch.setattr(lf, 'COMPRESSAO_ATIVA', True)
+    aceita = {'headers': {'Accept-Encoding': 'gzip, deflate'}}
+
+    pequeno = lf.comprimir(aceita, _retorno(lf, lf.COMPRESSAO_MIN_BYTES - 1))
+    assert 'Content-Encoding' not in pequeno['headers']
+    assert not pequeno.get('isBase64Encoded')
+
+    grande = lf.comprimir(aceita, _retorno(lf, lf.COMPRESSAO_MIN_BYTES))
+    assert grande['headers']['Content-Encoding'] == 'gzip'
+    assert grande['isBase64Encoded']
+    assert gzip.decompress(base64.b64decode(grande['body'])).decode() == 'x' * lf.COMPRESSAO_MIN_BYTES
+
+    # Cliente que não aceita gzip recebe o corpo original
+    assert lf.comprimir({'headers': {}}, _retorno(lf, 4096))['body'] == 'x' * 4096
+
+
+def test_sem_compressao_com_a_flag_desligada(lf, api, abrir_conta, monkeypatch):
+    monkeypatch.setattr(lf, 'COMPRESSAO_ATIVA', False)
+    aceita = {'headers': {'Accept-Encoding': 'gzip'}}
+    assert 'Content-Encoding' not in lf.comprimir(aceita, _retorno(lf, 4096))['headers']
+
+    abrir_conta('cliente', '60000000001', saldo=30)
+    for _ in range(30):
+        api('POST', '/depositar', 'cliente', {'valor': 1})
+    retorno = _get(lf, '/extrato', 'cliente', {'Accept-Encoding': 'gzip'})
+    assert len(retorno['body']) >= lf.COMPRESSAO_MIN_BYTES
+    assert 'Content-Encoding' not in retorno['headers']
+    assert len(json.loads(retorno['body'])['transacoes']) > 1
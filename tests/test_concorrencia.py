@@ -0,0 +1,48 @@
+"""Estado do container compartilhado entre threads (servidor HTTP, pool de leituras)."""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DicionarioLento(OrderedDict):
+    """Cede a vez entre ler a entrada e mexer nela, onde as corridas aparecem."""
+
+    def get(self, *args):
+        valor = super().get(*args)
+        time.sleep(0)
+        return valor
+
+
+def test_cache_lru_aguenta_threads(lf):
+    cache = lf.CacheLRU(32, 60)
+    cache._itens = DicionarioLento()
+
+    def martelar(semente):
+        for i in range(2000):
+            chave = (semente * 7 + i) % 100
+            cache.guardar(chave, i)
+            cache.obter((chave + 1) % 100)
+            if i % 3 == 0:
+                cache.remover((chave + 2) % 100)
+
+    with ThreadPoolExecutor(8) as pool:
+        for futuro in [pool.submit(martelar, semente) for semente in range(8)]:
+            futuro.result()
+    assert cache.estatisticas()['itens'] <= 32
+
+
+def test_balde_de_tokens_nao_concede_alem_da_rajada(lf, monkeypatch):
+    monkeypatch.setattr(lf, 'LIMITES_TAXA', {'padrao': [0.0001, 50, False]})
+    monkeypatch.setattr(lf, 'LIMITE_COMPARTILHADO', False)
+    liberadas = []
+    barreira = threading.Barrier(8)
+
+    def disparar(_):
+        barreira.wait()
+        liberadas.extend(1 for _ in range(20) if lf.verificar_limite('padrao', 'u1') is None)
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(disparar, range(8)))
+    assert len(liberadas) == 50
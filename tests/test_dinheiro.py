@@ -0,0 +1,78 @@
+"""Dinheiro: valores das requisições em centavos inteiros."""
+
+from decimal import Decimal
+
+import pytest
+from bench_comum import banco_local
+
+
+@pytest.fixture(scope='module')
+def lf():
+    """Sem escrita no banco: um módulo para o arquivo inteiro."""
+    with banco_local() as modulo:
+        yield modulo
+
+
+@pytest.mark.parametrize('valor, esperado', [
+    (12, 1200),
+    (0, 0),
+    (12.5, 1250),
+    (0.1, 10),
+    (87.9, 8790),
+    ('12', 1200),
+    ('12.5', 1250),
+    ('12.50', 1250),
+    (' 0.01 ', 1),
+    ('-1.50', -150),
+    (-3, -300),
+])
+def test_ler_em_centavos(lf, valor, esperado):
+    assert lf.Dinheiro.ler(valor).centavos == esperado
+
+
+@pytest.mark.parametrize('valor', [
+    0.005, 12.345, '0.005', '12.345', '1.', '.5', '-', '1e3', '1,50', 'NaN', '１２',
+    float('nan'), float('inf'), True, None, Decimal('1.00'), [1],
+])
+def test_ler_recusa_formato_e_precisao(lf, valor):
+    with pytest.raises(ValueError):
+        lf.Dinheiro.ler(valor)
+
+
+def test_ler_recusa_acima_do_limite(lf):
+    assert lf.Dinheiro.ler(lf.DINHEIRO_MAX_CENTAVOS // 100).centavos == lf.DINHEIRO_MAX_CENTAVOS
+    with pytest.raises(ValueError, match='limite'):
+        lf.Dinheiro.ler(lf.DINHEIRO_MAX_CENTAVOS // 100 + 1)
+
+
+@pytest.mark.parametrize('valor', [0, '0.00', -5, '-0.01', '', None])
+def test_positivo_recusa_zero_e_negativos(lf, valor):
+    with pytest.raises(ValueError, match='positivo'):
+        lf.Dinheiro.positivo(valor)
+
+
+@pytest.mark.parametrize('valor, esperado', [
+    (Decimal('10.25'), 1025),
+    (Decimal('10'), 1000),
+    (7, 700),
+    (Decimal('-4.10'), -410),
+    # Meio centavo: arredonda para o par
+    (Decimal('0.005'), 0),
+    (Decimal('0.015'), 2),
+    (Decimal('0.025'), 2),
+    (Decimal('1.0051'), 101),
+])
+def test_centavos_do_dynamo(lf, valor, esperado):
+    assert lf.centavos(valor) == esperado
+    assert lf.Dinheiro.do_dynamo(valor).centavos == esperado
+
+
+def test_conversoes_e_aritmetica(lf):
+    a, b = lf.Dinheiro.ler('10.05'), lf.Dinheiro.ler(2.5)
+
+    assert a.decimal() == Decimal('10.05')
+    assert str(a - b) == '7.55'
+    assert str(b - a) == '-7.55'
+    assert sum([a, b]) == lf.Dinheiro(1255)
+    assert -a < b <= lf.Dinheiro(250) < a
+    assert not lf.Dinheiro(0)
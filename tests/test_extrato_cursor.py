@@ -0,0 +1,50 @@
+"""Extrato paginado por cursor e o extrato legado por conta_id."""
+
+
+def test_paginas_cobrem_o_extrato_sem_repetir(api, abrir_conta, lancamentos):
+    conta_id = abrir_conta('cliente', '40000000001')
+    for valor in range(1, 8):
+        assert api('POST', '/depositar', 'cliente', {'valor': valor})[0] == 200
+
+    vistos, cursor, paginas = [], None, 0
+    while True:
+        params = {'limite': '3', **({'cursor': cursor} if cursor else {})}
+        status, corpo = api('GET', '/extrato', 'cliente', params=params)
+        assert status == 200
+        assert len(corpo['transacoes']) <= 3
+        vistos += [(t['data'], t['valor']) for t in corpo['transacoes']]
+        paginas += 1
+        cursor = corpo['proximo_cursor']
+        if not cursor:
+            break
+
+    assert paginas == 3
+    assert vistos == sorted(vistos, reverse=True)
+    assert sorted(vistos) == sorted((l['data'], float(l['valor'])) for l in lancamentos(conta_id))
+
+
+def test_cursor_de_outra_conta_recusado(api, abrir_conta):
+    abrir_conta('ana', '40000000001')
+    abrir_conta('bia', '40000000002')
+    for valor in (1, 2, 3):
+        api('POST', '/depositar', 'ana', {'valor': valor})
+
+    cursor = api('GET', '/extrato', 'ana', params={'limite': '2'})[1]['proximo_cursor']
+    assert cursor
+    assert api('GET', '/extrato', 'bia', params={'cursor': cursor})[0] == 400
+
+
+def test_cursor_adulterado_recusado(api, abrir_conta):
+    abrir_conta('ana', '40000000001')
+    assert api('GET', '/extrato', 'ana', params={'cursor': 'não-é-base64'})[0] == 400
+
+
+def test_extrato_por_id_so_do_dono(api, abrir_conta):
+    conta_ana = abrir_conta('ana', '40000000001', saldo=10)
+    abrir_conta('bia', '40000000002')
+
+    assert api('GET', f'/extrato/{conta_ana}')[0] == 401
+    assert api('GET', f'/extrato/{conta_ana}', 'bia')[0] == 403
+    status, corpo = api('GET', f'/extrato/{conta_ana}', 'ana')
+    assert status == 200
+    assert corpo['transacoes'][0]['valor'] == 10.0
@@ -0,0 +1,52 @@
+"""Filtro de Bloom das chaves PIX e as chaves registradas depois dele."""
+
+from datetime import datetime, timezone
+
+import pytest
+
+
+class TabelaSemEspaco:
+    """Tabela de chaves em que o item de recentes passou de 400 KB."""
+
+    def __init__(self, tabela):
+        self._tabela = tabela
+
+    def __getattr__(self, nome):
+        return getattr(self._tabela, nome)
+
+    def update_item(self, **kwargs):
+        if kwargs['UpdateExpression'].startswith('ADD'):
+            raise RuntimeError('Item size has exceeded the maximum allowed size')
+        return self._tabela.update_item(**kwargs)
+
+
+@pytest.fixture
+def filtro(lf, tmp_path, monkeypatch):
+    """Liga o filtro num arquivo local e gera a primeira versão."""
+    monkeypatch.setattr(lf, 'FILTRO_CHAVES_PIX', str(tmp_path / 'filtro.bin'))
+    lf.tarefa_reconstruir_filtro_chaves({})
+
+
+def test_chave_nova_anotada_na_fatia_da_hora(lf, abrir_conta, filtro):
+    abrir_conta('ana', '80000000001')
+
+    assert lf.chave_ausente_sem_leitura('ninguem@teste.com')
+    assert not lf.chave_ausente_sem_leitura('80000000001')
+    fatia = lf.pix_keys_table.get_item(Key={
+        'chave_valor': lf._chave_recentes(datetime.now(timezone.utc), lf.fatia_recentes('80000000001'))
+    })['Item']
+    assert fatia['chaves'] == {'80000000001'}
+
+
+def test_anotacao_que_falha_desliga_o_filtro(api, lf, abrir_conta, filtro, monkeypatch):
+    abrir_conta('ana', '80000000001')
+    monkeypatch.setattr(lf, 'pix_keys_table', TabelaSemEspaco(lf.pix_keys_table))
+    status, _ = api('POST', '/pix/chaves', 'ana', {'tipo': 'EMAIL', 'valor': 'ana@teste.com'})
+    assert status == 201
+    assert not lf.chave_ausente_sem_leitura('ana@teste.com')
+
+    # Outro container, com o filtro e as fatias recém-carregados: a marca da hora vale para ele
+    lf._filtro_chaves['verificado_em'] = float('-inf')
+    lf._cache_recentes.remover(lf.fatia_recentes('ana@teste.com'))
+    assert not lf.chave_ausente_sem_leitura('ana@teste.com')
+    assert not lf.chave_ausente_sem_leitura('ninguem@teste.com')
@@ -0,0 +1,34 @@
+"""Idempotency-Key: respostas definitivas repetidas, conflitos liberam a chave."""
+
+from decimal import Decimal
+
+
+def test_conflito_libera_a_chave_para_nova_tentativa(api, lf, abrir_conta, monkeypatch):
+    origem = abrir_conta('pagador', '70000000001', saldo=100)
+    abrir_conta('recebedor', '70000000002')
+    pix = {'chave': '70000000002', 'valor': 10}
+    chave = {'Idempotency-Key': 'pix-1'}
+
+    def em_uso(*args, **kwargs):
+        raise lf.TransferenciaRecusada(409, 'Conta em uso por outra operação, tente novamente')
+
+    with monkeypatch.context() as m:
+        m.setattr(lf, 'executar_transferencia', em_uso)
+        assert api('POST', '/pix/enviar', 'pagador', pix, headers=chave)[0] == 409
+
+    status, corpo = api('POST', '/pix/enviar', 'pagador', pix, headers=chave)
+    assert status == 200
+    assert api('POST', '/pix/enviar', 'pagador', pix, headers=chave) == (status, corpo)
+    assert lf.buscar_conta(origem)['saldo'] == Decimal('90.00')
+
+
+def test_recusa_definitiva_fica_guardada(api, lf, abrir_conta):
+    abrir_conta('pagador', '70000000001', saldo=5)
+    abrir_conta('recebedor', '70000000002')
+    pix = {'chave': '70000000002', 'valor': 10}
+    chave = {'Idempotency-Key': 'pix-2'}
+
+    assert api('POST', '/pix/enviar', 'pagador', pix, headers=chave)[0] == 400
+    api('POST', '/depositar', 'pagador', {'valor': 100})
+    # Mesma chave, mesma resposta: a recusa por saldo foi a resposta definitiva
+    assert api('POST', '/pix/enviar', 'pagador', pix, headers=chave)[0] == 400
@@ -0,0 +1,59 @@
+"""transacao_id em ULID: ordem no tempo, monotônico no container e ids antigos."""
+
+
+def test_mesmo_milissegundo_segue_crescente(lf):
+    gerador = lf.GeradorULID()
+    ids = [gerador.gerar(1_700_000_000_000) for _ in range(200)]
+
+    assert ids == sorted(ids)
+    assert len(set(ids)) == 200
+    assert {lf.ms_do_ulid(i) for i in ids} == {1_700_000_000_000}
+
+
+def test_relogio_que_volta_nao_quebra_a_ordem(lf):
+    gerador = lf.GeradorULID()
+    primeiro = gerador.gerar(2_000)
+    depois = gerador.gerar(1_500)
+
+    assert depois > primeiro
+    assert lf.ms_do_ulid(depois) == 2_000
+
+
+def test_estouro_da_parte_aleatoria_passa_ao_proximo_milissegundo(lf):
+    gerador = lf.GeradorULID()
+    gerador._ultimo_ms, gerador._ultimo_aleatorio = 1_000, lf._ALEATORIO_MAX
+    seguinte = gerador.gerar(1_000)
+
+    assert seguinte > lf.codificar_ulid(1_000, lf._ALEATORIO_MAX)
+    assert lf.ms_do_ulid(seguinte) == 1_001
+
+
+def test_faixa_do_milissegundo(lf):
+    ulid = lf.GeradorULID().gerar(5_000)
+    assert lf.limite_ulid(5_000) <= ulid <= lf.limite_ulid(5_000, ultimo=True)
+    assert lf.limite_ulid(4_999, ultimo=True) < ulid < lf.limite_ulid(5_001)
+
+
+def test_id_antigo_fica_no_topo_ate_a_migracao(api, lf, abrir_conta, lancamentos):
+    conta_id = abrir_conta('cliente', '30000000001')
+    antigo = '2024-01-05T10:00:00+00:00#a1b2'
+    lf.transactions_table.put_item(Item={
+        'conta_id': conta_id, 'transacao_id': antigo, 'tipo': 'DEPOSITO',
+        'valor': 7, 'descricao': 'Depósito antigo', 'data': '2024-01-05T10:00:00+00:00'
+    })
+    api('POST', '/depositar', 'cliente', {'valor': 5})
+
+    # Antes da migração: ordena depois de qualquer ULID, à frente dos lançamentos novos
+    assert antigo > lf.GeradorULID().gerar()
+    _, corpo = api('GET', '/extrato', 'cliente')
+    assert corpo['transacoes'][0]['descricao'] == 'Depósito antigo'
+
+    assert lf.lambda_handler({'tarefa': 'migrar_transacao_ids'}, None)['migrados'] == 1
+    migrado = next(l for l in lancamentos(conta_id) if l.get('transacao_id_legado') == antigo)
+    assert migrado['transacao_id'] == lf.ulid_do_legado(antigo)
+    assert lf.ms_do_ulid(migrado['transacao_id']) == lf._instante_ms('2024-01-05T10:00:00+00:00')
+
+    _, corpo = api('GET', '/extrato', 'cliente')
+    assert corpo['transacoes'][-1]['descricao'] == 'Depósito antigo'
+    # Repetir a migração não encontra mais nada
+    assert lf.lambda_handler({'tarefa': 'migrar_transacao_ids'}, None)['migrados'] == 0
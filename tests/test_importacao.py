@@ -0,0 +1,48 @@
+"""Importação de contas: CPF ou user_id que já estão no app não são sobrescritos."""
+
+import json
+
+
+def importar(lf, tmp_path, linhas):
+    origem = tmp_path / 'clientes.ndjson'
+    origem.write_text(''.join(json.dumps(linha) + '\n' for linha in linhas))
+    return lf.lambda_handler({
+        'tarefa': 'importar_contas', 'origem': str(origem), 'estado': str(tmp_path / 'estado.json')
+    }, None)
+
+
+def test_user_id_com_conta_rejeitado(lf, tmp_path, abrir_conta):
+    conta_id = abrir_conta('ana', '90000000001')
+
+    resultado = importar(lf, tmp_path, [
+        {'nome': 'Ana de novo', 'cpf': '900.000.000-02', 'user_id': 'ana'},
+        {'nome': 'Bia', 'cpf': '900.000.000-03', 'user_id': 'bia'},
+    ])
+
+    assert (resultado['criadas'], resultado['rejeitadas']) == (1, 1)
+    assert resultado['exemplos'] == [{'linha': 1, 'motivo': 'user_id já tem conta'}]
+    assert lf.buscar_conta_por_user('ana')['conta_id'] == conta_id
+    assert lf.resolver_chave_pix('900.000.000-03')['conta_id'] == lf.buscar_conta_por_user('bia')['conta_id']
+
+
+def test_chave_registrada_durante_a_importacao_nao_e_sobrescrita(lf, tmp_path, monkeypatch):
+    conferir = lf.buscar_itens_pix
+
+    def chave_chega_depois(chaves):
+        # A chave entra pela API entre a conferência e a escrita da importação
+        itens = conferir(chaves)
+        lf.pix_keys_table.put_item(Item={'chave_valor': '900.000.000-01', 'chave_tipo': 'CPF', 'conta_id': 'outra'})
+        return itens
+
+    monkeypatch.setattr(lf, 'buscar_itens_pix', chave_chega_depois)
+    resultado = importar(lf, tmp_path, [
+        {'nome': 'Ana', 'cpf': '900.000.000-01', 'user_id': 'ana'},
+        {'nome': 'Bia', 'cpf': '900.000.000-03', 'user_id': 'bia'},
+    ])
+
+    assert (resultado['criadas'], resultado['rejeitadas']) == (1, 1)
+    assert lf.resolver_chave_pix('900.000.000-01')['conta_id'] == 'outra'
+    # A conta da linha rejeitada foi desfeita junto com a abertura
+    assert lf.buscar_conta_por_user('ana') is None
+    conta_bia = lf.buscar_conta_por_user('bia')['conta_id']
+    assert {l['conta_id'] for l in lf.transactions_table.scan()['Items']} == {conta_bia}
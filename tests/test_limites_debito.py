@@ -0,0 +1,76 @@
+"""Limites de débito: janela diária deslizante em baldes e janela noturna."""
+
+import time
+from decimal import Decimal
+
+import pytest
+
+
+@pytest.fixture
+def dia(lf, monkeypatch):
+    """Limite diário de R$ 100 e nenhuma hora noturna."""
+    monkeypatch.setattr(lf, 'LIMITE_DIARIO', Decimal('100'))
+    monkeypatch.setattr(lf, 'LIMITE_NOITE_INICIO', 0)
+    monkeypatch.setattr(lf, 'LIMITE_NOITE_FIM', 0)
+
+
+def baldes_diarios(conta):
+    return {int(nome[5:]): valor for nome, valor in conta.items() if nome.startswith('lim_d')}
+
+
+def test_limite_diario_soma_os_debitos(api, abrir_conta, dia):
+    abrir_conta('cliente', '30000000001', saldo=1000)
+
+    assert api('POST', '/sacar', 'cliente', {'valor': 60})[0] == 200
+    status, corpo = api('POST', '/sacar', 'cliente', {'valor': 60})
+    assert status == 400
+    assert 'diário' in corpo['erro']
+    assert api('POST', '/sacar', 'cliente', {'valor': 40})[0] == 200
+    assert api('POST', '/sacar', 'cliente', {'valor': 1})[0] == 400
+
+
+def test_janela_diaria_desliza_e_apaga_baldes_vencidos(api, lf, abrir_conta, dia):
+    conta_id = abrir_conta('cliente', '30000000001', saldo=1000)
+    assert api('POST', '/sacar', 'cliente', {'valor': 60})[0] == 200
+    [(balde, usado)] = baldes_diarios(lf.buscar_conta(conta_id)).items()
+    por_dia = 86400 // lf.LIMITE_BALDE_S
+
+    # O uso de 23 baldes atrás ainda está na janela de 24 h...
+    lf.accounts_table.update_item(
+        Key={'conta_id': conta_id},
+        UpdateExpression='SET #antigo = :usado REMOVE #atual',
+        ExpressionAttributeNames={'#antigo': f'lim_d{balde - por_dia + 1}', '#atual': f'lim_d{balde}'},
+        ExpressionAttributeValues={':usado': usado}
+    )
+    assert api('POST', '/sacar', 'cliente', {'valor': 60})[0] == 400
+
+    # ...o de 24 baldes atrás já saiu, e a escrita do débito o apaga
+    lf.accounts_table.update_item(
+        Key={'conta_id': conta_id},
+        UpdateExpression='SET #vencido = :usado REMOVE #antigo',
+        ExpressionAttributeNames={'#vencido': f'lim_d{balde - por_dia}', '#antigo': f'lim_d{balde - por_dia + 1}'},
+        ExpressionAttributeValues={':usado': usado}
+    )
+    assert api('POST', '/sacar', 'cliente', {'valor': 60})[0] == 200
+    assert baldes_diarios(lf.buscar_conta(conta_id)) == {balde: Decimal('60')}
+
+
+def test_limite_noturno(api, lf, abrir_conta, monkeypatch):
+    hora = int(time.time() // 3600 + lf.LIMITE_FUSO_HORAS) % 24
+    monkeypatch.setattr(lf, 'LIMITE_NOITE_INICIO', hora)
+    monkeypatch.setattr(lf, 'LIMITE_NOITE_FIM', (hora + 3) % 24)
+    monkeypatch.setattr(lf, 'LIMITE_NOTURNO', Decimal('30'))
+    abrir_conta('cliente', '30000000001', saldo=1000)
+
+    assert api('POST', '/sacar', 'cliente', {'valor': 20})[0] == 200
+    status, corpo = api('POST', '/sacar', 'cliente', {'valor': 20})
+    assert status == 400
+    assert 'noturno' in corpo['erro']
+
+
+def test_limite_vale_para_pix(api, abrir_conta, dia):
+    abrir_conta('pagador', '30000000001', saldo=1000)
+    abrir_conta('recebedor', '30000000002')
+
+    assert api('POST', '/pix/enviar', 'pagador', {'chave': '30000000002', 'valor': 80})[0] == 200
+    assert api('POST', '/sacar', 'pagador', {'valor': 30})[0] == 400
@@ -0,0 +1,29 @@
+"""Livro razão: cada lançamento entra na mesma transação que muda a conta."""
+
+
+def test_abertura_gravada_com_a_conta(api, lf, lancamentos):
+    status, corpo = api('POST', '/contas', 'cliente', {'nome': 'Cliente', 'cpf': '50000000001'})
+    assert status == 201
+
+    assert [l['tipo'] for l in lancamentos(corpo['conta_id'])] == ['ABERTURA']
+    assert lf.buscar_conta(corpo['conta_id'])['saldo'] == 0
+
+
+def test_sem_abertura_nao_ha_conta(api, lf, monkeypatch):
+    # Tabela de transações indisponível: a transação inteira falha
+    monkeypatch.setattr(lf, 'TRANSACTIONS_TABLE', 'tabela-inexistente')
+    status, _ = api('POST', '/contas', 'cliente', {'nome': 'Cliente', 'cpf': '50000000001'})
+    assert status == 500
+
+    monkeypatch.undo()
+    assert lf.buscar_conta_por_user('cliente') is None
+
+
+def test_deposito_e_saque_gravam_o_lancamento_com_o_saldo(api, lf, abrir_conta, lancamentos):
+    conta_id = abrir_conta('cliente', '50000000001', saldo=100)
+    assert api('POST', '/sacar', 'cliente', {'valor': 30})[0] == 200
+
+    conta = lf.buscar_conta(conta_id)
+    tipos = sorted(l['tipo'] for l in lancamentos(conta_id))
+    assert tipos == ['ABERTURA', 'DEPOSITO', 'SAQUE']
+    assert conta['saldo'] == sum(l['valor'] for l in lancamentos(conta_id) if l['tipo'] == 'DEPOSITO') - 30
@@ -0,0 +1,33 @@
+"""/painel: ETag da versão da conta e If-None-Match."""
+
+import json
+
+
+def _painel(lf, user_id, headers=None):
+    return lf.lambda_handler({
+        'httpMethod': 'GET', 'path': '/painel', 'headers': {'X-User-Id': user_id, **(headers or {})},
+        'queryStringParameters': None, 'pathParameters': None, 'body': None
+    }, None)
+
+
+def test_requisicao_condicional_nao_le_o_extrato(lf, abrir_conta, monkeypatch):
+    abrir_conta('cliente', '50000000001', saldo=30)
+    etag = _painel(lf, 'cliente')['headers']['ETag']
+
+    def sem_extrato(*args, **kwargs):
+        raise AssertionError('extrato consultado num 304')
+
+    with monkeypatch.context() as m:
+        m.setattr(lf, 'iterar_transacoes', sem_extrato)
+        assert _painel(lf, 'cliente', {'If-None-Match': etag})['statusCode'] == 304
+
+
+def test_etag_antiga_devolve_o_painel_com_extrato(lf, api, abrir_conta):
+    abrir_conta('cliente', '50000000001', saldo=30)
+    etag = _painel(lf, 'cliente')['headers']['ETag']
+    api('POST', '/depositar', 'cliente', {'valor': 5})
+
+    retorno = _painel(lf, 'cliente', {'If-None-Match': etag})
+    assert retorno['statusCode'] == 200
+    assert retorno['headers']['ETag'] != etag
+    assert [t['valor'] for t in json.loads(retorno['body'])['extrato']['transacoes']][:2] == [5.0, 30.0]
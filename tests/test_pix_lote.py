@@ -0,0 +1,62 @@
+"""PIX em lote: falha parcial por item, idempotência obrigatória e livro fechado."""
+
+from decimal import Decimal
+
+
+def test_lote_com_falhas_parciais(api, lf, abrir_conta, lancamentos):
+    origem = abrir_conta('pagador', '10000000001', saldo=100)
+    destino = abrir_conta('recebedor', '10000000002')
+    apagada = abrir_conta('apagado', '10000000003')
+    lf.accounts_table.delete_item(Key={'conta_id': apagada})
+
+    status, corpo = api('POST', '/pix/lote', 'pagador', {'itens': [
+        {'chave': '10000000002', 'valor': 10},
+        'não é objeto',
+        {'chave': 'inexistente', 'valor': 5},
+        {'chave': '10000000002', 'valor': 'x'},
+        {'chave': '10000000003', 'valor': 7},
+        {'chave': '10000000001', 'valor': 1},
+        {'chave': '10000000002', 'valor': 15},
+    ]}, headers={'Idempotency-Key': 'lote-1'})
+
+    assert status == 200
+    assert [r['status'] for r in corpo['resultados']] == ['ok', 'erro', 'erro', 'erro', 'erro', 'erro', 'ok']
+    erros = [r.get('erro') for r in corpo['resultados']]
+    assert erros[2] == 'Chave PIX não encontrada'
+    assert erros[4] == 'Conta de destino não encontrada'
+    assert corpo['total_enviado'] == 25
+    assert corpo['saldo_atual'] == 75
+
+    # Só os itens pagos mexeram nos saldos, cada um com os seus dois lançamentos
+    assert lf.buscar_conta(origem)['saldo'] == Decimal('75.00')
+    assert lf.buscar_conta(destino)['saldo'] == Decimal('25.00')
+    enviados = [l['valor'] for l in lancamentos(origem) if l['tipo'] == 'PIX_ENVIADO']
+    recebidos = [l['valor'] for l in lancamentos(destino) if l['tipo'] == 'PIX_RECEBIDO']
+    assert sorted(enviados) == sorted(recebidos) == [Decimal('10.00'), Decimal('15.00')]
+
+
+def test_lote_acima_do_saldo_recusado_inteiro(api, lf, abrir_conta, lancamentos):
+    origem = abrir_conta('pagador', '10000000001', saldo=20)
+    abrir_conta('recebedor', '10000000002')
+
+    status, corpo = api('POST', '/pix/lote', 'pagador', {'itens': [
+        {'chave': '10000000002', 'valor': 15},
+        {'chave': '10000000002', 'valor': 15},
+    ]}, headers={'Idempotency-Key': 'lote-2'})
+
+    assert status == 400
+    assert lf.buscar_conta(origem)['saldo'] == Decimal('20.00')
+    assert not [l for l in lancamentos(origem) if l['tipo'] == 'PIX_ENVIADO']
+
+
+def test_lote_exige_e_respeita_idempotency_key(api, lf, abrir_conta):
+    origem = abrir_conta('pagador', '10000000001', saldo=50)
+    abrir_conta('recebedor', '10000000002')
+    lote = {'itens': [{'chave': '10000000002', 'valor': 10}]}
+
+    assert api('POST', '/pix/lote', 'pagador', lote)[0] == 400
+
+    primeira = api('POST', '/pix/lote', 'pagador', lote, headers={'Idempotency-Key': 'lote-3'})
+    repetida = api('POST', '/pix/lote', 'pagador', lote, headers={'Idempotency-Key': 'lote-3'})
+    assert primeira == repetida
+    assert lf.buscar_conta(origem)['saldo'] == Decimal('40.00')
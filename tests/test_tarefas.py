@@ -0,0 +1,22 @@
+"""Tarefas agendadas: estado e resultados fora do /tmp quando rodam no Lambda."""
+
+import pytest
+
+
+@pytest.mark.parametrize('evento, variavel', [
+    ({'tarefa': 'reconciliar_saldos'}, 'RECONCILIACAO_ESTADO'),
+    ({'tarefa': 'importar_contas', 'origem': 's3://importacoes/clientes.csv'}, 'IMPORTACAO_ESTADO'),
+    ({'tarefa': 'arquivar_livro'}, 'ARQUIVO_LIVRO'),
+])
+def test_estado_local_recusado_no_lambda(lf, monkeypatch, evento, variavel):
+    monkeypatch.setattr(lf, 'ARQUIVO_LIVRO', '/tmp/arquivo-livro')
+    monkeypatch.setattr(lf, 'NO_LAMBDA', True)
+    with pytest.raises(ValueError, match=variavel):
+        lf.lambda_handler(evento, None)
+
+
+def test_estado_local_aceito_fora_do_lambda(lf, tmp_path, monkeypatch):
+    monkeypatch.setattr(lf, 'RECONCILIACAO_ESTADO', str(tmp_path / 'estado.json.gz'))
+    monkeypatch.setattr(lf, 'RECONCILIACAO_RELATORIO', str(tmp_path / 'relatorio'))
+    resultado = lf.lambda_handler({'tarefa': 'reconciliar_saldos', 'orcamento_s': 60}, None)
+    assert resultado['continuar'] is False
@@ -0,0 +1,124 @@
+"""Motor de transferência: débito, crédito e lançamentos numa TransactWriteItems."""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import pytest
+from botocore.exceptions import ClientError
+
+
+def test_pix_simultaneos_da_mesma_conta_nao_conflitam(api, lf, abrir_conta, lancamentos):
+    origem = abrir_conta('pagador', '60000000001', saldo=1000)
+    destino = abrir_conta('recebedor', '60000000002')
+    barreira = threading.Barrier(8)
+
+    def enviar(_):
+        barreira.wait()
+        return [api('POST', '/pix/enviar', 'pagador', {'chave': '60000000002', 'valor': 5})[0] for _ in range(4)]
+
+    with ThreadPoolExecutor(8) as pool:
+        status = [s for lote in pool.map(enviar, range(8)) for s in lote]
+
+    assert status == [200] * 32
+    assert lf.buscar_conta(origem)['saldo'] == Decimal('840.00')
+    assert lf.buscar_conta(destino)['saldo'] == Decimal('160.00')
+    assert len([l for l in lancamentos(origem) if l['tipo'] == 'PIX_ENVIADO']) == 32
+
+
+def cancelada(*codigos):
+    """TransactionCanceledException com um motivo por item da transação."""
+    return ClientError({
+        'Error': {'Code': 'TransactionCanceledException', 'Message': 'Transaction cancelled'},
+        'CancellationReasons': [{'Code': codigo} for codigo in codigos]
+    }, 'TransactWriteItems')
+
+
+@pytest.fixture
+def transacoes(lf, monkeypatch):
+    """Conta as TransactWriteItems e deixa o teste trocar as primeiras respostas por falhas."""
+    cliente = lf.dynamodb.meta.client
+    original = cliente.transact_write_items
+    registro = {'chamadas': 0, 'falhas': []}
+
+    def transact_write_items(**kwargs):
+        registro['chamadas'] += 1
+        if registro['falhas']:
+            raise registro['falhas'].pop(0)
+        return original(**kwargs)
+
+    monkeypatch.setattr(cliente, 'transact_write_items', transact_write_items)
+    return registro
+
+
+def transferir(lf, origem, destino, valor):
+    return lf.executar_transferencia(
+        lf.buscar_conta(origem), destino, Decimal(valor),
+        ('TRANSFERENCIA_ENVIADA', 'teste'), ('TRANSFERENCIA_RECEBIDA', 'teste')
+    )
+
+
+def test_debito_credito_e_lancamentos_juntos(lf, abrir_conta, lancamentos):
+    origem = abrir_conta('pagador', '60000000001', saldo=100)
+    destino = abrir_conta('recebedor', '60000000002')
+
+    assert transferir(lf, origem, destino, '30') == Decimal('70.00')
+    assert lf.buscar_conta(origem)['saldo'] == Decimal('70.00')
+    assert lf.buscar_conta(destino)['saldo'] == Decimal('30.00')
+    assert [l['valor'] for l in lancamentos(origem) if l['tipo'] == 'TRANSFERENCIA_ENVIADA'] == [Decimal('30')]
+    assert [l['valor'] for l in lancamentos(destino) if l['tipo'] == 'TRANSFERENCIA_RECEBIDA'] == [Decimal('30')]
+
+
+def test_destino_inexistente_nao_debita(lf, abrir_conta, lancamentos):
+    origem = abrir_conta('pagador', '60000000001', saldo=100)
+
+    with pytest.raises(lf.TransferenciaRecusada) as recusa:
+        transferir(lf, origem, 'nao-existe', '30')
+    assert recusa.value.status == 404
+    assert lf.buscar_conta(origem)['saldo'] == Decimal('100.00')
+    assert sorted(l['tipo'] for l in lancamentos(origem)) == ['ABERTURA', 'DEPOSITO']
+
+
+def test_saldo_insuficiente_sem_repetir(lf, abrir_conta, transacoes):
+    origem = abrir_conta('pagador', '60000000001', saldo=10)
+    destino = abrir_conta('recebedor', '60000000002')
+    transacoes['chamadas'] = 0
+
+    with pytest.raises(lf.TransferenciaRecusada) as recusa:
+        transferir(lf, origem, destino, '30')
+    assert (recusa.value.status, transacoes['chamadas']) == (400, 1)
+
+
+def test_saldo_lido_desatualizado_nao_impede_o_debito(api, lf, abrir_conta):
+    origem = abrir_conta('pagador', '60000000001', saldo=100)
+    destino = abrir_conta('recebedor', '60000000002')
+    conta_lida = lf.buscar_conta(origem)
+    # Crédito depois da leitura: o débito só exige saldo >= valor
+    assert api('POST', '/depositar', 'pagador', {'valor': 50})[0] == 200
+
+    lf.executar_transferencia(conta_lida, destino, Decimal('120'),
+                              ('TRANSFERENCIA_ENVIADA', 'teste'), ('TRANSFERENCIA_RECEBIDA', 'teste'))
+    assert lf.buscar_conta(origem)['saldo'] == Decimal('30.00')
+
+
+def test_conflito_transacional_repetido(lf, abrir_conta, transacoes):
+    origem = abrir_conta('pagador', '60000000001', saldo=100)
+    destino = abrir_conta('recebedor', '60000000002')
+    transacoes['chamadas'] = 0
+    transacoes['falhas'] = [cancelada('TransactionConflict', 'None', 'None', 'None')] * 2
+
+    assert transferir(lf, origem, destino, '30') == Decimal('70.00')
+    assert transacoes['chamadas'] == 3
+    assert lf.buscar_conta(destino)['saldo'] == Decimal('30.00')
+
+
+def test_conflito_persistente_vira_409(api, lf, abrir_conta, transacoes):
+    origem = abrir_conta('pagador', '60000000001', saldo=100)
+    abrir_conta('recebedor', '60000000002')
+    transacoes['chamadas'] = 0
+    transacoes['falhas'] = [cancelada('TransactionConflict', 'None', 'None', 'None')] * lf.TRANSFERENCIA_MAX_TENTATIVAS
+
+    status, corpo = api('POST', '/pix/enviar', 'pagador', {'chave': '60000000002', 'valor': 30})
+    assert status == 409
+    assert transacoes['chamadas'] == lf.TRANSFERENCIA_MAX_TENTATIVAS
+    assert lf.buscar_conta(origem)['saldo'] == Decimal('100.00')